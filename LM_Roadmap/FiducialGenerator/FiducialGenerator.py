@@ -8,6 +8,10 @@ import slicer, qt
 from slicer.ScriptedLoadableModule import *
 from slicer.util import VTKObservationMixin
 
+from LM_RoadmapLib import AppliedValues, ParameterSchema, getLogger, getSceneIndex, timedCallback
+
+logger = getLogger(__name__)
+
 '''=================================================================================================================='''
 '''=================================================================================================================='''
 #
@@ -25,7 +29,7 @@ class FiducialGenerator(ScriptedLoadableModule):
         self.parent.helpText = """This module generates a fiducial node with random control points and tracks its point count. """
         self.parent.acknowledgementText = 'Learning Roadmap Project 3. \nPart of the LM_Roadmap extension.'
 
-        print("FiducialGenerator(ScriptedLoadableModule):    __init__(self, parent)")
+        logger.debug("FiducialGenerator(ScriptedLoadableModule):    __init__(self, parent)")
 
 '''=================================================================================================================='''
 '''=================================================================================================================='''
@@ -41,12 +45,14 @@ class FiducialGeneratorWidget(ScriptedLoadableModuleWidget, VTKObservationMixin)
         self.logic = None
         self._parameterNode = None # SingleTon initialized through self.setParameterNode(self.logic.getParameterNode())
         self._updatingGUIFromParameterNode = False
+        self._appliedValues = AppliedValues()  # What the GUI already shows, to only touch widgets whose value changed
         self._observedFiducial = None # Local reference to the node being observed
-        print("**Widget.__init__(self, parent)")
+        self._shownFiducialCount = None # Number of fiducial nodes in the info label
+        logger.debug("**Widget.__init__(self, parent)")
 
     # ------------------------------------------------------------------------------------------------------------------
     def setup(self):
-        print("**Widget.setup(self), \tLM_Roadmap")
+        logger.debug("**Widget.setup(self), \tLM_Roadmap")
 
         """    00. Called when the user opens the module the first time and the widget is initialized. """
         ScriptedLoadableModuleWidget.setup(self)
@@ -66,29 +72,33 @@ class FiducialGeneratorWidget(ScriptedLoadableModuleWidget, VTKObservationMixin)
         self.addObserver(slicer.mrmlScene, slicer.mrmlScene.StartCloseEvent, self.onSceneStartClose)
         self.addObserver(slicer.mrmlScene, slicer.mrmlScene.EndCloseEvent, self.onSceneEndClose)
 
-        # 05. LM_Roadmap. Connect Signal-Slot to ensure sync.
+        # 05. LM_Roadmap. Keep the fiducial node count current when any fiducial node is added or removed (held weakly)
+        getSceneIndex().addNodeAddedCallback(self.onSceneNodeAddedOrRemoved)
+        getSceneIndex().addNodeRemovedCallback(self.onSceneNodeAddedOrRemoved)
+
+        # 06. LM_Roadmap. Connect Signal-Slot to ensure sync.
         self.ui.createFiducialButton.clicked.connect(self.onCreateFiducialButton_Clicked)
 
-        # 06. Needed for programmer-friendly  Module-Reload
+        # 07. Needed for programmer-friendly  Module-Reload
         if self.parent.isEntered:
             self.initializeParameterNode()
 
     # ------------------------------------------------------------------------------------------------------------------
     def cleanup(self):
         """    Called when the application closes and the module widget is destroyed.    """
-        print("**Widget.cleanup(self)")
+        logger.debug("**Widget.cleanup(self)")
         self.removeObservers()
 
     # ------------------------------------------------------------------------------------------------------------------
     def enter(self):
         """    Called each time the user opens this module.    """
-        print("\n**Widget.enter(self)")
+        logger.debug("\n**Widget.enter(self)")
         self.initializeParameterNode()
 
     # ------------------------------------------------------------------------------------------------------------------
     def exit(self):
         """    Called each time the user opens a different module.    """
-        print("**Widget.exit(self)")
+        logger.debug("**Widget.exit(self)")
         # Slicer. Do not react to parameter node changes (GUI will be updated when the user enters into the module)
         if self._parameterNode:
             self.removeObserver(self._parameterNode, vtk.vtkCommand.ModifiedEvent, self.updateGUIFromParameterNode)
@@ -99,28 +109,30 @@ class FiducialGeneratorWidget(ScriptedLoadableModuleWidget, VTKObservationMixin)
             self.removeObserver(self._observedFiducial, slicer.vtkMRMLMarkupsNode.PointRemovedEvent, self.onFiducialModified)
 
     # ------------------------------------------------------------------------------------------------------------------
+    @timedCallback
     def onSceneStartClose(self, caller, event):
         """    Called just before the scene is closed.    """
-        print("**Widget.onSceneStartClose(self, caller, event)")
+        logger.debug("**Widget.onSceneStartClose(self, caller, event)")
         self.setParameterNode(None)
 
     # ------------------------------------------------------------------------------------------------------------------
+    @timedCallback
     def onSceneEndClose(self, caller, event):
         """     Called just after the scene is closed.    """
-        print("**Widget.onSceneEndClose(self, caller, event)")
+        logger.debug("**Widget.onSceneEndClose(self, caller, event)")
         if self.parent.isEntered:
             self.initializeParameterNode()
 
     # ------------------------------------------------------------------------------------------------------------------
     def initializeParameterNode(self):
         """    Ensure parameter node exists and observed. """
-        print("\t**Widget.initializeParameterNode(self), \t LM_Roadmap")
+        logger.debug("\t**Widget.initializeParameterNode(self), \t LM_Roadmap")
         self.setParameterNode(self.logic.getParameterNode())
 
     # ------------------------------------------------------------------------------------------------------------------
     def setParameterNode(self, inputParameterNode):
         """    Set and observe the SingleTon ParameterNode. """
-        print("\t\t**Widget.setParameterNode(self, inputParameterNode)")
+        logger.debug("\t\t**Widget.setParameterNode(self, inputParameterNode)")
         if inputParameterNode:
             if not inputParameterNode.IsSingleton():
                 raise ValueError(f'LM_Roadmap Alert! \tinputParameterNode is not a singleton!')
@@ -135,10 +147,12 @@ class FiducialGeneratorWidget(ScriptedLoadableModuleWidget, VTKObservationMixin)
         if self._parameterNode is not None:
             self.addObserver(self._parameterNode, vtk.vtkCommand.ModifiedEvent, self.updateGUIFromParameterNode)
         
-        # 03. Initial GUI update
+        # 03. Initial GUI update, of every widget
+        self._appliedValues.clear()
         self.updateGUIFromParameterNode()
 
     # ------------------------------------------------------------------------------------------------------------------
+    @timedCallback
     def updateGUIFromParameterNode(self, caller=None, event=None):
         """   Update GUI from ParameterNode. Includes node observation management. """
         if self._parameterNode is None or self._updatingGUIFromParameterNode:
@@ -147,7 +161,7 @@ class FiducialGeneratorWidget(ScriptedLoadableModuleWidget, VTKObservationMixin)
         # I. Open-Brace: Prevent infinite loops
         self._updatingGUIFromParameterNode = True
         
-        print("**Widget.updateGUIFromParameterNode(self, caller=None, event=None), \tLM_Roadmap")
+        logger.debug("**Widget.updateGUIFromParameterNode(self, caller=None, event=None), \tLM_Roadmap")
         
         # II. Handle Node Selection Observation
         currentFiducial = self._parameterNode.GetNodeReference("GeneratedFiducial")
@@ -155,7 +169,7 @@ class FiducialGeneratorWidget(ScriptedLoadableModuleWidget, VTKObservationMixin)
         if currentFiducial != self._observedFiducial:
             # Selection changed!
             if self._observedFiducial:
-                print(f"\tRemoving observer from: {self._observedFiducial.GetName()}")
+                logger.debug("\tRemoving observer from: %s", self._observedFiducial.GetName())
                 self.removeObserver(self._observedFiducial, slicer.vtkMRMLMarkupsNode.PointModifiedEvent, self.onFiducialModified)
                 self.removeObserver(self._observedFiducial, slicer.vtkMRMLMarkupsNode.PointAddedEvent, self.onFiducialModified)
                 self.removeObserver(self._observedFiducial, slicer.vtkMRMLMarkupsNode.PointRemovedEvent, self.onFiducialModified)
@@ -163,43 +177,58 @@ class FiducialGeneratorWidget(ScriptedLoadableModuleWidget, VTKObservationMixin)
             self._observedFiducial = currentFiducial
             
             if self._observedFiducial:
-                print(f"\tAdding observer to: {self._observedFiducial.GetName()}")
+                logger.debug("\tAdding observer to: %s", self._observedFiducial.GetName())
                 # Markups need to observe specific events for point changes
                 self.addObserver(self._observedFiducial, slicer.vtkMRMLMarkupsNode.PointModifiedEvent, self.onFiducialModified)
                 self.addObserver(self._observedFiducial, slicer.vtkMRMLMarkupsNode.PointAddedEvent, self.onFiducialModified)
                 self.addObserver(self._observedFiducial, slicer.vtkMRMLMarkupsNode.PointRemovedEvent, self.onFiducialModified)
 
-        # III. Trigger property update
-        self.onFiducialModified()
+        # III. Trigger property update, if the generated fiducial changed
+        if self._appliedValues.referenceChanged(self._parameterNode, "GeneratedFiducial"):
+            self.onFiducialModified()
 
         # IV. Close-Brace
         self._updatingGUIFromParameterNode = False
 
     # ------------------------------------------------------------------------------------------------------------------
+    @timedCallback
     def updateParameterNodeFromGUI(self, caller=None, event=None):
         """ Save changes into ParameterNode. (Called when we create a new node) """
-        print(f"**Widget.updateParameterNodeFromGUI(self, caller=None, event=None),     \t LM_Roadmap")
+        logger.debug("**Widget.updateParameterNodeFromGUI(self, caller=None, event=None),     \t LM_Roadmap")
         if self._parameterNode is None or self._updatingGUIFromParameterNode:
             return
         # This is handled directly in onCreateFiducialButton_Clicked for simplicity in this module
         pass
 
     # ------------------------------------------------------------------------------------------------------------------
+    @timedCallback
     def onFiducialModified(self, caller=None, event=None):
         """ Update info label. """
-        print("\t\t**Widget.onFiducialModified(self)")
+        logger.debug("\t\t**Widget.onFiducialModified(self)")
         
         if not self._observedFiducial:
             self.ui.fiducialInfoLabel.text = "No fiducial node created yet."
+            self._shownFiducialCount = None
             return
 
         numberOfPoints = self._observedFiducial.GetNumberOfControlPoints()
-        self.ui.fiducialInfoLabel.text = f"Fiducial: {self._observedFiducial.GetName()} | Points: {numberOfPoints}"
+        numberOfFiducials = getSceneIndex().getCount("vtkMRMLMarkupsFiducialNode")
+        self.ui.fiducialInfoLabel.text = f"Fiducial: {self._observedFiducial.GetName()} | Points: {numberOfPoints} | Fiducial nodes: {numberOfFiducials}"
+        self._shownFiducialCount = numberOfFiducials
+
+    # ------------------------------------------------------------------------------------------------------------------
+    @timedCallback
+    def onSceneNodeAddedOrRemoved(self, nodeOrNodeID):
+        """ Refresh the info label when the number of fiducial nodes it shows changed. """
+        if self._shownFiducialCount is None or self._parameterNode is None or not self.parent.isEntered:
+            return  # No count shown, scene closing, or refreshed on enter
+        if getSceneIndex().getCount("vtkMRMLMarkupsFiducialNode") != self._shownFiducialCount:
+            self.onFiducialModified()
 
     # ------------------------------------------------------------------------------------------------------------------
     def onCreateFiducialButton_Clicked(self):
         """ SL_Developer. Create a new fiducial node and add random points. """
-        print("**Widget.onCreateFiducialButton_Clicked(self)")
+        logger.debug("**Widget.onCreateFiducialButton_Clicked(self)")
         
         with slicer.util.tryWithErrorDisplay("Failed to create fiducial node.", waitCursor=True):
             # 1. Create node via logic
@@ -217,20 +246,23 @@ class FiducialGeneratorWidget(ScriptedLoadableModuleWidget, VTKObservationMixin)
 #
 class FiducialGeneratorLogic(ScriptedLoadableModuleLogic):
 
+    # Typed parameters of the SingleTon ParameterNode
+    parameterSchema = ParameterSchema([], references=("GeneratedFiducial",))
+
     def __init__(self):
         ScriptedLoadableModuleLogic.__init__(self)
-        print("**Logic.__init__(self)")
+        logger.debug("**Logic.__init__(self)")
 
     # ------------------------------------------------------------------------------------------------------------------
     def setDefaultParameters(self, parameterNode):
         """    Initialize parameter node with defaults if empty.    """
-        print("\t\t\t**Logic.setDefaultParameters(self, parameterNode), \tLM_Roadmap");
-        pass
+        logger.debug("\t\t\t**Logic.setDefaultParameters(self, parameterNode), \tLM_Roadmap");
+        self.parameterSchema.setDefaultParameters(parameterNode)
 
     # ------------------------------------------------------------------------------------------------------------------
     def createRandomFiducialNode(self):
         """ Create a vtkMRMLMarkupsFiducialNode with 5 random points. """
-        print("\t\t\t**Logic.createRandomFiducialNode(self)")
+        logger.debug("\t\t\t**Logic.createRandomFiducialNode(self)")
         
         # 1. Create node
         fiducialNode = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLMarkupsFiducialNode")
@@ -1,12 +1,29 @@
 import logging
 import os
+import shutil
+import sys
+import time
 
 import vtk
 
-import slicer, qt
+import slicer, qt, ctk
 from slicer.ScriptedLoadableModule import *
 from slicer.util import VTKObservationMixin
 
+from LM_RoadmapLib import (
+    AppliedValues,
+    Parameter,
+    ParameterSchema,
+    getLogger,
+    getSceneIndex,
+    installSampleDataStore,
+    lazyImport,
+    timedCallback,
+)
+
+logger = getLogger(__name__)
+np = lazyImport("numpy")
+
 '''=================================================================================================================='''
 '''=================================================================================================================='''
 #
@@ -24,18 +41,26 @@ class InputNodeInspector(ScriptedLoadableModule):
         self.parent.helpText = """This module allows inspecting MRML node properties in real-time. """
         self.parent.acknowledgementText = 'Learning Roadmap Project 2. \nPart of the LM_Roadmap extension.'
 
-        # Additional initialization step after application startup is complete
-        slicer.app.connect("startupCompleted()", registerSampleData)
+        # Sample data is registered on first entry (registerSampleData), not at application startup
 
-        print("InputNodeInspector(ScriptedLoadableModule):    __init__(self, parent)")
+        logger.debug("InputNodeInspector(ScriptedLoadableModule):    __init__(self, parent)")
 
 #
 # Register sample data sets in Sample Data module
 #
 
+_sampleDataRegistered = False
+
+
 def registerSampleData():
-    """Add data sets to Sample Data module."""
+    """Add data sets to Sample Data module. Called on first entry in the module, not at startup.
+       SampleData then looks in the local sample data store before downloading, for offline machines. """
+    global _sampleDataRegistered
+    if _sampleDataRegistered:
+        return
+    _sampleDataRegistered = True
     import SampleData
+    installSampleDataStore()
     iconsPath = os.path.join(os.path.dirname(__file__), "Resources/Icons")
 
     # InputNodeInspector1
@@ -63,12 +88,15 @@ class InputNodeInspectorWidget(ScriptedLoadableModuleWidget, VTKObservationMixin
         self.logic = None
         self._parameterNode = None # SingleTon initialized through self.setParameterNode(self.logic.getParameterNode())
         self._updatingGUIFromParameterNode = False
+        self._appliedValues = AppliedValues()  # What the GUI already shows, to only touch widgets whose value changed
         self._inspectedNode = None # Local reference to the node being observed
-        print("**Widget.__init__(self, parent)")
+        self._observedBrowserNode = None # Sequence browser whose current frame is shown
+        self._sequencePlotNodes = {} # Table / series / chart reused by successive plots
+        logger.debug("**Widget.__init__(self, parent)")
 
     # ------------------------------------------------------------------------------------------------------------------
     def setup(self):
-        print("**Widget.setup(self), \tLM_Roadmap")
+        logger.debug("**Widget.setup(self), \tLM_Roadmap")
 
         """    00. Called when the user opens the module the first time and the widget is initialized. """
         ScriptedLoadableModuleWidget.setup(self)
@@ -83,8 +111,9 @@ class InputNodeInspectorWidget(ScriptedLoadableModuleWidget, VTKObservationMixin
         #       each      MRML widget's   "setMRMLScene(vtkMRMLScene*)"     slot.
         uiWidget.setMRMLScene(slicer.mrmlScene)
 
-        # 03. Create logic class.
+        # 03. Create logic class. Sample data is registered here, on first entry, to keep application startup cheap.
         self.logic = InputNodeInspectorLogic()
+        registerSampleData()
 
         # 04. Connections, ensure that we update parameter node when scene is closed
         self.addObserver(slicer.mrmlScene, slicer.mrmlScene.StartCloseEvent, self.onSceneStartClose)
@@ -93,6 +122,20 @@ class InputNodeInspectorWidget(ScriptedLoadableModuleWidget, VTKObservationMixin
         # 05. LM_Roadmap. Connect Signal-Slot to ensure sync.
         self.ui.inputNodeSelector.currentNodeChanged.connect(self.updateParameterNodeFromGUI)
         self.ui.dimensionsLabel.text = "Dimensions: - "
+        self.ui.inspectFilePathLineEdit.filters = ctk.ctkPathLineEdit.Files | ctk.ctkPathLineEdit.Dirs | ctk.ctkPathLineEdit.Readable
+        self.ui.inspectFilePathLineEdit.currentPathChanged.connect(self.updateParameterNodeFromGUI)
+        self.ui.computeFileStatisticsCheckBox.toggled.connect(self.updateParameterNodeFromGUI)
+        self.ui.inspectFileButton.clicked.connect(self.onInspectFileButton)
+        self.ui.computePercentilesButton.clicked.connect(self.onComputePercentilesButton)
+        self.ui.maskNodeSelector.currentNodeChanged.connect(self.updateParameterNodeFromGUI)
+        self.ui.maskSegmentComboBox.currentIndexChanged.connect(self.updateParameterNodeFromGUI)
+        self.ui.computeMaskedStatisticsButton.clicked.connect(self.onComputeMaskedStatisticsButton)
+        self.ui.pyramidPreviewCheckBox.toggled.connect(self.updateParameterNodeFromGUI)
+        self.ui.refineStatisticsButton.clicked.connect(self.onRefineStatisticsButton)
+        self.ui.nodePropertiesTreeWidget.itemExpanded.connect(self.onNodePropertyItemExpanded)
+        self.ui.refreshMemoryButton.clicked.connect(self.onRefreshMemoryButton)
+        self.ui.sequenceBrowserSelector.currentNodeChanged.connect(self.updateParameterNodeFromGUI)
+        self.ui.computeSequenceStatisticsButton.clicked.connect(self.onComputeSequenceStatisticsButton)
 
         # 06. Needed for programmer-friendly  Module-Reload
         if self.parent.isEntered:
@@ -101,55 +144,60 @@ class InputNodeInspectorWidget(ScriptedLoadableModuleWidget, VTKObservationMixin
     # ------------------------------------------------------------------------------------------------------------------
     def cleanup(self):
         """    Called when the application closes and the module widget is destroyed.    """
-        print("**Widget.cleanup(self)")
+        logger.debug("**Widget.cleanup(self)")
         self.removeObservers()
 
     # ------------------------------------------------------------------------------------------------------------------
     def enter(self):
         """    Called each time the user opens this module.    """
-        print("\n**Widget.enter(self)")
+        logger.debug("\n**Widget.enter(self)")
         self.initializeParameterNode()
 
     # ------------------------------------------------------------------------------------------------------------------
     def exit(self):
         """    Called each time the user opens a different module.    """
-        print("**Widget.exit(self)")
+        logger.debug("**Widget.exit(self)")
         # Slicer. Do not react to parameter node changes (GUI will be updated when the user enters into the module)
         if self._parameterNode:
             self.removeObserver(self._parameterNode, vtk.vtkCommand.ModifiedEvent, self.updateGUIFromParameterNode)
         # Also remove observation of the inspected node to avoid background updates
         if self._inspectedNode:
             self.removeObserver(self._inspectedNode, vtk.vtkCommand.ModifiedEvent, self.onInputNodeModified)
+        if self._observedBrowserNode:
+            self.removeObserver(self._observedBrowserNode, vtk.vtkCommand.ModifiedEvent, self.onSequenceBrowserModified)
+            self._observedBrowserNode = None
 
     # ------------------------------------------------------------------------------------------------------------------
+    @timedCallback
     def onSceneStartClose(self, caller, event):
         """    Called just before the scene is closed.    """
-        print("**Widget.onSceneStartClose(self, caller, event)")
+        logger.debug("**Widget.onSceneStartClose(self, caller, event)")
         self.setParameterNode(None)
 
     # ------------------------------------------------------------------------------------------------------------------
+    @timedCallback
     def onSceneEndClose(self, caller, event):
         """     Called just after the scene is closed.    """
-        print("**Widget.onSceneEndClose(self, caller, event)")
+        logger.debug("**Widget.onSceneEndClose(self, caller, event)")
         if self.parent.isEntered:
             self.initializeParameterNode()
 
     # ------------------------------------------------------------------------------------------------------------------
     def initializeParameterNode(self):
         """    Ensure parameter node exists and observed. """
-        print("\t**Widget.initializeParameterNode(self), \t LM_Roadmap")
+        logger.debug("\t**Widget.initializeParameterNode(self), \t LM_Roadmap")
         self.setParameterNode(self.logic.getParameterNode())
 
         # Select default input nodes if nothing is selected yet to save a few clicks for the user
         if not self._parameterNode.GetNodeReference("InputNode"):
-            firstVolumeNode = slicer.mrmlScene.GetFirstNodeByClass("vtkMRMLScalarVolumeNode")
+            firstVolumeNode = getSceneIndex().getFirstNode("vtkMRMLScalarVolumeNode")
             if firstVolumeNode:
                 self._parameterNode.SetNodeReferenceID("InputNode", firstVolumeNode.GetID())
 
     # ------------------------------------------------------------------------------------------------------------------
     def setParameterNode(self, inputParameterNode):
         """    Set and observe the SingleTon ParameterNode. """
-        print("\t\t**Widget.setParameterNode(self, inputParameterNode)")
+        logger.debug("\t\t**Widget.setParameterNode(self, inputParameterNode)")
         if inputParameterNode:
             if not inputParameterNode.IsSingleton():
                 raise ValueError(f'LM_Roadmap Alert! \tinputParameterNode is not a singleton!')
@@ -164,10 +212,12 @@ class InputNodeInspectorWidget(ScriptedLoadableModuleWidget, VTKObservationMixin
         if self._parameterNode is not None:
             self.addObserver(self._parameterNode, vtk.vtkCommand.ModifiedEvent, self.updateGUIFromParameterNode)
         
-        # 03. Initial GUI update
+        # 03. Initial GUI update, of every widget
+        self._appliedValues.clear()
         self.updateGUIFromParameterNode()
 
     # ------------------------------------------------------------------------------------------------------------------
+    @timedCallback
     def updateGUIFromParameterNode(self, caller=None, event=None):
         """   Update GUI from ParameterNode. Includes node observation management. """
         if self._parameterNode is None or self._updatingGUIFromParameterNode:
@@ -176,7 +226,7 @@ class InputNodeInspectorWidget(ScriptedLoadableModuleWidget, VTKObservationMixin
         # I. Open-Brace: Prevent infinite loops
         self._updatingGUIFromParameterNode = True
         
-        print("**Widget.updateGUIFromParameterNode(self, caller=None, event=None), \tLM_Roadmap")
+        logger.debug("**Widget.updateGUIFromParameterNode(self, caller=None, event=None), \tLM_Roadmap")
         
         # II. Handle Node Selection Observation
         #     We need to observe the selected node itself so we can update the UI if its data changes.
@@ -185,60 +235,302 @@ class InputNodeInspectorWidget(ScriptedLoadableModuleWidget, VTKObservationMixin
         if currentNode != self._inspectedNode:
             # Selection changed!
             if self._inspectedNode:
-                print(f"\tRemoving observer from: {self._inspectedNode.GetName()}")
+                logger.debug("\tRemoving observer from: %s", self._inspectedNode.GetName())
                 self.removeObserver(self._inspectedNode, vtk.vtkCommand.ModifiedEvent, self.onInputNodeModified)
             
             self._inspectedNode = currentNode
             
             if self._inspectedNode:
-                print(f"\tAdding observer to: {self._inspectedNode.GetName()}")
+                logger.debug("\tAdding observer to: %s", self._inspectedNode.GetName())
                 self.addObserver(self._inspectedNode, vtk.vtkCommand.ModifiedEvent, self.onInputNodeModified)
 
-        # III. Sync GUI widgets
-        self.ui.inputNodeSelector.setCurrentNode(self._inspectedNode)
-        
-        # IV. Trigger property update
-        self.onInputNodeModified()
+        #     Same for the sequence browser: its modified event is how we know the user scrubbed to another frame.
+        browserNode = self._parameterNode.GetNodeReference("SequenceBrowser")
+        if browserNode != self._observedBrowserNode:
+            if self._observedBrowserNode:
+                self.removeObserver(self._observedBrowserNode, vtk.vtkCommand.ModifiedEvent, self.onSequenceBrowserModified)
+            self._observedBrowserNode = browserNode
+            if self._observedBrowserNode:
+                self.addObserver(self._observedBrowserNode, vtk.vtkCommand.ModifiedEvent, self.onSequenceBrowserModified)
+
+        # III. Sync GUI widgets whose backing value changed
+        schema = self.logic.parameterSchema
+        applied = self._appliedValues
+        inputNodeChanged = applied.referenceChanged(self._parameterNode, "InputNode")
+        if inputNodeChanged:
+            self.ui.inputNodeSelector.setCurrentNode(self._inspectedNode)
+        if applied.parameterChanged(schema, self._parameterNode, "InspectFilePath"):
+            self.ui.inspectFilePathLineEdit.currentPath = schema.get(self._parameterNode, "InspectFilePath")
+        maskNodeChanged = applied.referenceChanged(self._parameterNode, "MaskNode")
+        maskNode = self._parameterNode.GetNodeReference("MaskNode")
+        if maskNodeChanged:
+            self.ui.maskNodeSelector.setCurrentNode(maskNode)
+        if applied.parameterChanged(schema, self._parameterNode, "MaskSegmentID") or maskNodeChanged:
+            self.updateMaskSegmentComboBox(maskNode, schema.get(self._parameterNode, "MaskSegmentID"))
+        if applied.parameterChanged(schema, self._parameterNode, "ComputeFileStatistics"):
+            self.ui.computeFileStatisticsCheckBox.checked = schema.get(self._parameterNode, "ComputeFileStatistics")
+        usePyramidChanged = applied.parameterChanged(schema, self._parameterNode, "UsePyramidPreview")
+        if usePyramidChanged:
+            self.ui.pyramidPreviewCheckBox.checked = schema.get(self._parameterNode, "UsePyramidPreview")
+        browserChanged = applied.referenceChanged(self._parameterNode, "SequenceBrowser")
+        if browserChanged:
+            self.ui.sequenceBrowserSelector.setCurrentNode(browserNode)
+
+        # IV. Trigger property update, only for what it depends on
+        if inputNodeChanged or usePyramidChanged:
+            self.onInputNodeModified()
+        if browserChanged:
+            self.onSequenceBrowserModified()
 
         # V. Close-Brace
         self._updatingGUIFromParameterNode = False
 
     # ------------------------------------------------------------------------------------------------------------------
+    @timedCallback
     def updateParameterNodeFromGUI(self, caller=None, event=None):
         """ Save GUI selection into ParameterNode. """
-        print(f"**Widget.updateParameterNodeFromGUI(self, caller=None, event=None),     \t LM_Roadmap")
+        logger.debug("**Widget.updateParameterNodeFromGUI(self, caller=None, event=None),     \t LM_Roadmap")
         if self._parameterNode is None or self._updatingGUIFromParameterNode:
             return
 
         # I. Start batch modification
         wasModified = self._parameterNode.StartModify()
 
-        # II. Save node reference
+        # II. Save node reference and file inspection settings
         self._parameterNode.SetNodeReferenceID("InputNode", self.ui.inputNodeSelector.currentNodeID)
+        schema = self.logic.parameterSchema
+        schema.set(self._parameterNode, "InspectFilePath", self.ui.inspectFilePathLineEdit.currentPath)
+        self._parameterNode.SetNodeReferenceID("MaskNode", self.ui.maskNodeSelector.currentNodeID)
+        schema.set(self._parameterNode, "MaskSegmentID", self.currentMaskSegmentID() or "")
+        schema.set(self._parameterNode, "ComputeFileStatistics", bool(self.ui.computeFileStatisticsCheckBox.checked))
+        schema.set(self._parameterNode, "UsePyramidPreview", bool(self.ui.pyramidPreviewCheckBox.checked))
+        self._parameterNode.SetNodeReferenceID("SequenceBrowser", self.ui.sequenceBrowserSelector.currentNodeID)
 
         # III. End batch modification
         self._parameterNode.EndModify(wasModified)
 
     # ------------------------------------------------------------------------------------------------------------------
+    @timedCallback
     def onInputNodeModified(self, caller=None, event=None):
         """ Update property labels. """
-        print("\t\t**Widget.onInputNodeModified(self)")
-        
+        logger.debug("\t\t**Widget.onInputNodeModified(self)")
+        self.updateNodePropertiesTree()
+
         if not self._inspectedNode:
             self.ui.dimensionsLabel.text = "None"
             self.ui.spacingLabel.text = "None"
             self.ui.scalarRangeLabel.text = "None"
+            self.ui.percentilesLabel.text = "Percentiles: -"
+            self.ui.previewStatisticsLabel.text = "Preview: -"
             return
 
         # Use Logic to get values
         dims = self.logic.getDimensions(self._inspectedNode)
         spacing = self.logic.getSpacing(self._inspectedNode)
-        scalarRange = self.logic.getScalarRange(self._inspectedNode)
+
+        # Scalar range: from the cached pyramid when previewing (no full voxel scan), refined on demand
+        usePyramid = self._parameterNode is not None and self.logic.parameterSchema.get(self._parameterNode, "UsePyramidPreview")
+        self.ui.refineStatisticsButton.enabled = usePyramid
+        if usePyramid and self._inspectedNode.IsA("vtkMRMLScalarVolumeNode") and self._inspectedNode.GetImageData():
+            preview = self.logic.getCoarseStatistics(self._inspectedNode)
+            scalarRange = (preview["min"], preview["max"])
+            self.ui.previewStatisticsLabel.text = f"Preview ({preview['factor']}x): mean {preview['mean']:.2f}, std ~{preview['std']:.2f}"
+        else:
+            scalarRange = self.logic.getScalarRange(self._inspectedNode)
+            self.ui.previewStatisticsLabel.text = "Preview: -"
 
         # Update UI
         self.ui.dimensionsLabel.text = str(dims)
         self.ui.spacingLabel.text = f"({spacing[0]:.3f}, {spacing[1]:.3f}, {spacing[2]:.3f})" if spacing else "N/A"
         self.ui.scalarRangeLabel.text = f"[{scalarRange[0]:.1f}, {scalarRange[1]:.1f}]" if scalarRange else "N/A"
+        self.ui.computePercentilesButton.enabled = scalarRange is not None
+        self.ui.percentilesLabel.text = "Percentiles: -"  # Stale once the node changed
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def updateNodePropertiesTree(self):
+        """ Cheap properties are listed right away; expensive ones get a placeholder and are computed on expansion. """
+        tree = self.ui.nodePropertiesTreeWidget
+        tree.clear()
+        if not self._inspectedNode:
+            return
+
+        for name, value in self.logic.getNodeProperties(self._inspectedNode).items():
+            qt.QTreeWidgetItem(tree, [name, self.logic.formatPropertyValue(value)])
+        for name in self.logic.getLazyNodePropertyNames(self._inspectedNode):
+            value = self.logic.getLazyNodeProperty(self._inspectedNode, name, compute=False)  # Still valid if cached
+            item = qt.QTreeWidgetItem(tree, [name, "(expand to compute)" if value is None else self.logic.formatPropertyValue(value)])
+            item.setData(0, qt.Qt.UserRole, name)
+            item.setForeground(0, qt.QBrush(qt.QColor("gray")))
+            item.setChildIndicatorPolicy(qt.QTreeWidgetItem.ShowIndicator)
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def onNodePropertyItemExpanded(self, item):
+        """ Compute an expensive property the first time the user asks for it. """
+        name = item.data(0, qt.Qt.UserRole)
+        if not name or not self._inspectedNode:
+            return
+        logger.debug("**Widget.onNodePropertyItemExpanded(self, %s)", name)
+
+        with slicer.util.tryWithErrorDisplay(f"Failed to compute {name}.", waitCursor=True):
+            value = self.logic.getLazyNodeProperty(self._inspectedNode, name)
+            item.setText(1, self.logic.formatPropertyValue(value))
+            if isinstance(value, (list, tuple)) and value and isinstance(value[0], (list, tuple, str)):
+                for entry in value:  # e.g. segment names, matrix rows
+                    qt.QTreeWidgetItem(item, ["", self.logic.formatPropertyValue(entry)])
+        item.setChildIndicatorPolicy(qt.QTreeWidgetItem.DontShowIndicatorWhenChildless)
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def onRefineStatisticsButton(self):
+        """ Replace the pyramid preview by full resolution statistics. """
+        logger.debug("**Widget.onRefineStatisticsButton(self)")
+        if not self._inspectedNode or not self._inspectedNode.IsA("vtkMRMLScalarVolumeNode"):
+            return
+
+        with slicer.util.tryWithErrorDisplay("Failed to refine statistics.", waitCursor=True):
+            scalarRange = self.logic.getScalarRange(self._inspectedNode)
+            result = self.logic.computeApproximateStatistics(self._inspectedNode)
+            if not scalarRange or not result:
+                return
+            self.ui.scalarRangeLabel.text = f"[{scalarRange[0]:.1f}, {scalarRange[1]:.1f}]"
+            self.ui.previewStatisticsLabel.text = f"Full resolution: mean {result['mean']:.2f}, std {result['std']:.2f}"
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def onComputePercentilesButton(self):
+        """ Approximate 1st / 50th / 99th percentiles of the inspected volume in one streaming pass. """
+        logger.debug("**Widget.onComputePercentilesButton(self)")
+        if not self._inspectedNode:
+            return
+
+        with slicer.util.tryWithErrorDisplay("Failed to compute percentiles.", waitCursor=True):
+            result = self.logic.computeApproximateStatistics(self._inspectedNode)
+            if not result:
+                self.ui.percentilesLabel.text = "Percentiles: N/A"
+                return
+            p01, p50, p99 = result["quantiles"].values()
+            self.ui.percentilesLabel.text = (f"P1 / P50 / P99: {p01:.1f} / {p50:.1f} / {p99:.1f}"
+                                             f"  (rank error < {100 * result['rankErrorBound']:.1f}%)")
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def updateMaskSegmentComboBox(self, maskNode, segmentID):
+        """ List the segments of a segmentation mask. Only called while _updatingGUIFromParameterNode is set. """
+        self.ui.maskSegmentComboBox.clear()
+        isSegmentation = maskNode is not None and maskNode.IsA("vtkMRMLSegmentationNode")
+        self.ui.maskSegmentComboBox.enabled = isSegmentation
+        if not isSegmentation:
+            return
+        segmentation = maskNode.GetSegmentation()
+        for index in range(segmentation.GetNumberOfSegments()):
+            segment = segmentation.GetNthSegment(index)
+            self.ui.maskSegmentComboBox.addItem(segment.GetName(), segmentation.GetNthSegmentID(index))
+        self.ui.maskSegmentComboBox.setCurrentIndex(max(0, self.ui.maskSegmentComboBox.findData(segmentID)))
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def currentMaskSegmentID(self):
+        index = self.ui.maskSegmentComboBox.currentIndex
+        return self.ui.maskSegmentComboBox.itemData(index) if index >= 0 else None
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def onComputeMaskedStatisticsButton(self):
+        """ Statistics of the inspected volume inside the selected ROI / labelmap / segment. """
+        logger.debug("**Widget.onComputeMaskedStatisticsButton(self)")
+        maskNode = self.ui.maskNodeSelector.currentNode()
+        if not self._inspectedNode or not self._inspectedNode.IsA("vtkMRMLScalarVolumeNode") or not maskNode:
+            slicer.util.errorDisplay("Please select a scalar volume and a mask.")
+            return
+
+        with slicer.util.tryWithErrorDisplay("Failed to compute masked statistics.", waitCursor=True):
+            result = self.logic.computeMaskedStatistics(self._inspectedNode, maskNode, self.currentMaskSegmentID())
+            if not result["voxels"]:
+                self.ui.maskedStatisticsLabel.text = "Mask is empty or outside the volume"
+                return
+            self.ui.maskedStatisticsLabel.text = (
+                f"Voxels: {result['voxels']} ({result['volumeMm3']:.1f} mm³)\n"
+                f"Range: [{result['min']:.1f}, {result['max']:.1f}]\n"
+                f"Mean: {result['mean']:.2f} ± {result['std']:.2f}, median {result['median']:.2f}")
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def onInspectFileButton(self):
+        """ Inspect the NRRD/NIfTI file (or folder) on disk without loading it into the scene. """
+        logger.debug("**Widget.onInspectFileButton(self)")
+        path = self.logic.parameterSchema.get(self._parameterNode, "InspectFilePath")
+        computeStatistics = self.logic.parameterSchema.get(self._parameterNode, "ComputeFileStatistics")
+        if not path:
+            slicer.util.errorDisplay("Please select a volume file or folder.")
+            return
+
+        with slicer.util.tryWithErrorDisplay("Failed to inspect file.", waitCursor=True):
+            if os.path.isdir(path):
+                reports = self.logic.inspectFolder(path, computeStatistics)
+            else:
+                reports = [self.logic.inspectFile(path, computeStatistics)]
+            self.ui.fileReportTextEdit.setPlainText("\n\n".join(self.logic.formatFileReport(r) for r in reports))
+
+    # ------------------------------------------------------------------------------------------------------------------
+    @timedCallback
+    def onSequenceBrowserModified(self, caller=None, event=None):
+        """ Statistics of the frame being displayed. Cached per frame, so scrubbing back and forth is free. """
+        browserNode = self._observedBrowserNode
+        sequenceNode = self.logic.getBrowserVolumeSequence(browserNode) if browserNode else None
+        self.ui.computeSequenceStatisticsButton.enabled = sequenceNode is not None
+        if sequenceNode is None:
+            self.ui.frameStatisticsLabel.text = "-"
+            return
+
+        frameIndex = self.logic.getBrowserFrameIndex(browserNode, sequenceNode)
+        if frameIndex < 0:
+            self.ui.frameStatisticsLabel.text = "-"
+            return
+        frame = self.logic.computeSequenceStatistics(sequenceNode, frameIndices=[frameIndex],
+                                                     histograms=False)["frames"][0]
+        if frame is None:
+            self.ui.frameStatisticsLabel.text = f"#{frameIndex}: empty frame"
+            return
+        self.ui.frameStatisticsLabel.text = (f"#{frameIndex}: [{frame['min']:.1f}, {frame['max']:.1f}], "
+                                             f"mean {frame['mean']:.2f} ± {frame['std']:.2f}")
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def onComputeSequenceStatisticsButton(self):
+        """ Plot min / mean / max of every frame over the sequence index. """
+        logger.debug("**Widget.onComputeSequenceStatisticsButton(self)")
+        sequenceNode = self.logic.getBrowserVolumeSequence(self._observedBrowserNode) if self._observedBrowserNode else None
+        if sequenceNode is None:
+            slicer.util.errorDisplay("Please select a browser of a volume sequence.")
+            return
+
+        with slicer.util.tryWithErrorDisplay("Failed to compute sequence statistics.", waitCursor=True):
+            result = self.logic.computeSequenceStatistics(sequenceNode, histograms=False)
+            indexValues = [float(v) if self.logic.isNumber(v) else i for i, v in enumerate(result["indexValues"])]
+            curves = np.array([[x, f["min"], f["mean"], f["max"]] for x, f in zip(indexValues, result["frames"]) if f])
+            indexName = f"{sequenceNode.GetIndexName()} ({sequenceNode.GetIndexUnit()})"
+            slicer.util.plot(curves, xColumnIndex=0, columnNames=[indexName, "min", "mean", "max"],
+                             title=f"{sequenceNode.GetName()} statistics", nodes=self._sequencePlotNodes)
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def onRefreshMemoryButton(self):
+        """ Memory footprint of every node of the scene, largest first. """
+        from InputNodeInspectorLib import formatBytes
+        logger.debug("**Widget.onRefreshMemoryButton(self)")
+
+        with slicer.util.tryWithErrorDisplay("Failed to compute memory report.", waitCursor=True):
+            report = self.logic.computeMemoryReport()
+
+            # 1. One row per node referencing data
+            rows = [row for row in report["nodes"] if row["bytes"]]
+            table = self.ui.memoryTableWidget
+            table.setRowCount(len(rows))
+            for rowIndex, row in enumerate(rows):
+                values = [row["name"], row["class"], formatBytes(row["bytes"]), formatBytes(row["sharedBytes"]), str(row["buffers"])]
+                for column, value in enumerate(values):
+                    table.setItem(rowIndex, column, qt.QTableWidgetItem(value))
+            table.resizeColumnsToContents()
+
+            # 2. Sharing and possible duplication
+            self.ui.memorySummaryLabel.text = (f"Total: {formatBytes(report['totalBytes'])} in {len(rows)} nodes"
+                                               f" ({1000 * report['seconds']:.1f} ms)")
+            lines = [f"Shared {formatBytes(b['bytes'])}: {b['description']} <- {', '.join(b['nodes'])}" for b in report["sharedBuffers"]]
+            lines += [f"Possible duplicate, {d['copies']} x {formatBytes(d['bytes'])}: {d['description']} in {', '.join(d['nodes'])}"
+                      for d in report["duplicateCandidates"]]
+            self.ui.memorySharingTextEdit.setPlainText("\n".join(lines) or "No shared or duplicated buffers")
 
 '''=================================================================================================================='''
 '''=================================================================================================================='''
@@ -247,22 +539,39 @@ class InputNodeInspectorWidget(ScriptedLoadableModuleWidget, VTKObservationMixin
 #
 class InputNodeInspectorLogic(ScriptedLoadableModuleLogic):
 
+    # Typed parameters of the SingleTon ParameterNode
+    parameterSchema = ParameterSchema([
+        Parameter("InspectFilePath", str, ""),
+        Parameter("ComputeFileStatistics", bool, False),
+        Parameter("UsePyramidPreview", bool, False),
+        Parameter("MaskSegmentID", str, ""),
+    ], references=("InputNode", "MaskNode", "SequenceBrowser"))
+
     def __init__(self):
         ScriptedLoadableModuleLogic.__init__(self)
-        print("**Logic.__init__(self)")
+        self._maskedStatisticsCache = {}  # (volumeID, maskID, segmentID) -> ((volumeMTime, maskMTime), result)
+        self._maskBoundsCache = {}        # (maskID, segmentID) -> (maskMTime, nonzero IJK bounds)
+        self._pyramidCache = {}           # nodeID or fingerprint -> (MTime or None, VolumePyramid)
+        self._lazyPropertyCache = {}      # (nodeID, property name) -> (MTime, value)
+        self._frameMomentsCache = {}      # (sequenceID, frame index) -> (MTime, min / max / mean / std / voxels)
+        self._frameHistogramCache = {}    # (sequenceID, frame index) -> ((MTime, histogram range, bins), counts)
+        self._sequenceRangeCache = {}     # sequenceID -> (frame MTimes, scalar range of all frames)
+        logger.debug("**Logic.__init__(self)")
 
     # ------------------------------------------------------------------------------------------------------------------
     def setDefaultParameters(self, parameterNode):
         """    Initialize parameter node with defaults if empty.    """
-        print("\t\t\t**Logic.setDefaultParameters(self, parameterNode), \tLM_Roadmap");
+        logger.debug("\t\t\t**Logic.setDefaultParameters(self, parameterNode), \tLM_Roadmap");
         # Node references are empty by default, which is fine.
-        pass
+        self.parameterSchema.setDefaultParameters(parameterNode)
 
     # ------------------------------------------------------------------------------------------------------------------
     def getDimensions(self, node):
         """ Extract dimensions. Supports Volumes and Bounds-based for Surfaces. """
         if not node: return None
-        
+        if not node.IsA("vtkMRMLDisplayableNode"):  # e.g. sequences: no bounds, see getNodeProperties
+            return None
+
         if node.IsA("vtkMRMLScalarVolumeNode"):
             imgData = node.GetImageData()
             if imgData:
@@ -290,6 +599,530 @@ class InputNodeInspectorLogic(ScriptedLoadableModuleLogic):
             return None
         return imgData.GetScalarRange()
 
+    # ------------------------------------------------------------------------------------------------------------------
+    def getNodeProperties(self, node):
+        """ Key properties of any node, from the extractor registered for its class. O(1) metadata calls only. """
+        from InputNodeInspectorLib import getNodeExtractor
+        if not node:
+            return {}
+        return getNodeExtractor(node).cheapProperties(node)
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def getLazyNodePropertyNames(self, node):
+        from InputNodeInspectorLib import getNodeExtractor
+        if not node:
+            return []
+        return list(getNodeExtractor(node).lazyProperties())
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def getLazyNodeProperty(self, node, name, compute=True):
+        """ Expensive property, cached until the node data is modified. With compute=False, None if not cached. """
+        from InputNodeInspectorLib import getNodeExtractor
+        cacheKey = (node.GetID(), name)
+        mtime = self._getDataMTime(node)
+        cached = self._lazyPropertyCache.get(cacheKey)
+        if cached and cached[0] == mtime:
+            return cached[1]
+        if not compute:
+            return None
+        value = getNodeExtractor(node).lazyProperties()[name](node)
+        self._lazyPropertyCache[cacheKey] = (mtime, value)
+        return value
+
+    # ------------------------------------------------------------------------------------------------------------------
+    @staticmethod
+    def formatPropertyValue(value):
+        if isinstance(value, float):
+            return f"{value:.4g}"
+        if isinstance(value, (list, tuple)):
+            if len(value) > 8:
+                return f"{len(value)} items"
+            return "(" + ", ".join(InputNodeInspectorLogic.formatPropertyValue(v) for v in value) + ")"
+        if isinstance(value, int) and not isinstance(value, bool) and value >= 1024 * 1024:
+            return f"{value} ({value / (1024 * 1024):.1f} MB)"
+        return str(value)
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def iterateVoxelSlabs(self, nodeOrFilePath, slabBytes=64 * 1024 * 1024):
+        """ Yield the voxels of a scalar volume node (whole K slices, no copy) or of a NRRD/NIfTI file
+            (memory-mapped or streamed) as slabs of about slabBytes. """
+        from InputNodeInspectorLib import iterateVoxelSlabs, readVolumeFileHeader
+        if isinstance(nodeOrFilePath, str):
+            header = readVolumeFileHeader(nodeOrFilePath)
+            for slab in iterateVoxelSlabs(header, slabBytes):
+                if header.scaleSlope != 1.0 or header.scaleIntercept != 0.0:
+                    slab = slab * header.scaleSlope + header.scaleIntercept
+                yield slab
+            return
+
+        voxels = slicer.util.arrayFromVolume(nodeOrFilePath)  # View on the vtkImageData buffer, shape (K, J, I)
+        slicesPerSlab = max(1, slabBytes // max(1, voxels[0].nbytes))
+        for k in range(0, voxels.shape[0], slicesPerSlab):
+            yield voxels[k:k + slicesPerSlab]
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def computeApproximateStatistics(self, nodeOrFilePath, k=200, numberOfBins=256, histogramRange=None,
+                                     quantiles=(0.01, 0.5, 0.99)):
+        """ Single-pass, fixed-memory statistics: exact min/max/mean/std, approximate quantiles (mergeable KLL
+            sketch, rank error given by QuantileSketch.rankErrorBound(k)) and a fixed-bin histogram.
+            The histogram covers histogramRange, by default the scalar range of the node, or the exact range of
+            the pyramid of a file (read from its sidecar, built and saved on first use). """
+        from InputNodeInspectorLib import StreamingStatistics
+        logger.debug("\t\t\t**Logic.computeApproximateStatistics(self, nodeOrFilePath)")
+        if not isinstance(nodeOrFilePath, str) and (not nodeOrFilePath or not nodeOrFilePath.GetImageData()):
+            return None
+        if histogramRange is None and isinstance(nodeOrFilePath, str):
+            coarseStatistics = self.getCoarseStatistics(nodeOrFilePath)
+            histogramRange = (coarseStatistics["min"], coarseStatistics["max"])
+        elif histogramRange is None:
+            histogramRange = nodeOrFilePath.GetImageData().GetScalarRange()
+        statistics = StreamingStatistics(k, numberOfBins, histogramRange)
+        for slab in self.iterateVoxelSlabs(nodeOrFilePath):
+            statistics.update(slab)
+        return statistics.result(quantiles)
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def getPyramidCachePath(self, fingerprint):
+        """ Sidecar file of the pyramid of a scan, in Slicer's cache folder. """
+        return os.path.join(slicer.app.cachePath, "InputNodeInspector", "Pyramids", fingerprint + ".npz")
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def getPyramid(self, nodeOrFilePath):
+        """ 2x/4x/8x block-mean pyramid of a scalar volume node or NRRD/NIfTI file.
+            Pyramids of files (and of nodes not modified since they were read from a file) are stored as sidecars
+            keyed by a fingerprint of the file, so reopening the same scan skips the rebuild. A sidecar is only
+            reused when the file still has the (size, mtime) or the full content hash it was built from. """
+        from InputNodeInspectorLib import (
+            VolumePyramid,
+            buildPyramid,
+            fileContentHash,
+            fileFingerprint,
+            fileStamp,
+            readVolumeFileHeader,
+        )
+        # 1. Identify the source: a file fingerprint when there is an unmodified file behind the data
+        filePaths = None
+        if isinstance(nodeOrFilePath, str):
+            header = readVolumeFileHeader(nodeOrFilePath)
+            filePaths = sorted({header.path, header.dataPath})
+        else:
+            storageNode = nodeOrFilePath.GetStorageNode()
+            if storageNode and storageNode.GetFileName() and not nodeOrFilePath.GetModifiedSinceRead() \
+                    and os.path.exists(storageNode.GetFileName()):
+                filePaths = [storageNode.GetFileName()]
+
+        if filePaths:
+            cacheKey, mtime = fileFingerprint(*filePaths), fileStamp(*filePaths)
+        else:
+            cacheKey, mtime = nodeOrFilePath.GetID(), self._getDataMTime(nodeOrFilePath)
+
+        # 2. Memory cache, then sidecar cache
+        cached = self._pyramidCache.get(cacheKey)
+        if cached and cached[0] == mtime:
+            return cached[1]
+        sidecarPath = self.getPyramidCachePath(cacheKey) if filePaths else None
+        pyramid = None
+        if sidecarPath and os.path.exists(sidecarPath):
+            try:
+                pyramid = VolumePyramid.load(sidecarPath)
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning("Ignoring unreadable pyramid cache %s: %s", sidecarPath, e)
+        if pyramid is not None and not pyramid.matchesSource(*filePaths):
+            logger.info("Rebuilding the pyramid of %s: the file changed since it was cached", filePaths[-1])
+            pyramid = None
+        elif pyramid is not None and pyramid.sourceStamp != mtime:
+            pyramid.sourceStamp = mtime  # Same content (a copy, a touched file): next time the stamp is enough
+            pyramid.save(sidecarPath)
+
+        # 3. Build (one streaming pass) and store
+        if pyramid is None:
+            logger.debug("\t\t\t**Logic.getPyramid(self): building pyramid for %s", cacheKey)
+            pyramid = buildPyramid(self.iterateVoxelSlabs(nodeOrFilePath))
+            if sidecarPath:
+                pyramid.sourceStamp, pyramid.sourceHash = mtime, fileContentHash(*filePaths)
+                pyramid.save(sidecarPath)
+        self._pyramidCache[cacheKey] = (mtime, pyramid)
+        return pyramid
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def getCoarseStatistics(self, nodeOrFilePath):
+        """ Instant statistics from the coarsest pyramid level: exact range, approximate mean and std. """
+        return self.getPyramid(nodeOrFilePath).coarseStatistics()
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def computeMaskedStatistics(self, volumeNode, maskNode, segmentID=None):
+        """ Intensity statistics of a scalar volume inside a markups ROI, a labelmap or a segment.
+            Only the voxel block covered by the mask is read, and results are cached per (volume, mask) MTime. """
+        from InputNodeInspectorLib import maskedStatistics, sampleBoxOnBlock, sampleLabelmapOnBlock, voxelBlockOfBox
+        logger.debug("\t\t\t**Logic.computeMaskedStatistics(self, volumeNode, maskNode, segmentID)")
+        if not volumeNode or not volumeNode.GetImageData() or not maskNode:
+            return None
+
+        # 1. Cache lookup
+        cacheKey = (volumeNode.GetID(), maskNode.GetID(), segmentID)
+        mtimes = (self._getDataMTime(volumeNode), self._getDataMTime(maskNode, segmentID))
+        cached = self._maskedStatisticsCache.get(cacheKey)
+        if cached and cached[0] == mtimes:
+            return cached[1]
+
+        # 2. Voxel block of the mask in the volume, and the mask sampled on that block
+        voxels = slicer.util.arrayFromVolume(volumeNode)
+        volumeIJKToWorld = self._getIJKToWorldMatrix(volumeNode)
+        worldToVolumeIJK = np.linalg.inv(volumeIJKToWorld)
+        volumeDimensions = voxels.shape[::-1]
+        if maskNode.IsA("vtkMRMLMarkupsROINode"):
+            objectToWorld = slicer.util.arrayFromVTKMatrix(maskNode.GetObjectToWorldMatrix())
+            halfSize = np.array(maskNode.GetSize()) / 2.0
+            block = voxelBlockOfBox(worldToVolumeIJK @ objectToWorld, -halfSize, halfSize, volumeDimensions)
+            if block:
+                maskBlock = sampleBoxOnBlock(np.linalg.inv(objectToWorld) @ volumeIJKToWorld, 2.0 * halfSize, block)
+        else:
+            maskArray, maskIJKToWorld, labelValue = self._getMaskLabelmap(maskNode, segmentID)
+            bounds = self._getMaskBounds(cacheKey[1:], mtimes[1], maskArray, labelValue)
+            block = None
+            if bounds:
+                block = voxelBlockOfBox(worldToVolumeIJK @ maskIJKToWorld, np.array(bounds[0]) - 0.5,
+                                        np.array(bounds[1]) + 0.5, volumeDimensions)
+            if block:
+                maskBlock = sampleLabelmapOnBlock(maskArray, np.linalg.inv(maskIJKToWorld) @ volumeIJKToWorld,
+                                                  block, labelValue)
+
+        # 3. Vectorized statistics of the block
+        if not block:
+            result = {"voxels": 0, "volumeMm3": 0.0}
+        else:
+            spacing = volumeNode.GetSpacing()
+            result = maskedStatistics(voxels[block], maskBlock, spacing[0] * spacing[1] * spacing[2])
+            result["voxelBlock"] = [(axis.start, axis.stop) for axis in block]  # [k, j, i] ranges that were read
+
+        self._maskedStatisticsCache[cacheKey] = (mtimes, result)
+        return result
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def _getDataMTime(self, node, segmentID=None):
+        """ MTime covering the node, its bulk data and its parent transform. """
+        mtime = node.GetMTime()
+        if node.IsA("vtkMRMLVolumeNode") and node.GetImageData():
+            mtime = max(mtime, node.GetImageData().GetMTime())
+        if node.IsA("vtkMRMLModelNode") and node.GetMesh():
+            mtime = max(mtime, node.GetMesh().GetMTime())
+        if node.IsA("vtkMRMLSegmentationNode"):
+            mtime = max(mtime, node.GetSegmentation().GetMTime())
+            labelmap = node.GetBinaryLabelmapInternalRepresentation(segmentID) if segmentID else None
+            if labelmap:
+                mtime = max(mtime, labelmap.GetMTime())
+        transformNode = node.GetParentTransformNode() if node.IsA("vtkMRMLTransformableNode") else None
+        if transformNode:
+            mtime = max(mtime, transformNode.GetMTime())
+        return mtime
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def _getNodeToWorldMatrix(self, node):
+        transformNode = node.GetParentTransformNode()
+        if not transformNode:
+            return np.eye(4)
+        if not transformNode.IsTransformToWorldLinear():
+            raise ValueError(f"{node.GetName()} is under a non-linear transform")
+        nodeToWorld = vtk.vtkMatrix4x4()
+        transformNode.GetMatrixTransformToWorld(nodeToWorld)
+        return slicer.util.arrayFromVTKMatrix(nodeToWorld)
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def _getIJKToWorldMatrix(self, volumeNode):
+        ijkToRAS = vtk.vtkMatrix4x4()
+        volumeNode.GetIJKToRASMatrix(ijkToRAS)
+        return self._getNodeToWorldMatrix(volumeNode) @ slicer.util.arrayFromVTKMatrix(ijkToRAS)
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def _getMaskLabelmap(self, maskNode, segmentID):
+        """ (voxel array [k, j, i], array index to world matrix, label value or None for 'non-zero'). No copy. """
+        if maskNode.IsA("vtkMRMLLabelMapVolumeNode"):
+            return slicer.util.arrayFromVolume(maskNode), self._getIJKToWorldMatrix(maskNode), None
+
+        if not segmentID:
+            raise ValueError("Please select a segment of the segmentation.")
+        maskNode.CreateBinaryLabelmapRepresentation()  # No-op when it already exists
+        labelmap = maskNode.GetBinaryLabelmapInternalRepresentation(segmentID)
+        labelValue = maskNode.GetSegmentation().GetSegment(segmentID).GetLabelValue()
+        dimensions = labelmap.GetDimensions() if labelmap else (0, 0, 0)
+        if min(dimensions) <= 0 or not labelmap.GetPointData().GetScalars():
+            return np.zeros((0, 0, 0), dtype=np.uint8), np.eye(4), labelValue
+
+        # Internal labelmaps are cropped: fold the first extent index into the matrix so array indices start at 0
+        from vtk.util import numpy_support
+        maskArray = numpy_support.vtk_to_numpy(labelmap.GetPointData().GetScalars()).reshape(dimensions[::-1])
+        imageToWorld = vtk.vtkMatrix4x4()
+        labelmap.GetImageToWorldMatrix(imageToWorld)
+        extent = labelmap.GetExtent()
+        extentShift = np.eye(4)
+        extentShift[:3, 3] = extent[0], extent[2], extent[4]
+        arrayToWorld = self._getNodeToWorldMatrix(maskNode) @ slicer.util.arrayFromVTKMatrix(imageToWorld) @ extentShift
+        return maskArray, arrayToWorld, labelValue
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def _getMaskBounds(self, cacheKey, maskMTime, maskArray, labelValue):
+        """ Non-zero IJK bounds of a labelmap mask. Scanning the mask is paid once per mask modification. """
+        from InputNodeInspectorLib import nonzeroBounds
+        cached = self._maskBoundsCache.get(cacheKey)
+        if cached and cached[0] == maskMTime:
+            return cached[1]
+        bounds = nonzeroBounds(maskArray, labelValue) if maskArray.size else None
+        self._maskBoundsCache[cacheKey] = (maskMTime, bounds)
+        return bounds
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def getBrowserVolumeSequence(self, browserNode):
+        """ First scalar volume sequence browsed by a sequence browser, or None. """
+        sequenceNodes = vtk.vtkCollection()
+        browserNode.GetSynchronizedSequenceNodes(sequenceNodes, True)
+        for index in range(sequenceNodes.GetNumberOfItems()):
+            sequenceNode = sequenceNodes.GetItemAsObject(index)
+            if sequenceNode.GetNumberOfDataNodes() and sequenceNode.GetNthDataNode(0).IsA("vtkMRMLScalarVolumeNode"):
+                return sequenceNode
+        return None
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def getBrowserFrameIndex(self, browserNode, sequenceNode):
+        """ Item of sequenceNode displayed by the browser (-1 if none). """
+        # Renamed from "master" to "primary" in Slicer 5.4
+        getPrimarySequence = getattr(browserNode, "GetPrimarySequenceNode", None) or browserNode.GetMasterSequenceNode
+        primarySequenceNode = getPrimarySequence()
+        selectedItem = browserNode.GetSelectedItemNumber()
+        if sequenceNode is primarySequenceNode or selectedItem < 0:
+            return selectedItem
+        return sequenceNode.GetItemNumberFromIndexValue(primarySequenceNode.GetNthIndexValue(selectedItem))
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def computeSequenceStatistics(self, sequenceNode, numberOfBins=64, frameIndices=None, numberOfThreads=None,
+                                  histograms=True):
+        """ Range, mean, std and, with histograms, histogram of frames of a volume sequence (all frames by default).
+            Histograms of all frames share the range of the whole sequence. Frames without image data are reported
+            in "emptyFrames", with None statistics. Moments and histograms are cached until the frame is modified. """
+        from InputNodeInspectorLib import computeFrameStatistics, histogramEdges
+        logger.debug("\t\t\t**Logic.computeSequenceStatistics(self, %s)", sequenceNode.GetName())
+        sequenceID = sequenceNode.GetID()
+        numberOfFrames = sequenceNode.GetNumberOfDataNodes()
+        frameIndices = list(range(numberOfFrames) if frameIndices is None else frameIndices)
+        imageData = {frameIndex: self.getFrameImageData(sequenceNode, frameIndex) for frameIndex in frameIndices}
+
+        # 1. Common histogram range, only needed for histograms, recomputed when a frame is modified
+        histogramRange = self.getSequenceScalarRange(sequenceNode) if histograms else None
+
+        # 2. Cached frames: moments by frame MTime, histograms also by range and bins
+        results, frames = {}, {}
+        for frameIndex in frameIndices:
+            if imageData[frameIndex] is None:
+                results[frameIndex] = None
+                continue
+            frameMTime = imageData[frameIndex].GetMTime()
+            moments = self._frameMomentsCache.get((sequenceID, frameIndex))
+            histogram = self._frameHistogramCache.get((sequenceID, frameIndex))
+            momentsCached = moments is not None and moments[0] == frameMTime
+            if momentsCached and not histograms:
+                results[frameIndex] = moments[1]
+            elif momentsCached and histogram and histogram[0] == (frameMTime, histogramRange, numberOfBins):
+                results[frameIndex] = dict(moments[1], histogram=histogram[1])
+            else:
+                frames[frameIndex] = slicer.util.arrayFromVolume(sequenceNode.GetNthDataNode(frameIndex))  # View, no copy
+
+        # 3. Missing frames, in parallel: the voxels are already in memory
+        computed = computeFrameStatistics(frames.__getitem__, frames, histogramRange, numberOfBins, numberOfThreads)
+        for frameIndex, statistics in computed.items():
+            frameMTime = imageData[frameIndex].GetMTime()
+            moments = {name: value for name, value in statistics.items() if name != "histogram"}
+            self._frameMomentsCache[(sequenceID, frameIndex)] = (frameMTime, moments)
+            if histograms:
+                self._frameHistogramCache[(sequenceID, frameIndex)] = ((frameMTime, histogramRange, numberOfBins),
+                                                                       statistics["histogram"])
+            results[frameIndex] = statistics
+
+        return {
+            "frames": [results[frameIndex] for frameIndex in frameIndices],
+            "indexValues": [sequenceNode.GetNthIndexValue(frameIndex) for frameIndex in frameIndices],
+            "histogramEdges": histogramEdges(histogramRange, numberOfBins) if histogramRange else [],
+            "emptyFrames": [frameIndex for frameIndex in frameIndices if results[frameIndex] is None],
+            "computedFrames": len(computed),
+        }
+
+    # ------------------------------------------------------------------------------------------------------------------
+    @staticmethod
+    def getFrameImageData(sequenceNode, frameIndex):
+        """ Image data of a frame of a volume sequence, None if the frame has no voxels. """
+        dataNode = sequenceNode.GetNthDataNode(frameIndex)
+        imageData = dataNode.GetImageData() if dataNode and dataNode.IsA("vtkMRMLVolumeNode") else None
+        return imageData if imageData and imageData.GetNumberOfPoints() else None
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def getSequenceScalarRange(self, sequenceNode):
+        """ Scalar range of all the non-empty frames of a volume sequence (None if all are empty), cached until a
+            frame is modified, added or removed. """
+        numberOfFrames = sequenceNode.GetNumberOfDataNodes()
+        imageData = [self.getFrameImageData(sequenceNode, index) for index in range(numberOfFrames)]
+        frameMTimes = tuple(data.GetMTime() if data else None for data in imageData)
+        cached = self._sequenceRangeCache.get(sequenceNode.GetID())
+        if cached and cached[0] == frameMTimes:
+            return cached[1]
+        ranges = [data.GetScalarRange() for data in imageData if data]
+        scalarRange = (min(r[0] for r in ranges), max(r[1] for r in ranges)) if ranges else None
+        self._sequenceRangeCache[sequenceNode.GetID()] = (frameMTimes, scalarRange)
+        return scalarRange
+
+    # ------------------------------------------------------------------------------------------------------------------
+    @staticmethod
+    def isNumber(text):
+        try:
+            float(text)
+            return True
+        except ValueError:
+            return False
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def computeMemoryReport(self, nodes=None):
+        """ Buffers referenced by every node of the scene (or by the given nodes), sorted by footprint.
+            Only VTK array sizes are read, never the values, so this is fast even for large scenes. """
+        from InputNodeInspectorLib import buildMemoryReport
+        logger.debug("\t\t\t**Logic.computeMemoryReport(self)")
+        start = time.perf_counter()
+        if nodes is None:
+            nodes = getSceneIndex().getNodes()
+        report = buildMemoryReport(({"id": node.GetID(), "name": node.GetName(), "class": node.GetClassName()},
+                                    self._getNodeBuffers(node)) for node in nodes)
+        report["seconds"] = time.perf_counter() - start
+        return report
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def _getNodeBuffers(self, node):
+        """ Data objects of a node: image data, mesh, markups curve, segment representations, display outputs. """
+        dataObjects = []
+        if node.IsA("vtkMRMLVolumeNode"):
+            dataObjects.append(("image", node.GetImageData()))
+        if node.IsA("vtkMRMLModelNode"):
+            dataObjects.append(("mesh", node.GetMesh()))
+        if node.IsA("vtkMRMLMarkupsNode"):
+            dataObjects += [("curve", node.GetCurve()), ("world curve", node.GetCurveWorld())]
+        if node.IsA("vtkMRMLSegmentationNode"):
+            segmentation = node.GetSegmentation()
+            for index in range(segmentation.GetNumberOfSegments()):
+                segment = segmentation.GetNthSegment(index)
+                names = []
+                segment.GetContainedRepresentationNames(names)
+                dataObjects += [(f"{segment.GetName()} {name}", segment.GetRepresentation(name)) for name in names]
+        if node.IsA("vtkMRMLDisplayableNode"):
+            for index in range(node.GetNumberOfDisplayNodes()):
+                displayNode = node.GetNthDisplayNode(index)
+                if displayNode and hasattr(displayNode, "GetOutputMesh"):
+                    dataObjects.append(("display output", displayNode.GetOutputMesh()))
+
+        buffers = []
+        for role, dataObject in dataObjects:
+            if dataObject is not None:
+                buffers += [self._describeArrayBuffer(role, array) for array in self._getDataObjectArrays(dataObject)
+                            if array is not None and array.GetNumberOfValues() > 0]
+        return buffers
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def _getDataObjectArrays(self, dataObject):
+        """ Attribute arrays, points and cell connectivity of a data set. """
+        arrays = []
+        if dataObject.IsA("vtkDataSet"):
+            for attributes in (dataObject.GetPointData(), dataObject.GetCellData(), dataObject.GetFieldData()):
+                arrays += [attributes.GetAbstractArray(index) for index in range(attributes.GetNumberOfArrays())]
+        if dataObject.IsA("vtkPointSet") and dataObject.GetPoints():
+            arrays.append(dataObject.GetPoints().GetData())
+        if dataObject.IsA("vtkPolyData"):
+            for cells in (dataObject.GetVerts(), dataObject.GetLines(), dataObject.GetPolys(), dataObject.GetStrips()):
+                if cells and cells.GetNumberOfCells():
+                    arrays += [cells.GetOffsetsArray(), cells.GetConnectivityArray()]
+        return arrays
+
+    # ------------------------------------------------------------------------------------------------------------------
+    @staticmethod
+    def _describeArrayBuffer(role, array):
+        # Arrays sharing memory (shallow copies) have the same data pointer. Avoid GetVoidPointer on non-contiguous
+        # arrays: it would make a contiguous copy.
+        if array.HasStandardMemoryLayout():
+            key = array.GetVoidPointer(0)
+        else:
+            key = array.GetAddressAsString("vtkAbstractArray")
+        return {
+            "key": key,
+            "bytes": array.GetNumberOfValues() * array.GetDataTypeSize(),
+            "description": f"{role} {array.GetName() or array.GetClassName()}",
+            "signature": (array.GetName(), array.GetDataType(), array.GetNumberOfValues()),
+        }
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def inspectFile(self, filePath, computeStatistics=False):
+        """ Header-only inspection of a NRRD/NIfTI file. Voxels are only read (memory-mapped) for statistics. """
+        from InputNodeInspectorLib import computeFileStatistics, readVolumeFileHeader
+        header = readVolumeFileHeader(filePath)
+        report = header.toDict()
+        if computeStatistics:
+            report["statistics"] = computeFileStatistics(header)
+        return report
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def inspectFolder(self, folderPath, computeStatistics=False):
+        """ Inspect every NRRD/NIfTI file of a folder. Unreadable files are reported, not raised. """
+        from InputNodeInspectorLib import isSupportedVolumeFile
+        reports = []
+        for fileName in sorted(os.listdir(folderPath)):
+            filePath = os.path.join(folderPath, fileName)
+            if not os.path.isfile(filePath) or not isSupportedVolumeFile(filePath):
+                continue
+            try:
+                reports.append(self.inspectFile(filePath, computeStatistics))
+            except (OSError, ValueError) as e:
+                reports.append({"path": filePath, "error": str(e)})
+        return reports
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def inspectStudyDirectory(self, directoryPath, outputPath, computeStatistics=True, numberOfProcesses=None,
+                              progressCallback=None):
+        """ Batch QC of a directory of volumes and models into one CSV / JSON-lines report.
+            Headers are parsed in a thread pool, statistics in a process pool; an existing partial report is resumed. """
+        from InputNodeInspectorLib import runBatchInspection
+        logger.debug("\t\t\t**Logic.inspectStudyDirectory(self, %s, %s)", directoryPath, outputPath)
+        pythonExecutable = self.getPythonSlicerExecutable() if computeStatistics and numberOfProcesses != 0 else None
+        return runBatchInspection(directoryPath, outputPath, computeStatistics=computeStatistics,
+                                  numberOfProcesses=numberOfProcesses, pythonExecutable=pythonExecutable,
+                                  progressCallback=progressCallback)
+
+    # ------------------------------------------------------------------------------------------------------------------
+    @staticmethod
+    def getPythonSlicerExecutable():
+        """ PythonSlicer of this Slicer installation, to start worker processes: Slicer's sys.executable is the
+            application itself, which cannot run a multiprocessing worker. Raises RuntimeError if it is not found. """
+        fileName = "PythonSlicer.exe" if os.name == "nt" else "PythonSlicer"
+        candidates = [os.path.join(os.path.dirname(sys.executable), fileName),
+                      os.path.join(slicer.app.slicerHome, "bin", fileName),
+                      shutil.which("PythonSlicer")]
+        for candidate in candidates:
+            if candidate and os.path.isfile(candidate) and os.access(candidate, os.X_OK):
+                return candidate
+        raise RuntimeError(f"PythonSlicer not found (looked in {', '.join(filter(None, candidates))} and the PATH)")
+
+    # ------------------------------------------------------------------------------------------------------------------
+    @staticmethod
+    def formatFileReport(report):
+        """ Human readable summary of an inspectFile() report. """
+        if "error" in report:
+            return f"{os.path.basename(report['path'])}\n  Error: {report['error']}"
+        spacing = report["spacing"]
+        origin = report["origin"]
+        lines = [
+            f"{os.path.basename(report['path'])} ({report['format']}, {report['encoding']})",
+            f"  Dimensions: {tuple(report['dimensions'])} x {report['components']} component(s), {report['dataType']}",
+            f"  Spacing: ({spacing[0]:.3f}, {spacing[1]:.3f}, {spacing[2]:.3f})",
+            f"  Origin: ({origin[0]:.1f}, {origin[1]:.1f}, {origin[2]:.1f})",
+            f"  Size: {report['onDiskSize'] / 2**20:.1f} MB on disk, {report['inMemorySize'] / 2**20:.1f} MB in memory",
+        ]
+        statistics = report.get("statistics")
+        if statistics:
+            lines.append(f"  Range: [{statistics['min']:.1f}, {statistics['max']:.1f}], "
+                         f"mean {statistics['mean']:.2f}, std {statistics['std']:.2f}")
+        return "\n".join(lines)
+
 '''=================================================================================================================='''
 '''=================================================================================================================='''
 #
@@ -304,13 +1137,24 @@ class InputNodeInspectorTest(ScriptedLoadableModuleTest):
     def runTest(self):
         self.setUp()
         self.test_InputNodeInspector_Logic()
+        self.test_InputNodeInspector_FileHeader()
+        self.test_InputNodeInspector_BatchReport()
+        self.test_InputNodeInspector_ApproximateStatistics()
+        self.test_InputNodeInspector_MaskedStatistics()
+        self.test_InputNodeInspector_Pyramid()
+        self.test_InputNodeInspector_NodeProperties()
+        self.test_InputNodeInspector_SceneIndex()
+        self.test_InputNodeInspector_MemoryReport()
+        self.test_InputNodeInspector_SequenceStatistics()
+        self.test_InputNodeInspector_SampleDataStore()
+        self.test_InputNodeInspector_LazyImports()
 
     # ------------------------------------------------------------------------------------------------------------------
     def test_InputNodeInspector_Logic(self):
         self.delayDisplay("Starting the test")
 
-        registerSampleData()
         import SampleData
+        registerSampleData()
         inputVolume = SampleData.downloadSample("InputNodeInspector1")
         
         logic = InputNodeInspectorLogic()
@@ -324,3 +1168,478 @@ class InputNodeInspectorTest(ScriptedLoadableModuleTest):
         self.assertIsNotNone(scalarRange)
         
         self.delayDisplay('Test passed')
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def test_InputNodeInspector_FileHeader(self):
+        self.delayDisplay("Starting the file header test")
+
+        import numpy as np
+        voxels = np.arange(4 * 5 * 6, dtype=np.int16).reshape(6, 5, 4)
+        filePath = os.path.join(slicer.app.temporaryPath, "InputNodeInspectorHeaderTest.nrrd")
+        with open(filePath, "wb") as f:
+            f.write(b"NRRD0004\ntype: short\ndimension: 3\nspace: left-posterior-superior\nsizes: 4 5 6\n"
+                    b"space directions: (0.5,0,0) (0,0.5,0) (0,0,2)\nendian: little\nencoding: raw\n"
+                    b"space origin: (10,20,30)\n\n")
+            f.write(voxels.tobytes())
+
+        logic = InputNodeInspectorLogic()
+
+        # Header only
+        report = logic.inspectFile(filePath)
+        self.assertEqual(report["dimensions"], [4, 5, 6])
+        self.assertEqual(report["spacing"], [0.5, 0.5, 2.0])
+        self.assertEqual(report["origin"], [-10.0, -20.0, 30.0])
+        self.assertEqual(report["dataType"], "int16")
+        self.assertEqual(report["inMemorySize"], voxels.nbytes)
+        self.assertNotIn("statistics", report)
+
+        # Memory-mapped statistics
+        report = logic.inspectFile(filePath, computeStatistics=True)
+        self.assertEqual(report["statistics"]["max"], voxels.max())
+        self.assertAlmostEqual(report["statistics"]["mean"], voxels.mean())
+
+        # Folder triage
+        reports = logic.inspectFolder(slicer.app.temporaryPath)
+        self.assertIn(filePath, [r["path"] for r in reports])
+
+        self.delayDisplay('Test passed')
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def test_InputNodeInspector_BatchReport(self):
+        self.delayDisplay("Starting the batch report test")
+
+        import csv
+        import struct
+        studyPath = os.path.join(slicer.app.temporaryPath, "InputNodeInspectorStudy")
+        os.makedirs(studyPath, exist_ok=True)
+        reportPath = os.path.join(slicer.app.temporaryPath, "InputNodeInspectorStudy.csv")
+        for path in (reportPath, reportPath[:-len(".csv")] + ".jsonl"):
+            if os.path.exists(path):
+                os.remove(path)
+
+        # One raw NRRD volume and one binary STL model with 2 triangles
+        with open(os.path.join(studyPath, "volume.nrrd"), "wb") as f:
+            f.write(b"NRRD0004\ntype: uchar\ndimension: 3\nsizes: 2 2 2\nencoding: raw\n\n" + bytes(range(8)))
+        with open(os.path.join(studyPath, "model.stl"), "wb") as f:
+            f.write(b"\0" * 80 + struct.pack("<I", 2) + b"\0" * 100)
+
+        logic = InputNodeInspectorLogic()
+        summary = logic.inspectStudyDirectory(studyPath, reportPath, numberOfProcesses=0)
+        self.assertEqual(summary["written"], 2)
+        self.assertEqual(summary["errors"], 0)
+
+        with open(reportPath, newline="") as f:
+            rows = {os.path.basename(row["path"]): row for row in csv.DictReader(f)}
+        self.assertEqual(rows["volume.nrrd"]["max"], "7.0")
+        self.assertEqual(rows["model.stl"]["numberOfCells"], "2")
+        self.assertTrue(rows["volume.nrrd"]["headerSeconds"])
+
+        # Restart: everything is already reported
+        summary = logic.inspectStudyDirectory(studyPath, reportPath, numberOfProcesses=0)
+        self.assertEqual(summary["written"], 0)
+        self.assertEqual(summary["skipped"], 2)
+
+        # Restart after an interruption in the middle of the last row, in both formats: that file is inspected again
+        from InputNodeInspectorLib import readReportRows
+        for path in (reportPath, reportPath[:-len(".csv")] + ".jsonl"):
+            if not os.path.exists(path):
+                logic.inspectStudyDirectory(studyPath, path, numberOfProcesses=0)
+            with open(path, "rb") as f:
+                content = f.read()
+            with open(path, "wb") as f:
+                f.write(content[:-20])
+            summary = logic.inspectStudyDirectory(studyPath, path, numberOfProcesses=0)
+            self.assertEqual((summary["written"], summary["skipped"]), (1, 1))
+            self.assertEqual(sorted(os.path.basename(row["path"]) for row in readReportRows(path)),
+                             ["model.stl", "volume.nrrd"])
+
+        # Failed files are retried by every run, and keep a single row
+        brokenPath = os.path.join(studyPath, "broken.nrrd")
+        with open(brokenPath, "wb") as f:
+            f.write(b"NRRD0004\ntype: nonsense\n\n")
+        try:
+            for _ in range(3):
+                summary = logic.inspectStudyDirectory(studyPath, reportPath, numberOfProcesses=0)
+                self.assertEqual((summary["written"], summary["errors"]), (1, 1))
+            statuses = [(os.path.basename(row["path"]), row["status"]) for row in readReportRows(reportPath)]
+            self.assertEqual(sorted(statuses), [("broken.nrrd", "error"), ("model.stl", "ok"), ("volume.nrrd", "ok")])
+        finally:
+            os.remove(brokenPath)
+
+        self.delayDisplay('Test passed')
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def test_InputNodeInspector_ApproximateStatistics(self):
+        self.delayDisplay("Starting the approximate statistics test")
+
+        import numpy as np
+        from InputNodeInspectorLib import QuantileSketch, StreamingStatistics
+
+        voxels = np.random.default_rng(0).normal(100.0, 20.0, size=(64, 64, 64)).astype(np.float32)
+        volumeNode = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLScalarVolumeNode")
+        slicer.util.updateVolumeFromArray(volumeNode, voxels)
+
+        logic = InputNodeInspectorLogic()
+        result = logic.computeApproximateStatistics(volumeNode)
+        self.assertEqual(result["voxels"], voxels.size)
+        self.assertAlmostEqual(result["mean"], float(voxels.mean()), places=3)
+
+        # Quantiles must be within the documented rank error
+        sortedVoxels = np.sort(voxels, axis=None)
+        for fraction, value in result["quantiles"].items():
+            rank = np.searchsorted(sortedVoxels, value) / sortedVoxels.size
+            self.assertLess(abs(rank - fraction), QuantileSketch.rankErrorBound(200))
+        self.assertEqual(sum(result["histogram"]["counts"]) + result["histogram"]["underflow"]
+                         + result["histogram"]["overflow"], voxels.size)
+
+        # Sketches from parallel workers merge into the same answer
+        first, second = StreamingStatistics(histogramRange=(0, 200)), StreamingStatistics(histogramRange=(0, 200))
+        first.update(voxels[:32])
+        second.update(voxels[32:])
+        merged = first.merge(second).result()
+        self.assertEqual(merged["voxels"], voxels.size)
+        self.assertAlmostEqual(merged["quantiles"][0.5], result["quantiles"][0.5], delta=2.0)
+        other = StreamingStatistics()
+        other.update(voxels[:1])  # Bins fixed on its own first slab
+        with self.assertRaises(ValueError):
+            first.merge(other)
+        self.assertEqual(first.count, voxels.size)  # Left unchanged
+
+        # Float volume whose first slab is background: the bins still cover the whole range, for nodes and files
+        voxels[:8] = 0.0
+        slicer.util.updateVolumeFromArray(volumeNode, voxels)
+        filePath = os.path.join(slicer.app.temporaryPath, "InputNodeInspectorBackground.nrrd")
+        slicer.util.saveNode(volumeNode, filePath)
+        for nodeOrFilePath in (volumeNode, filePath):
+            histogram = logic.computeApproximateStatistics(nodeOrFilePath)["histogram"]
+            self.assertEqual((histogram["underflow"], histogram["overflow"]), (0, 0))
+            self.assertAlmostEqual(histogram["edges"][-1], float(voxels.max()), places=3)
+            self.assertEqual(sum(histogram["counts"]), voxels.size)
+
+        self.delayDisplay('Test passed')
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def test_InputNodeInspector_MaskedStatistics(self):
+        self.delayDisplay("Starting the masked statistics test")
+
+        import numpy as np
+        voxels = np.random.default_rng(0).random((40, 50, 60)).astype(np.float32)
+        volumeNode = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLScalarVolumeNode")
+        slicer.util.updateVolumeFromArray(volumeNode, voxels)
+
+        logic = InputNodeInspectorLogic()
+
+        # 1. ROI: 5x5x5 voxel centers around (10, 10, 10)
+        roiNode = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLMarkupsROINode")
+        roiNode.SetCenter(10, 10, 10)
+        roiNode.SetSize(5, 5, 5)
+        result = logic.computeMaskedStatistics(volumeNode, roiNode)
+        self.assertEqual(result["voxels"], 125)
+        self.assertAlmostEqual(result["mean"], float(voxels[8:13, 8:13, 8:13].mean()), places=5)
+
+        # 2. Labelmap on the same grid; only the mask block is read
+        mask = np.zeros(voxels.shape, dtype=np.uint8)
+        mask[10:20, 5:15, 30:45] = 1
+        labelmapNode = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLLabelMapVolumeNode")
+        slicer.util.updateVolumeFromArray(labelmapNode, mask)
+        result = logic.computeMaskedStatistics(volumeNode, labelmapNode)
+        self.assertEqual(result["voxels"], int(mask.sum()))
+        self.assertAlmostEqual(result["mean"], float(voxels[mask > 0].mean()), places=5)
+        self.assertLess(np.prod([stop - start for start, stop in result["voxelBlock"]]), voxels.size / 10)
+
+        # 3. Cached until the volume or the mask is modified
+        self.assertIs(logic.computeMaskedStatistics(volumeNode, labelmapNode), result)
+        roiNode.SetSize(7, 7, 7)
+        self.assertEqual(logic.computeMaskedStatistics(volumeNode, roiNode)["voxels"], 343)
+
+        self.delayDisplay('Test passed')
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def test_InputNodeInspector_Pyramid(self):
+        self.delayDisplay("Starting the pyramid test")
+
+        import numpy as np
+        from InputNodeInspectorLib import fileFingerprint
+        voxels = np.random.default_rng(0).integers(-1000, 3000, size=(33, 40, 51)).astype(np.int16)
+        filePath = os.path.join(slicer.app.temporaryPath, "InputNodeInspectorPyramidTest.nrrd")
+        with open(filePath, "wb") as f:
+            f.write(b"NRRD0004\ntype: short\ndimension: 3\nsizes: 51 40 33\nendian: little\nencoding: raw\n\n")
+            f.write(voxels.tobytes())
+
+        logic = InputNodeInspectorLogic()
+        pyramid = logic.getPyramid(filePath)
+        self.assertEqual(sorted(pyramid.levels), [2, 4, 8])
+        self.assertEqual(pyramid.levels[8].shape, (5, 5, 7))
+
+        # Range read from the coarsest level is exact
+        preview = logic.getCoarseStatistics(filePath)
+        self.assertEqual(preview["min"], voxels.min())
+        self.assertEqual(preview["max"], voxels.max())
+
+        # A new logic (e.g. next session) reuses the sidecar instead of rebuilding
+        sidecarPath = logic.getPyramidCachePath(fileFingerprint(filePath))
+        self.assertTrue(os.path.exists(sidecarPath))
+        otherLogic = InputNodeInspectorLogic()
+        otherLogic.iterateVoxelSlabs = None  # Would fail if the pyramid was rebuilt
+        self.assertTrue(np.array_equal(otherLogic.getPyramid(filePath).levels[8], pyramid.levels[8]))
+
+        # An in-place edit the sampled fingerprint cannot see (same size, bytes between two samples) still rebuilds
+        voxels = np.random.default_rng(1).integers(-1000, 3000, size=(64, 128, 128)).astype(np.int16)
+        header = b"NRRD0004\ntype: short\ndimension: 3\nsizes: 128 128 64\nendian: little\nencoding: raw\n\n"
+        with open(filePath, "wb") as f:
+            f.write(header + voxels.tobytes())
+        self.assertEqual(logic.getCoarseStatistics(filePath)["max"], voxels.max())
+        fingerprint = fileFingerprint(filePath)
+        mtime = os.stat(filePath).st_mtime_ns
+        with open(filePath, "r+b") as f:
+            f.seek(70000)  # Between the first two 64 KB samples
+            f.write(np.full(100, 32000, dtype=np.int16).tobytes())
+        os.utime(filePath, ns=(mtime + 10 ** 9, mtime + 10 ** 9))  # Whatever the file system's mtime resolution
+        self.assertEqual(fileFingerprint(filePath), fingerprint)
+        self.assertEqual(logic.getCoarseStatistics(filePath)["max"], 32000)
+        self.assertEqual(InputNodeInspectorLogic().getCoarseStatistics(filePath)["max"], 32000)
+
+        # A touched but unchanged file is confirmed by its content hash
+        os.utime(filePath, ns=(mtime + 2 * 10 ** 9, mtime + 2 * 10 ** 9))
+        otherLogic = InputNodeInspectorLogic()
+        otherLogic.iterateVoxelSlabs = None
+        self.assertEqual(otherLogic.getCoarseStatistics(filePath)["max"], 32000)
+
+        self.delayDisplay('Test passed')
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def test_InputNodeInspector_NodeProperties(self):
+        self.delayDisplay("Starting the node properties test")
+
+        from InputNodeInspectorLib import NodePropertyExtractor, registerNodeExtractor, unregisterNodeExtractor
+        logic = InputNodeInspectorLogic()
+
+        # 1. Each node class is dispatched to its own extractor
+        markupsNode = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLMarkupsFiducialNode")
+        for i in range(3):
+            markupsNode.AddControlPoint(i, 0, 0)
+        self.assertEqual(logic.getNodeProperties(markupsNode)["Control points"], 3)
+
+        sphere = vtk.vtkSphereSource()
+        sphere.Update()
+        modelNode = slicer.modules.models.logic().AddModel(sphere.GetOutput())
+        properties = logic.getNodeProperties(modelNode)
+        self.assertEqual(properties["Points"], sphere.GetOutput().GetNumberOfPoints())
+        self.assertGreater(properties["Memory (bytes)"], 0)
+
+        segmentationNode = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLSegmentationNode")
+        segmentationNode.GetSegmentation().AddEmptySegment("first")
+        self.assertEqual(logic.getNodeProperties(segmentationNode)["Segments"], 1)
+        self.assertTrue(logic.getNodeProperties(slicer.mrmlScene.AddNewNodeByClass("vtkMRMLLinearTransformNode"))["Linear"])
+
+        # 2. Expensive properties are computed on request and cached until the data changes
+        self.assertIsNone(logic.getLazyNodeProperty(modelNode, "Bounds", compute=False))
+        bounds = logic.getLazyNodeProperty(modelNode, "Bounds")
+        self.assertIs(logic.getLazyNodeProperty(modelNode, "Bounds", compute=False), bounds)
+        self.assertEqual(logic.getLazyNodeProperty(segmentationNode, "Segment names"), ["first"])
+
+        # 3. Registered extractors take precedence for their classes
+        class FiducialExtractor(NodePropertyExtractor):
+            nodeClass = "vtkMRMLMarkupsFiducialNode"
+        extractor = FiducialExtractor()
+        registerNodeExtractor(extractor)
+        self.assertNotIn("Control points", logic.getNodeProperties(markupsNode))
+        self.assertIn("Points", logic.getNodeProperties(modelNode))
+        unregisterNodeExtractor(extractor)
+        self.assertIn("Control points", logic.getNodeProperties(markupsNode))
+
+        self.delayDisplay('Test passed')
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def test_InputNodeInspector_SceneIndex(self):
+        self.delayDisplay("Starting the scene index test")
+
+        import numpy as np
+        sceneIndex = getSceneIndex()
+        numberOfVolumes = sceneIndex.getCount("vtkMRMLVolumeNode")
+
+        # 1. Nodes are filed under their class and superclasses as they are added / removed
+        scalarNode = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLScalarVolumeNode")
+        labelmapNode = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLLabelMapVolumeNode")
+        self.assertEqual(sceneIndex.getCount("vtkMRMLVolumeNode"), numberOfVolumes + 2)
+        self.assertIn(labelmapNode, sceneIndex.getNodes("vtkMRMLScalarVolumeNode"))  # Subclass, as with IsA()
+        self.assertIs(sceneIndex.getFirstNode("vtkMRMLScalarVolumeNode"), slicer.mrmlScene.GetFirstNodeByClass("vtkMRMLScalarVolumeNode"))
+        slicer.mrmlScene.RemoveNode(labelmapNode)
+        self.assertNotIn(labelmapNode, sceneIndex.getNodes("vtkMRMLVolumeNode"))
+
+        # Views showing counts are called back once the index is up to date, until they are deleted
+        class VolumeCountView:
+            def __init__(self):
+                self.counts = []
+
+            def onNodeAddedOrRemoved(self, nodeOrNodeID):
+                self.counts.append(sceneIndex.getCount("vtkMRMLVolumeNode"))
+
+        view = VolumeCountView()
+        sceneIndex.addNodeAddedCallback(view.onNodeAddedOrRemoved)
+        sceneIndex.addNodeRemovedCallback(view.onNodeAddedOrRemoved)
+        otherNode = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLScalarVolumeNode")
+        slicer.mrmlScene.RemoveNode(otherNode)
+        self.assertEqual(view.counts, [numberOfVolumes + 2, numberOfVolumes + 1])
+        del view
+
+        # 2. Memory totals follow data modifications
+        memory = sceneIndex.getMemory("vtkMRMLVolumeNode")
+        slicer.util.updateVolumeFromArray(scalarNode, np.zeros((64, 64, 64), dtype=np.float32))
+        self.assertGreaterEqual(sceneIndex.getMemory("vtkMRMLVolumeNode") - memory, 64 ** 3 * 4)
+        slicer.mrmlScene.RemoveNode(scalarNode)
+        self.assertEqual(sceneIndex.getMemory("vtkMRMLVolumeNode"), memory)
+
+        # 3. Consistent with a full scan after a scene close
+        slicer.mrmlScene.Clear()
+        self.assertEqual(sceneIndex.getCount(), slicer.mrmlScene.GetNumberOfNodes())
+
+        self.delayDisplay('Test passed')
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def test_InputNodeInspector_MemoryReport(self):
+        self.delayDisplay("Starting the memory report test")
+
+        import numpy as np
+        voxels = np.zeros((64, 128, 128), dtype=np.int16)  # 2 MB, above the duplicate reporting threshold
+        volumeNode = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLScalarVolumeNode")
+        slicer.util.updateVolumeFromArray(volumeNode, voxels)
+
+        # A second volume sharing the same image data, and a third holding a deep copy of it
+        sharingNode = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLScalarVolumeNode")
+        sharingNode.SetAndObserveImageData(volumeNode.GetImageData())
+        copyNode = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLScalarVolumeNode")
+        imageCopy = vtk.vtkImageData()
+        imageCopy.DeepCopy(volumeNode.GetImageData())
+        copyNode.SetAndObserveImageData(imageCopy)
+
+        logic = InputNodeInspectorLogic()
+        report = logic.computeMemoryReport([volumeNode, sharingNode, copyNode])
+        rows = {row["id"]: row for row in report["nodes"]}
+        self.assertEqual(rows[volumeNode.GetID()]["bytes"], voxels.nbytes)
+        self.assertEqual(rows[volumeNode.GetID()]["sharedBytes"], voxels.nbytes)
+        self.assertEqual(rows[copyNode.GetID()]["sharedBytes"], 0)
+        self.assertEqual(report["totalBytes"], 2 * voxels.nbytes)  # The shared buffer is counted once
+        self.assertEqual(len(report["sharedBuffers"]), 1)
+        self.assertEqual(report["duplicateCandidates"][0]["copies"], 2)
+
+        # Whole scene, sorted by footprint
+        report = logic.computeMemoryReport()
+        self.assertEqual([row["bytes"] for row in report["nodes"]], sorted((row["bytes"] for row in report["nodes"]), reverse=True))
+
+        self.delayDisplay('Test passed')
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def test_InputNodeInspector_SequenceStatistics(self):
+        self.delayDisplay("Starting the sequence statistics test")
+
+        import numpy as np
+        rng = np.random.default_rng(0)
+        frames = [rng.integers(0, 100 * (i + 1), size=(8, 16, 16)).astype(np.int16) for i in range(5)]
+
+        sequenceNode = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLSequenceNode")
+        frameNode = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLScalarVolumeNode")
+        for index, frame in enumerate(frames):
+            slicer.util.updateVolumeFromArray(frameNode, frame)
+            sequenceNode.SetDataNodeAtValue(frameNode, str(index))
+        slicer.mrmlScene.RemoveNode(frameNode)
+
+        logic = InputNodeInspectorLogic()
+        result = logic.computeSequenceStatistics(sequenceNode, numberOfBins=10, numberOfThreads=2)
+        self.assertEqual(result["computedFrames"], len(frames))
+        for frame, statistics in zip(frames, result["frames"]):
+            self.assertEqual(statistics["max"], frame.max())
+            self.assertAlmostEqual(statistics["mean"], float(frame.mean()), places=6)
+            counts, _ = np.histogram(frame, bins=result["histogramEdges"])
+            self.assertEqual(statistics["histogram"], counts.tolist())
+
+        # Scrubbing: already computed frames are served from the cache
+        self.assertEqual(logic.computeSequenceStatistics(sequenceNode, numberOfBins=10, frameIndices=[3, 1])["computedFrames"], 0)
+
+        # One frame modified: the others keep their moments, all histograms follow the new common range
+        frameNode = sequenceNode.GetNthDataNode(4)
+        slicer.util.arrayFromVolume(frameNode)[0, 0, 0] = 1000
+        slicer.util.arrayFromVolumeModified(frameNode)
+        self.assertEqual(logic.computeSequenceStatistics(sequenceNode, frameIndices=[0, 4],
+                                                         histograms=False)["computedFrames"], 1)
+        result = logic.computeSequenceStatistics(sequenceNode, numberOfBins=10)
+        self.assertEqual(result["histogramEdges"][-1], 1000)
+        self.assertEqual(result["frames"][4]["max"], 1000)
+
+        # Frames without image data are reported, not computed
+        sequenceNode.SetDataNodeAtValue(slicer.vtkMRMLScalarVolumeNode(), "5")
+        result = logic.computeSequenceStatistics(sequenceNode, numberOfBins=10)
+        self.assertEqual(result["emptyFrames"], [5])
+        self.assertIsNone(result["frames"][5])
+        self.assertEqual(result["computedFrames"], 0)
+
+        self.delayDisplay('Test passed')
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def test_InputNodeInspector_SampleDataStore(self):
+        self.delayDisplay("Starting the sample data store test")
+
+        import hashlib
+        import SampleData
+        from LM_RoadmapLib import SampleDataStore
+
+        # 1. Seed a store from a folder holding one NRRD volume
+        seedPath = os.path.join(slicer.app.temporaryPath, "InputNodeInspectorSeed")
+        os.makedirs(seedPath, exist_ok=True)
+        content = b"NRRD0004\ntype: uchar\ndimension: 3\nsizes: 2 2 2\nencoding: raw\n\n" + bytes(range(8))
+        with open(os.path.join(seedPath, "InputNodeInspectorOffline.nrrd"), "wb") as f:
+            f.write(content)
+        store = SampleDataStore(os.path.join(slicer.app.temporaryPath, "InputNodeInspectorStore"))
+        store.seed(seedPath)
+        checksum = "SHA256:" + hashlib.sha256(content).hexdigest()
+        self.assertTrue(store.contains(hashlib.sha256(content).hexdigest()))
+
+        # 2. A sample whose URL cannot be reached is served from the store, through SampleData itself
+        cachedPath = os.path.join(slicer.mrmlScene.GetCacheManager().GetRemoteCacheDirectory(), "InputNodeInspectorOffline.nrrd")
+        if os.path.exists(cachedPath):
+            os.remove(cachedPath)
+        SampleData.SampleDataLogic.registerCustomSampleDataSource(
+            category="InputNodeInspector",
+            sampleName="InputNodeInspectorOffline",
+            uris="http://unreachable.invalid/InputNodeInspectorOffline.nrrd",
+            fileNames="InputNodeInspectorOffline.nrrd",
+            checksums=checksum,
+            nodeNames="InputNodeInspectorOffline",
+        )
+        installSampleDataStore(store)
+        try:
+            volumeNode = SampleData.downloadSample("InputNodeInspectorOffline")
+        finally:
+            installSampleDataStore()
+        self.assertEqual(volumeNode.GetImageData().GetDimensions(), (2, 2, 2))
+
+        # 3. Corrupted objects are detected and removed
+        with open(store.objectPath(hashlib.sha256(content).hexdigest()), "r+b") as f:
+            f.write(b"X")
+        self.assertEqual(store.verify(), [hashlib.sha256(content).hexdigest()])
+
+        self.delayDisplay('Test passed')
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def test_InputNodeInspector_LazyImports(self):
+        self.delayDisplay("Starting the lazy imports test")
+
+        import sys
+        from LM_RoadmapLib.StartupTime import measureModuleImport
+
+        # 1. Importing the module file, as done at startup, does not import the Lib package
+        libraryModules = {name: module for name, module in sys.modules.items() if name.split(".")[0] == "InputNodeInspectorLib"}
+        for name in libraryModules:
+            del sys.modules[name]
+        try:
+            measurement = measureModuleImport(slicer.modules.inputnodeinspector.path)
+            self.assertFalse([name for name in measurement["importedModules"] if name.startswith("InputNodeInspectorLib")])
+        finally:
+            sys.modules.update(libraryModules)
+
+        # 2. The sample data is registered on first use, once
+        registerSampleData()
+        self.assertTrue(_sampleDataRegistered)
+        registerSampleData()
+
+        self.delayDisplay('Test passed')
@@ -0,0 +1,287 @@
+import argparse
+import concurrent.futures
+import csv
+import io
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+from .ModelFileHeader import isSupportedModelFile, readModelFileHeader
+from .VolumeFileHeader import computeFileStatistics, isSupportedVolumeFile, readVolumeFileHeader
+
+#
+# Folder-level inspection report for a study directory (nightly QC).
+#
+# Headers are parsed in a thread pool (I/O bound), voxel statistics run in a process pool (CPU bound). Results are
+# appended to one CSV / JSON-lines table as soon as they arrive, so memory stays bounded by the number of tasks in
+# flight, and a restarted run skips every file already present in the output. A row cut by an interruption (the file
+# does not end with a newline) is ignored and truncated away before new rows are appended. Files that failed are
+# retried by the next run, which first drops their error rows: the table keeps one row per file.
+#
+
+REPORT_COLUMNS = [
+    "path", "kind", "format", "status", "error",
+    "dimensions", "components", "spacing", "origin", "dataType", "encoding",
+    "numberOfPoints", "numberOfCells", "onDiskSize", "inMemorySize",
+    "min", "max", "mean", "std",
+    "headerSeconds", "statisticsSeconds",
+]
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def iterateStudyFiles(directoryPath, recursive=True):
+    """ Lazily yield the volume and model files of a directory, in a stable order. """
+    with os.scandir(directoryPath) as entries:
+        entries = sorted(entries, key=lambda entry: entry.name)
+    for entry in entries:
+        if entry.is_dir():
+            if recursive:
+                yield from iterateStudyFiles(entry.path, recursive)
+        elif isSupportedVolumeFile(entry.path) or isSupportedModelFile(entry.path):
+            yield entry.path
+
+
+'''=================================================================================================================='''
+#
+# Workers
+#
+def _inspectHeader(path):
+    """ Thread pool task. Returns (row, volumeHeader); volumeHeader is None for models and failures. """
+    isVolume = isSupportedVolumeFile(path)
+    row = {"path": path, "kind": "volume" if isVolume else "model", "status": "ok"}
+    start = time.perf_counter()
+    header = None
+    try:
+        if isVolume:
+            header = readVolumeFileHeader(path)
+            row.update(header.toDict())
+        else:
+            row.update(readModelFileHeader(path))
+    except Exception as e:
+        row["status"], row["error"] = "error", str(e)
+        header = None
+    row["headerSeconds"] = time.perf_counter() - start
+    return row, header
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def _computeStatistics(header):
+    """ Process pool task. Must stay a module level function so that it can be pickled. """
+    start = time.perf_counter()
+    statistics = computeFileStatistics(header)
+    return statistics, time.perf_counter() - start
+
+
+'''=================================================================================================================='''
+#
+# Report writers (one row per file, flushed immediately)
+#
+class _ReportWriter:
+
+    def __init__(self, outputPath, isCsv=None):
+        self.outputPath = outputPath
+        self.isCsv = outputPath.lower().endswith(".csv") if isCsv is None else isCsv
+        if os.path.exists(outputPath):
+            with open(outputPath, "r+b") as f:
+                f.truncate(_completeLength(f))  # Drop a row cut by an interruption, the next row starts on its own line
+        isNew = not os.path.exists(outputPath) or os.path.getsize(outputPath) == 0
+        self._file = open(outputPath, "a", newline="")
+        if self.isCsv:
+            self._csvWriter = csv.DictWriter(self._file, fieldnames=REPORT_COLUMNS, extrasaction="ignore")
+            if isNew:
+                self._csvWriter.writeheader()
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def write(self, row):
+        if self.isCsv:
+            self._csvWriter.writerow({key: " ".join(str(v) for v in value) if isinstance(value, (list, tuple)) else value
+                                      for key, value in row.items()})
+        else:
+            self._file.write(json.dumps({key: row.get(key) for key in REPORT_COLUMNS}) + "\n")
+        self._file.flush()
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def close(self):
+        self._file.close()
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def _completeLength(f):
+    """ Bytes of a binary file up to its last newline: the rows that were completely written. """
+    size = f.seek(0, os.SEEK_END)
+    position = size
+    while position > 0:
+        chunkStart = max(0, position - 65536)
+        f.seek(chunkStart)
+        chunk = f.read(position - chunkStart)
+        newline = chunk.rfind(b"\n")
+        if newline >= 0:
+            return chunkStart + newline + 1
+        position = chunkStart
+    return 0
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def readReportRows(outputPath):
+    """ Complete rows of a (possibly partial) report: a last row cut by an interruption is ignored. """
+    if not os.path.exists(outputPath):
+        return []
+    with open(outputPath, "rb") as f:
+        length = _completeLength(f)
+        f.seek(0)
+        text = f.read(length).decode("utf-8", errors="replace")
+    if outputPath.lower().endswith(".csv"):
+        try:
+            return list(csv.DictReader(io.StringIO(text, newline="")))
+        except csv.Error:
+            return []
+    rows = []
+    for line in text.split("\n"):
+        if not line.strip():
+            continue
+        try:
+            rows.append(json.loads(line))
+        except ValueError:
+            continue  # Line cut by an interruption
+    return rows
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def readCompletedPaths(outputPath):
+    """ Paths that already have a successful row in a (possibly partial) report. """
+    return {row["path"] for row in readReportRows(outputPath) if row.get("status") == "ok" and row.get("path")}
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def _dropRetriedRows(outputPath):
+    """ Rewrite a report without its error rows (and duplicate rows of a path), before their files are retried.
+        Returns the paths that are already reported as "ok". """
+    rows = readReportRows(outputPath)
+    okRows = {row["path"]: row for row in rows if row.get("status") == "ok" and row.get("path")}
+    if len(okRows) == len(rows):
+        return set(okRows)
+    temporaryPath = outputPath + ".tmp"  # Replaced at once: an interruption leaves the previous report
+    if os.path.exists(temporaryPath):
+        os.remove(temporaryPath)
+    writer = _ReportWriter(temporaryPath, outputPath.lower().endswith(".csv"))
+    try:
+        for row in okRows.values():
+            writer.write(row)
+    finally:
+        writer.close()
+    os.replace(temporaryPath, outputPath)
+    return set(okRows)
+
+
+'''=================================================================================================================='''
+#
+# Batch runner
+#
+def runBatchInspection(directoryPath, outputPath, computeStatistics=True, recursive=True,
+                       numberOfThreads=8, numberOfProcesses=None, pythonExecutable=None, progressCallback=None):
+    """ Inspect every volume and model below directoryPath and append one row per file to outputPath
+        (.csv, otherwise JSON lines). Files already reported as "ok" are skipped, so an interrupted run can be
+        restarted with the same arguments; files reported with an error are retried and their old rows dropped.
+        numberOfProcesses=0 computes statistics in the thread pool instead of a process pool.
+        pythonExecutable is needed when the caller is embedded (e.g. Slicer) and sys.executable is not a python.
+        Returns a summary dict. """
+    completedPaths = _dropRetriedRows(outputPath)
+    if numberOfProcesses is None:
+        numberOfProcesses = os.cpu_count() or 1
+
+    # Bound the work in flight: this (not the number of files) is what sets the memory footprint
+    maxPendingHeaders = 4 * numberOfThreads
+    maxPendingStatistics = 2 * max(1, numberOfProcesses)
+
+    threadPool = concurrent.futures.ThreadPoolExecutor(max_workers=numberOfThreads)
+    statisticsPool = threadPool
+    if computeStatistics and numberOfProcesses > 0:
+        context = multiprocessing.get_context("spawn")
+        if pythonExecutable:
+            context.set_executable(pythonExecutable)
+        statisticsPool = concurrent.futures.ProcessPoolExecutor(max_workers=numberOfProcesses, mp_context=context)
+
+    writer = _ReportWriter(outputPath)
+    summary = {"written": 0, "skipped": 0, "errors": 0, "seconds": 0.0}
+    start = time.perf_counter()
+    pendingHeaders = {}     # future -> path
+    pendingStatistics = {}  # future -> row
+    paths = iterateStudyFiles(directoryPath, recursive)
+    pathsExhausted = False
+
+    def writeRow(row):
+        writer.write(row)
+        summary["written"] += 1
+        summary["errors"] += row["status"] != "ok"
+        if progressCallback:
+            progressCallback(row)
+
+    try:
+        while True:
+            # 1. Top up the header queue, unless statistics are lagging behind
+            while not pathsExhausted and len(pendingHeaders) < maxPendingHeaders \
+                    and len(pendingStatistics) < maxPendingStatistics:
+                path = next(paths, None)
+                if path is None:
+                    pathsExhausted = True
+                elif path in completedPaths:
+                    summary["skipped"] += 1
+                else:
+                    pendingHeaders[threadPool.submit(_inspectHeader, path)] = path
+
+            if not pendingHeaders and not pendingStatistics:
+                break
+
+            # 2. Handle whatever finished first
+            finished, _ = concurrent.futures.wait(list(pendingHeaders) + list(pendingStatistics),
+                                                  return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in finished:
+                if future in pendingHeaders:
+                    del pendingHeaders[future]
+                    row, header = future.result()
+                    if computeStatistics and header is not None:
+                        pendingStatistics[statisticsPool.submit(_computeStatistics, header)] = row
+                    else:
+                        writeRow(row)
+                else:
+                    row = pendingStatistics.pop(future)
+                    try:
+                        statistics, seconds = future.result()
+                        row.update(statistics or {})
+                        row["statisticsSeconds"] = seconds
+                    except Exception as e:
+                        row["status"], row["error"] = "error", str(e)
+                    writeRow(row)
+    finally:
+        writer.close()
+        threadPool.shutdown(wait=True, cancel_futures=True)
+        if statisticsPool is not threadPool:
+            statisticsPool.shutdown(wait=True, cancel_futures=True)
+
+    summary["seconds"] = time.perf_counter() - start
+    return summary
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def main(argv=None):
+    """ Command line entry point: python -m InputNodeInspectorLib.BatchInspection <directory> <report.csv|.jsonl> """
+    parser = argparse.ArgumentParser(description="Inspect a study directory of volumes and models.")
+    parser.add_argument("directory")
+    parser.add_argument("output", help="Report file, .csv or .jsonl. Existing rows are kept and skipped.")
+    parser.add_argument("--no-statistics", action="store_true", help="Header-only report")
+    parser.add_argument("--no-recursive", action="store_true")
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--processes", type=int, default=None, help="0 computes statistics in threads")
+    args = parser.parse_args(argv)
+
+    summary = runBatchInspection(args.directory, args.output, computeStatistics=not args.no_statistics,
+                                 recursive=not args.no_recursive, numberOfThreads=args.threads,
+                                 numberOfProcesses=args.processes)
+    print(json.dumps(summary))
+    return 1 if summary["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,94 @@
+import concurrent.futures
+import math
+import os
+import threading
+
+import numpy as np
+
+#
+# Per-frame statistics of 4D (sequence) volumes.
+#
+# Frames are processed one at a time by workers that own preallocated buffers: each frame is copied once into a
+# float64 buffer, moments are taken from it with sum / dot, and the same buffer is turned in place into histogram bin
+# indices. Apart from the histogram counts nothing is allocated per frame, so a 300-frame cine series costs the memory
+# of one frame per thread. All frames share the same histogram range so that histograms can be compared over time.
+# Without histogram range only the moments are computed: they do not depend on the other frames.
+#
+
+DEFAULT_NUMBER_OF_FRAME_BINS = 64
+
+
+'''=================================================================================================================='''
+#
+# FrameStatisticsWorker
+#
+class FrameStatisticsWorker:
+    """ Computes the statistics of frames of up to numberOfVoxels voxels, reusing the same buffers. Not thread safe:
+        use one worker per thread. Values outside histogramRange are counted in the first / last bin; without
+        histogramRange (None) only the moments are computed. """
+
+    def __init__(self, numberOfVoxels, histogramRange, numberOfBins=DEFAULT_NUMBER_OF_FRAME_BINS):
+        self.histogramRange = histogramRange
+        self.numberOfBins = numberOfBins
+        if histogramRange is not None:
+            self.lower, upper = float(histogramRange[0]), float(histogramRange[1])
+            self.scale = numberOfBins / (upper - self.lower) if upper > self.lower else 0.0
+        self._values = np.empty(numberOfVoxels, dtype=np.float64)
+        self._binIndices = np.empty(numberOfVoxels, dtype=np.intp) if histogramRange is not None else None
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def compute(self, frame):
+        count = frame.size
+        if count > self._values.size:  # Larger frame than announced: grow once
+            self._values = np.empty(count, dtype=np.float64)
+            self._binIndices = np.empty(count, dtype=np.intp) if self.histogramRange is not None else None
+        values = self._values[:count]
+
+        # 1. Moments, from one copy into the float buffer
+        np.copyto(values, frame.reshape(-1), casting="unsafe")
+        minimum, maximum = float(values.min()), float(values.max())
+        mean = float(values.sum()) / count
+        variance = max(0.0, float(np.dot(values, values)) / count - mean * mean)
+        statistics = {"min": minimum, "max": maximum, "mean": mean, "std": math.sqrt(variance), "voxels": count}
+        if self.histogramRange is None:
+            return statistics
+
+        # 2. Histogram: the float buffer is overwritten with bin positions, truncated into the index buffer
+        np.subtract(values, self.lower, out=values)
+        np.multiply(values, self.scale, out=values)
+        np.clip(values, 0, self.numberOfBins - 1, out=values)
+        binIndices = self._binIndices[:count]
+        np.copyto(binIndices, values, casting="unsafe")
+        statistics["histogram"] = np.bincount(binIndices, minlength=self.numberOfBins).tolist()
+        return statistics
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def histogramEdges(histogramRange, numberOfBins=DEFAULT_NUMBER_OF_FRAME_BINS):
+    return np.linspace(histogramRange[0], histogramRange[1], numberOfBins + 1).tolist()
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def computeFrameStatistics(getFrame, frameIndices, histogramRange, numberOfBins=DEFAULT_NUMBER_OF_FRAME_BINS,
+                           numberOfThreads=None):
+    """ Statistics of the frames getFrame(index) -> [k, j, i] array, for every index. Frames must already be in memory
+        (e.g. views of the sequence's image data): they are spread over a thread pool, numpy releases the GIL for the
+        copy, reductions and bincount. Returns {frameIndex: statistics}, without histograms if histogramRange is
+        None. """
+    frameIndices = list(frameIndices)
+    if not frameIndices:
+        return {}
+    numberOfThreads = min(numberOfThreads or os.cpu_count() or 1, len(frameIndices))
+    workers = threading.local()
+    frameSize = getFrame(frameIndices[0]).size
+
+    def computeOne(frameIndex):
+        worker = getattr(workers, "worker", None)
+        if worker is None:
+            worker = workers.worker = FrameStatisticsWorker(frameSize, histogramRange, numberOfBins)
+        return frameIndex, worker.compute(getFrame(frameIndex))
+
+    if numberOfThreads == 1:
+        return dict(computeOne(frameIndex) for frameIndex in frameIndices)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=numberOfThreads) as pool:
+        return dict(pool.map(computeOne, frameIndices))
@@ -0,0 +1,106 @@
+import itertools
+import math
+
+import numpy as np
+
+#
+# Intensity statistics inside a mask (ROI box, labelmap or segment).
+#
+# The voxel bounding box of the mask in the inspected volume is computed first and only that sub-block is read.
+# The mask is then sampled on the sub-block grid with vectorized affine arithmetic, so the cost is proportional to
+# the size of the mask and not to the size of the volume.
+#
+# Conventions: 4x4 matrices map homogeneous (i, j, k, 1) column vectors; numpy voxel arrays are indexed [k, j, i];
+# a "block" is a (kSlice, jSlice, iSlice) tuple.
+#
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def voxelBlockOfBox(boxToVolumeIJK, boxMinimum, boxMaximum, volumeDimensions):
+    """ Smallest block of the volume containing an axis-aligned box given in another frame, or None if disjoint.
+        volumeDimensions is (I, J, K). """
+    corners = np.array([list(corner) + [1.0] for corner in itertools.product(*zip(boxMinimum, boxMaximum))])
+    ijk = (np.asarray(boxToVolumeIJK) @ corners.T)[:3]
+    lower = np.maximum(np.floor(ijk.min(axis=1)).astype(int), 0)
+    upper = np.minimum(np.ceil(ijk.max(axis=1)).astype(int) + 1, volumeDimensions)
+    if np.any(upper <= lower):
+        return None
+    return tuple(slice(int(lower[axis]), int(upper[axis])) for axis in (2, 1, 0))
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def nonzeroBounds(maskArray, labelValue=None):
+    """ (ijkMinimum, ijkMaximum) of the voxels set in a [k, j, i] mask array, inclusive, or None if empty. """
+    selected = maskArray == labelValue if labelValue is not None else maskArray != 0
+    bounds = []
+    for axis in (2, 1, 0):  # i, j, k
+        otherAxes = tuple(a for a in range(3) if a != axis)
+        indices = np.flatnonzero(selected.any(axis=otherAxes))
+        if indices.size == 0:
+            return None
+        bounds.append((int(indices[0]), int(indices[-1])))
+    return tuple(b[0] for b in bounds), tuple(b[1] for b in bounds)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def _blockCoordinates(volumeToOther, block):
+    """ Coordinates, in the other frame, of every voxel center of a volume block (three [k, j, i] arrays). """
+    k = np.arange(block[0].start, block[0].stop, dtype=np.float64)[:, None, None]
+    j = np.arange(block[1].start, block[1].stop, dtype=np.float64)[None, :, None]
+    i = np.arange(block[2].start, block[2].stop, dtype=np.float64)[None, None, :]
+    m = np.asarray(volumeToOther)
+    return [m[row, 0] * i + m[row, 1] * j + m[row, 2] * k + m[row, 3] for row in range(3)]
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def sampleLabelmapOnBlock(maskArray, volumeToMaskIJK, block, labelValue=None):
+    """ Nearest-neighbour sample of a [k, j, i] mask array on a volume block. Returns a boolean block. """
+    m = np.asarray(volumeToMaskIJK, dtype=np.float64)
+    shape = tuple(s.stop - s.start for s in block)
+
+    # 1. Fast path: same grid up to an integer shift, the mask block is a plain slice
+    offset = np.round(m[:3, 3])
+    if np.allclose(m[:3, :3], np.eye(3)) and np.allclose(m[:3, 3], offset):
+        start = [block[axis].start + int(offset[2 - axis]) for axis in range(3)]
+        maskBlock = np.zeros(shape, dtype=bool)
+        source = tuple(slice(max(0, s), min(n, s + length)) for s, length, n in zip(start, shape, maskArray.shape))
+        target = tuple(slice(src.start - s, src.stop - s) for src, s in zip(source, start))
+        if all(src.stop > src.start for src in source):
+            values = maskArray[source]
+            maskBlock[target] = values == labelValue if labelValue is not None else values != 0
+        return maskBlock
+
+    # 2. General case: map every voxel center of the block into the mask grid
+    i, j, k = (np.rint(c).astype(np.int64) for c in _blockCoordinates(m, block))
+    i, j, k = np.broadcast_arrays(i, j, k)
+    inside = (i >= 0) & (j >= 0) & (k >= 0) & (k < maskArray.shape[0]) & (j < maskArray.shape[1]) & (i < maskArray.shape[2])
+    maskBlock = np.zeros(shape, dtype=bool)
+    values = maskArray[k[inside], j[inside], i[inside]]
+    maskBlock[inside] = values == labelValue if labelValue is not None else values != 0
+    return maskBlock
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def sampleBoxOnBlock(volumeToBox, boxSize, block):
+    """ Voxels of a volume block whose center lies in a box centered at the origin of its frame. """
+    halfSize = np.asarray(boxSize, dtype=np.float64) / 2.0
+    x, y, z = _blockCoordinates(volumeToBox, block)
+    return (np.abs(x) <= halfSize[0]) & (np.abs(y) <= halfSize[1]) & (np.abs(z) <= halfSize[2])
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def maskedStatistics(voxelBlock, maskBlock, voxelVolume=1.0):
+    """ Statistics of the voxels of a block selected by a boolean mask block. """
+    values = voxelBlock[np.broadcast_to(maskBlock, voxelBlock.shape)].astype(np.float64)
+    if values.size == 0:
+        return {"voxels": 0, "volumeMm3": 0.0}
+    mean = float(values.mean())
+    return {
+        "voxels": int(values.size),
+        "volumeMm3": values.size * voxelVolume,
+        "min": float(values.min()),
+        "max": float(values.max()),
+        "mean": mean,
+        "std": math.sqrt(max(0.0, float(np.dot(values, values)) / values.size - mean * mean)),
+        "median": float(np.median(values)),
+    }
@@ -0,0 +1,82 @@
+#
+# Per-node memory accounting from buffer descriptions.
+#
+# The caller lists, for every node, the buffers it references (image scalars, points, cell connectivity, display
+# pipeline outputs...) with their size as reported by VTK. A buffer is identified by the address of its memory, so a
+# buffer referenced by several nodes (shallow copies, shared display outputs) is counted once in the totals and
+# reported as shared. Distinct buffers with the same name, type and size in different nodes are reported as possible
+# duplicates (deep copies); their content is not compared, that would mean reading every value.
+#
+
+# Duplicates smaller than this are not worth reporting
+DUPLICATE_MINIMUM_BYTES = 1024 * 1024
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def buildMemoryReport(nodeBuffers, duplicateMinimumBytes=DUPLICATE_MINIMUM_BYTES):
+    """ nodeBuffers: iterable of (nodeRow, buffers). nodeRow is a dict with at least "id"; buffers is a list of dicts
+        with "key" (memory address), "bytes", "description" and "signature" (e.g. (name, type, number of values)).
+        Returns node rows sorted by footprint, shared buffers, duplicate candidates and the scene total. """
+    nodeRows = []
+    buffersByKey = {}     # key -> buffer dict, first seen
+    nodeIDsByKey = {}     # key -> IDs of the nodes referencing it
+    for nodeRow, buffers in nodeBuffers:
+        nodeRow = dict(nodeRow)
+        nodeKeys = []
+        for buffer in buffers:
+            key = buffer["key"]
+            if key in nodeKeys:  # e.g. a display output sharing the points of its input
+                continue
+            nodeKeys.append(key)
+            buffersByKey.setdefault(key, buffer)
+            nodeIDsByKey.setdefault(key, []).append(nodeRow["id"])
+        nodeRow["keys"] = nodeKeys
+        nodeRows.append(nodeRow)
+
+    # 1. Node footprints: everything it references, and the part it shares with other nodes
+    for nodeRow in nodeRows:
+        keys = nodeRow.pop("keys")
+        nodeRow["bytes"] = sum(buffersByKey[key]["bytes"] for key in keys)
+        nodeRow["sharedBytes"] = sum(buffersByKey[key]["bytes"] for key in keys if len(nodeIDsByKey[key]) > 1)
+        nodeRow["buffers"] = len(keys)
+    nodeRows.sort(key=lambda row: row["bytes"], reverse=True)
+
+    # 2. Buffers referenced by several nodes
+    sharedBuffers = [dict(buffersByKey[key], nodes=nodeIDs) for key, nodeIDs in nodeIDsByKey.items() if len(nodeIDs) > 1]
+    sharedBuffers.sort(key=lambda buffer: buffer["bytes"], reverse=True)
+
+    # 3. Distinct buffers that look the same, in different nodes
+    keysBySignature = {}
+    for key, buffer in buffersByKey.items():
+        if buffer["bytes"] >= duplicateMinimumBytes and buffer.get("signature") is not None:
+            keysBySignature.setdefault(buffer["signature"], []).append(key)
+    duplicateCandidates = []
+    for signature, keys in keysBySignature.items():
+        nodeIDs = sorted({nodeID for key in keys for nodeID in nodeIDsByKey[key]})
+        if len(keys) > 1 and len(nodeIDs) > 1:
+            bytesEach = buffersByKey[keys[0]]["bytes"]
+            duplicateCandidates.append({
+                "signature": signature,
+                "description": buffersByKey[keys[0]]["description"],
+                "copies": len(keys),
+                "bytes": bytesEach,
+                "wastedBytes": (len(keys) - 1) * bytesEach,
+                "nodes": nodeIDs,
+            })
+    duplicateCandidates.sort(key=lambda candidate: candidate["wastedBytes"], reverse=True)
+
+    return {
+        "nodes": nodeRows,
+        "sharedBuffers": sharedBuffers,
+        "duplicateCandidates": duplicateCandidates,
+        "totalBytes": sum(buffer["bytes"] for buffer in buffersByKey.values()),
+    }
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def formatBytes(numberOfBytes):
+    for unit in ("B", "KB", "MB"):
+        if abs(numberOfBytes) < 1024:
+            return f"{numberOfBytes:.0f} {unit}" if unit == "B" else f"{numberOfBytes:.1f} {unit}"
+        numberOfBytes /= 1024
+    return f"{numberOfBytes:.2f} GB"
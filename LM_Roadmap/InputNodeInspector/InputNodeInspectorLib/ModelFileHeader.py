@@ -0,0 +1,125 @@
+import os
+import re
+import struct
+
+#
+# Cheap point / cell counts of surface model files, read from their headers whenever the format allows it.
+#
+# Like VolumeFileHeader, nothing here imports slicer or vtk so that it can run in batch workers.
+#
+
+MODEL_EXTENSIONS = (".stl", ".ply", ".vtp", ".vtk", ".obj")
+
+# Amount of data scanned at once by formats that have no usable header (ASCII STL, OBJ)
+SCAN_CHUNK_BYTES = 16 * 1024 * 1024
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def isSupportedModelFile(path):
+    """ True if the file name looks like a surface model. """
+    return path.lower().endswith(MODEL_EXTENSIONS)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def readModelFileHeader(path):
+    """ Return {"path", "format", "numberOfPoints", "numberOfCells", "onDiskSize"}. Counts are None if unknown. """
+    extension = os.path.splitext(path)[1].lower()
+    readers = {
+        ".stl": _readStlCounts,
+        ".ply": _readPlyCounts,
+        ".vtp": _readVtpCounts,
+        ".vtk": _readLegacyVtkCounts,
+        ".obj": _readObjCounts,
+    }
+    if extension not in readers:
+        raise ValueError(f"Unsupported model file: {path}")
+    numberOfPoints, numberOfCells = readers[extension](path)
+    return {
+        "path": path,
+        "format": extension[1:].upper(),
+        "numberOfPoints": numberOfPoints,
+        "numberOfCells": numberOfCells,
+        "onDiskSize": os.path.getsize(path),
+    }
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def _countOccurrences(path, token):
+    """ Count a byte token in a file, scanning it in bounded chunks. """
+    count = 0
+    tail = b"\n"  # Lets line-anchored tokens match on the first line too
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(SCAN_CHUNK_BYTES)
+            if not chunk:
+                return count
+            data = tail + chunk
+            count += data.count(token)
+            # Keep a short overlap (too short to hold a whole token) so that split tokens are still found
+            tail = data[-(len(token) - 1):] if len(token) > 1 else b""
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def _readStlCounts(path):
+    """ Binary STL stores the triangle count at byte 80; ASCII STL has to be scanned. """
+    fileSize = os.path.getsize(path)
+    with open(path, "rb") as f:
+        header = f.read(84)
+    if len(header) == 84:
+        numberOfTriangles = struct.unpack("<I", header[80:84])[0]
+        if 84 + 50 * numberOfTriangles == fileSize:
+            return None, numberOfTriangles  # Points are not shared in STL, only triangles are meaningful
+    return None, _countOccurrences(path, b"endfacet")
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def _readPlyCounts(path):
+    numberOfPoints, numberOfCells = None, None
+    with open(path, "rb") as f:
+        for line in f:
+            line = line.strip()
+            if line == b"end_header":
+                break
+            words = line.split()
+            if len(words) == 3 and words[0] == b"element":
+                if words[1] == b"vertex":
+                    numberOfPoints = int(words[2])
+                elif words[1] == b"face":
+                    numberOfCells = int(words[2])
+    return numberOfPoints, numberOfCells
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def _readVtpCounts(path):
+    """ VTK XML PolyData: counts are attributes of the <Piece> elements at the top of the file. """
+    with open(path, "rb") as f:
+        head = f.read(64 * 1024).decode("latin-1")
+    pieces = re.findall(r"<Piece\b[^>]*>", head)
+    if not pieces:
+        return None, None
+    numberOfPoints, numberOfCells = 0, 0
+    for piece in pieces:
+        attributes = dict(re.findall(r'(\w+)="(\d+)"', piece))
+        numberOfPoints += int(attributes.get("NumberOfPoints", 0))
+        numberOfCells += sum(int(attributes.get(name, 0)) for name in
+                             ("NumberOfVerts", "NumberOfLines", "NumberOfStrips", "NumberOfPolys"))
+    return numberOfPoints, numberOfCells
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def _readLegacyVtkCounts(path):
+    """ Legacy .vtk: the POINTS line follows the 4-line header; cells come after the (possibly binary) points. """
+    with open(path, "rb") as f:
+        for lineIndex, line in enumerate(f):
+            words = line.split()
+            if words and words[0] == b"POINTS":
+                return int(words[1]), None
+            if lineIndex > 16:
+                break
+    return None, None
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def _readObjCounts(path):
+    """ OBJ has no header: count vertex and face records. """
+    return _countOccurrences(path, b"\nv "), _countOccurrences(path, b"\nf ")
@@ -0,0 +1,256 @@
+#
+# Per-node-class property extractors.
+#
+# Each extractor reports the key properties of one MRML node class. cheapProperties() must only use O(1) metadata
+# calls (counts, dimensions, flags, array sizes that VTK already keeps); anything that scans points, voxels or
+# children goes in lazyProperties(), which are only evaluated when the user asks for them.
+#
+# Extractors are looked up by node class with vtkObject.IsA(), most recently registered first, and the result is
+# cached per concrete class name so that dispatch costs one dict lookup. Other modules may register their own.
+#
+
+_registeredExtractors = []
+_extractorByClassName = {}
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def registerNodeExtractor(extractor):
+    """ Register an extractor; it takes precedence over previously registered ones for the classes it handles. """
+    _registeredExtractors.insert(0, extractor)
+    _extractorByClassName.clear()
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def unregisterNodeExtractor(extractor):
+    _registeredExtractors.remove(extractor)
+    _extractorByClassName.clear()
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def getNodeExtractor(node):
+    className = node.GetClassName()
+    extractor = _extractorByClassName.get(className)
+    if extractor is None:
+        extractor = next(e for e in _registeredExtractors if node.IsA(e.nodeClass))
+        _extractorByClassName[className] = extractor
+    return extractor
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def _kibToBytes(kib):
+    return int(kib) * 1024
+
+
+'''=================================================================================================================='''
+#
+# NodePropertyExtractor
+#
+class NodePropertyExtractor:
+    """ Base extractor, valid for any vtkMRMLNode. Subclasses extend both methods and call the base class. """
+
+    nodeClass = "vtkMRMLNode"
+
+    def cheapProperties(self, node):
+        """ Ordered dict of properties obtained with O(1) calls. """
+        return {
+            "Class": node.GetClassName(),
+            "Name": node.GetName(),
+            "ID": node.GetID(),
+        }
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def lazyProperties(self):
+        """ Ordered dict of name -> function(node), for properties that are expensive to compute. """
+        return {}
+
+
+'''=================================================================================================================='''
+class VolumeNodeExtractor(NodePropertyExtractor):
+    nodeClass = "vtkMRMLVolumeNode"
+
+    def cheapProperties(self, node):
+        properties = super().cheapProperties(node)
+        properties["Spacing"] = node.GetSpacing()
+        properties["Origin"] = node.GetOrigin()
+        imageData = node.GetImageData()
+        if imageData:
+            properties["Dimensions"] = imageData.GetDimensions()
+            properties["Scalar type"] = imageData.GetScalarTypeAsString()
+            properties["Components"] = imageData.GetNumberOfScalarComponents()
+            properties["Memory (bytes)"] = _kibToBytes(imageData.GetActualMemorySize())
+        return properties
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def lazyProperties(self):
+        properties = super().lazyProperties()
+        properties["Scalar range"] = lambda node: node.GetImageData().GetScalarRange() if node.GetImageData() else None
+        return properties
+
+
+'''=================================================================================================================='''
+class ModelNodeExtractor(NodePropertyExtractor):
+    nodeClass = "vtkMRMLModelNode"
+
+    def cheapProperties(self, node):
+        properties = super().cheapProperties(node)
+        mesh = node.GetMesh()
+        if mesh:
+            properties["Points"] = mesh.GetNumberOfPoints()
+            properties["Cells"] = mesh.GetNumberOfCells()
+            properties["Point arrays"] = mesh.GetPointData().GetNumberOfArrays()
+            properties["Cell arrays"] = mesh.GetCellData().GetNumberOfArrays()
+            properties["Memory (bytes)"] = _kibToBytes(mesh.GetActualMemorySize())
+        return properties
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def lazyProperties(self):
+        properties = super().lazyProperties()
+        properties["Bounds"] = lambda node: node.GetMesh().GetBounds() if node.GetMesh() else None
+        properties["Array names"] = lambda node: self._arrayNames(node.GetMesh()) if node.GetMesh() else None
+        return properties
+
+    # ------------------------------------------------------------------------------------------------------------------
+    @staticmethod
+    def _arrayNames(mesh):
+        pointData, cellData = mesh.GetPointData(), mesh.GetCellData()
+        return ([f"point:{pointData.GetArrayName(i)}" for i in range(pointData.GetNumberOfArrays())]
+                + [f"cell:{cellData.GetArrayName(i)}" for i in range(cellData.GetNumberOfArrays())])
+
+
+'''=================================================================================================================='''
+class MarkupsNodeExtractor(NodePropertyExtractor):
+    nodeClass = "vtkMRMLMarkupsNode"
+
+    def cheapProperties(self, node):
+        properties = super().cheapProperties(node)
+        properties["Control points"] = node.GetNumberOfControlPoints()
+        properties["Locked"] = bool(node.GetLocked())
+        points = node.GetCurvePointsWorld()
+        if points:
+            properties["Memory (bytes)"] = _kibToBytes(points.GetActualMemorySize())
+        return properties
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def lazyProperties(self):
+        properties = super().lazyProperties()
+        properties["Defined control points"] = lambda node: node.GetNumberOfDefinedControlPoints()
+        properties["Bounds"] = self._bounds
+        return properties
+
+    # ------------------------------------------------------------------------------------------------------------------
+    @staticmethod
+    def _bounds(node):
+        bounds = [0.0] * 6
+        node.GetRASBounds(bounds)
+        return tuple(bounds)
+
+
+'''=================================================================================================================='''
+class SegmentationNodeExtractor(NodePropertyExtractor):
+    nodeClass = "vtkMRMLSegmentationNode"
+
+    def cheapProperties(self, node):
+        properties = super().cheapProperties(node)
+        segmentation = node.GetSegmentation()
+        properties["Segments"] = segmentation.GetNumberOfSegments()
+        # Renamed from "master" to "source" in Slicer 5.4
+        getSourceName = getattr(segmentation, "GetSourceRepresentationName", None) \
+            or segmentation.GetMasterRepresentationName
+        properties["Source representation"] = getSourceName()
+        return properties
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def lazyProperties(self):
+        properties = super().lazyProperties()
+        properties["Segment names"] = self._segmentNames
+        properties["Labelmap layers"] = lambda node: node.GetSegmentation().GetNumberOfLayers()
+        properties["Memory (bytes)"] = self._memory
+        return properties
+
+    # ------------------------------------------------------------------------------------------------------------------
+    @staticmethod
+    def _segmentNames(node):
+        segmentation = node.GetSegmentation()
+        return [segmentation.GetNthSegment(i).GetName() for i in range(segmentation.GetNumberOfSegments())]
+
+    # ------------------------------------------------------------------------------------------------------------------
+    @staticmethod
+    def _memory(node):
+        """ Sum of every representation of every segment; shared labelmap layers are counted once. """
+        segmentation = node.GetSegmentation()
+        seen, total = set(), 0
+        for i in range(segmentation.GetNumberOfSegments()):
+            segment = segmentation.GetNthSegment(i)
+            names = []
+            segment.GetContainedRepresentationNames(names)
+            for name in names:
+                representation = segment.GetRepresentation(name)
+                if representation is not None and representation.GetAddressAsString("") not in seen:
+                    seen.add(representation.GetAddressAsString(""))
+                    total += _kibToBytes(representation.GetActualMemorySize())
+        return total
+
+
+'''=================================================================================================================='''
+class TransformNodeExtractor(NodePropertyExtractor):
+    nodeClass = "vtkMRMLTransformNode"
+
+    def cheapProperties(self, node):
+        properties = super().cheapProperties(node)
+        properties["Linear"] = bool(node.IsLinear())
+        transform = node.GetTransformToParent()
+        if transform:
+            properties["Transform class"] = transform.GetClassName()
+        return properties
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def lazyProperties(self):
+        properties = super().lazyProperties()
+        properties["Transform to parent"] = self._toParent
+        return properties
+
+    # ------------------------------------------------------------------------------------------------------------------
+    @staticmethod
+    def _toParent(node):
+        """ Matrix for linear transforms, node info string otherwise (grids are not scanned). """
+        if node.IsLinear():
+            import vtk
+            matrix = vtk.vtkMatrix4x4()
+            node.GetMatrixTransformToParent(matrix)
+            return [[matrix.GetElement(row, column) for column in range(4)] for row in range(4)]
+        return node.GetTransformToParentInfo()
+
+
+'''=================================================================================================================='''
+class SequenceNodeExtractor(NodePropertyExtractor):
+    nodeClass = "vtkMRMLSequenceNode"
+
+    def cheapProperties(self, node):
+        properties = super().cheapProperties(node)
+        properties["Data nodes"] = node.GetNumberOfDataNodes()
+        properties["Data node class"] = node.GetDataNodeClassName()
+        properties["Index"] = f"{node.GetIndexName()} [{node.GetIndexUnit()}]"
+        return properties
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def lazyProperties(self):
+        properties = super().lazyProperties()
+        properties["Memory (bytes)"] = self._memory
+        return properties
+
+    # ------------------------------------------------------------------------------------------------------------------
+    @staticmethod
+    def _memory(node):
+        """ Sum of the frames' own memory, using the extractor of each frame's class. """
+        total = 0
+        for index in range(node.GetNumberOfDataNodes()):
+            dataNode = node.GetNthDataNode(index)
+            if dataNode is not None:
+                total += getNodeExtractor(dataNode).cheapProperties(dataNode).get("Memory (bytes)", 0)
+        return total
+
+
+# Generic first, specific last: later registrations take precedence
+for _extractor in (NodePropertyExtractor(), VolumeNodeExtractor(), ModelNodeExtractor(), MarkupsNodeExtractor(),
+                   SegmentationNodeExtractor(), TransformNodeExtractor(), SequenceNodeExtractor()):
+    registerNodeExtractor(_extractor)
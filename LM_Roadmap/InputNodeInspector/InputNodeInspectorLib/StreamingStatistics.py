@@ -0,0 +1,246 @@
+import math
+
+import numpy as np
+
+#
+# Single-pass, fixed-memory statistics for volumes that do not fit in RAM.
+#
+# Voxels are fed slab by slab. Each slab is sorted once (radix sort for <= 16 bit integer types), which makes the
+# histogram, the extrema and the sketch insertion cheap. All three structures can be merged, so slabs may be processed
+# by parallel workers and combined at the end.
+#
+# Error bound (QuantileSketch): this is a KLL sketch (Karnin, Lang & Liberty, "Optimal Quantile Approximation in
+# Streams", 2016). With parameter k, the rank of a returned quantile is within +/- eps * N of the requested rank with
+# 99% probability, where eps ~= 2.296 / k**0.9723 (the empirical constant used by Apache DataSketches), i.e. about
+# 1.3% for the default k=200 and 0.3% for k=1000. Memory is O(k) values regardless of N, merging does not degrade it.
+#
+
+DEFAULT_SKETCH_K = 200
+DEFAULT_NUMBER_OF_BINS = 256
+DEFAULT_QUANTILES = (0.01, 0.5, 0.99)
+
+
+'''=================================================================================================================='''
+#
+# QuantileSketch
+#
+class QuantileSketch:
+    """ Mergeable KLL quantile sketch. Items stored at level h stand for 2**h input values. """
+
+    def __init__(self, k=DEFAULT_SKETCH_K, seed=None):
+        self.k = k
+        self.count = 0
+        self.levels = [np.empty(0)]
+        self._random = np.random.default_rng(seed)
+
+    # ------------------------------------------------------------------------------------------------------------------
+    @staticmethod
+    def rankErrorBound(k=DEFAULT_SKETCH_K):
+        """ Normalized rank error at 99% confidence (see module comment). """
+        return 2.296 / k ** 0.9723
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def _capacity(self, level):
+        depth = len(self.levels) - level - 1
+        return max(2, int(math.ceil(self.k * (2.0 / 3.0) ** depth)))
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def update(self, sortedValues):
+        """ Insert a slab. Values must be sorted and free of NaN (see StreamingStatistics.update). """
+        if len(sortedValues) == 0:
+            return
+        self.count += len(sortedValues)
+
+        # 1. A sorted run can be halved repeatedly without re-sorting: do it before converting to float
+        level = 0
+        while len(sortedValues) > self.k:
+            sortedValues = sortedValues[self._random.integers(2)::2]
+            level += 1
+        while len(self.levels) <= level:
+            self.levels.append(np.empty(0))
+        self.levels[level] = np.concatenate((self.levels[level], sortedValues.astype(np.float64)))
+
+        # 2. Restore the per-level capacities
+        self._compress()
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def merge(self, other):
+        """ Fold another sketch (e.g. from a parallel worker) into this one. """
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for level, items in enumerate(other.levels):
+            self.levels[level] = np.concatenate((self.levels[level], items))
+        self.count += other.count
+        self._compress()
+        return self
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def _compress(self):
+        """ Compact the lowest over-full level until every level fits: keep every other sorted item, doubling weight. """
+        while True:
+            for level, items in enumerate(self.levels):
+                if len(items) > self._capacity(level):
+                    break
+            else:
+                return
+            if level + 1 == len(self.levels):
+                self.levels.append(np.empty(0))
+            items = np.sort(items, kind="stable")
+            leftover = items[len(items) - len(items) % 2:]  # Odd item stays at this level
+            promoted = items[self._random.integers(2):len(items) - len(leftover):2]
+            self.levels[level] = leftover
+            self.levels[level + 1] = np.concatenate((self.levels[level + 1], promoted))
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def quantiles(self, fractions):
+        """ Approximate values at the requested fractions (0..1) of the rank. """
+        values = np.concatenate(self.levels)
+        if values.size == 0:
+            return [None] * len(fractions)
+        weights = np.concatenate([np.full(len(items), 2.0 ** level) for level, items in enumerate(self.levels)])
+        order = np.argsort(values, kind="stable")
+        values, weights = values[order], weights[order]
+        # Each retained item stands for a run of 2**h values: rank it at the middle of its run, not at the end
+        midRanks = np.cumsum(weights) - 0.5 * weights
+        ranks = np.asarray(fractions, dtype=np.float64) * weights.sum()
+        indices = np.minimum(np.searchsorted(midRanks, ranks, side="left"), len(values) - 1)
+        return [float(v) for v in values[indices]]
+
+    # ------------------------------------------------------------------------------------------------------------------
+    @property
+    def numberOfRetainedItems(self):
+        return sum(len(items) for items in self.levels)
+
+
+'''=================================================================================================================='''
+#
+# FixedBinHistogram
+#
+class FixedBinHistogram:
+    """ Histogram with fixed, uniform bins plus underflow/overflow counters. Mergeable when edges match. """
+
+    def __init__(self, lower, upper, numberOfBins=DEFAULT_NUMBER_OF_BINS):
+        if upper <= lower:
+            upper = lower + 1.0
+        self.edges = np.linspace(lower, upper, numberOfBins + 1)
+        self.counts = np.zeros(numberOfBins, dtype=np.int64)
+        self.underflow = 0
+        self.overflow = 0
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def update(self, sortedValues):
+        """ O(bins * log N): bin boundaries are located by binary search in the sorted slab. """
+        positions = np.searchsorted(sortedValues, self.edges, side="left")
+        positions[-1] = np.searchsorted(sortedValues, self.edges[-1], side="right")  # Last bin includes its upper edge
+        self.counts += np.diff(positions)
+        self.underflow += int(positions[0])
+        self.overflow += int(len(sortedValues) - positions[-1])
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def merge(self, other):
+        if not np.array_equal(self.edges, other.edges):
+            raise ValueError("Cannot merge histograms with different bins")
+        self.counts += other.counts
+        self.underflow += other.underflow
+        self.overflow += other.overflow
+        return self
+
+
+'''=================================================================================================================='''
+#
+# StreamingStatistics
+#
+class StreamingStatistics:
+    """ Count / min / max / mean / std, a KLL sketch and a fixed-bin histogram, fed one slab at a time.
+        The histogram range is histogramRange if given, the full range of <= 16 bit integer types, and otherwise
+        the range of the first slab (values outside land in the underflow/overflow counters): a last resort, give
+        the range of the whole volume when it is known. Statistics of parallel workers only merge if their
+        histograms share the same range, so workers must be given the same histogramRange. """
+
+    def __init__(self, k=DEFAULT_SKETCH_K, numberOfBins=DEFAULT_NUMBER_OF_BINS, histogramRange=None, seed=None):
+        self.sketch = QuantileSketch(k, seed)
+        self.numberOfBins = numberOfBins
+        self.histogramRange = histogramRange
+        self.histogram = None
+        self.count = 0
+        self.minimum = math.inf
+        self.maximum = -math.inf
+        self.total = 0.0
+        self.totalSquares = 0.0
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def update(self, slab):
+        values = np.ravel(slab)
+        if values.dtype.kind == "f":
+            values = values[~np.isnan(values)]
+        if values.size == 0:
+            return
+        values = np.sort(values, kind="stable")  # Radix sort for small integer types
+
+        # 1. Moments and extrema (extrema are free on sorted data)
+        self.count += values.size
+        self.minimum = min(self.minimum, float(values[0]))
+        self.maximum = max(self.maximum, float(values[-1]))
+        asFloat = values.astype(np.float64)
+        self.total += float(asFloat.sum())
+        self.totalSquares += float(np.dot(asFloat, asFloat))
+
+        # 2. Histogram, with bins fixed on the first slab
+        if self.histogram is None:
+            lower, upper = self.histogramRange or self._defaultRange(values)
+            self.histogram = FixedBinHistogram(lower, upper, self.numberOfBins)
+        self.histogram.update(values)
+
+        # 3. Sketch
+        self.sketch.update(values)
+
+    # ------------------------------------------------------------------------------------------------------------------
+    @staticmethod
+    def _defaultRange(sortedValues):
+        if sortedValues.dtype.kind in "iu" and sortedValues.dtype.itemsize <= 2:
+            info = np.iinfo(sortedValues.dtype)
+            return float(info.min), float(info.max)
+        return float(sortedValues[0]), float(sortedValues[-1])
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def merge(self, other):
+        """ Combine with the statistics of another worker. Histograms must share their range. """
+        if other.count == 0:
+            return self
+        if self.histogram is not None and other.histogram is not None \
+                and not np.array_equal(self.histogram.edges, other.histogram.edges):
+            raise ValueError("Cannot merge statistics with different histogram ranges, "
+                             "give every worker the same histogramRange")
+        self.count += other.count
+        self.minimum = min(self.minimum, other.minimum)
+        self.maximum = max(self.maximum, other.maximum)
+        self.total += other.total
+        self.totalSquares += other.totalSquares
+        self.sketch.merge(other.sketch)
+        if self.histogram is None:
+            self.histogram = other.histogram
+        elif other.histogram is not None:
+            self.histogram.merge(other.histogram)
+        return self
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def result(self, quantiles=DEFAULT_QUANTILES):
+        """ Plain dict with the exact moments, the approximate quantiles and the histogram. """
+        if self.count == 0:
+            return None
+        mean = self.total / self.count
+        return {
+            "min": self.minimum,
+            "max": self.maximum,
+            "mean": mean,
+            "std": math.sqrt(max(0.0, self.totalSquares / self.count - mean * mean)),
+            "voxels": self.count,
+            "quantiles": dict(zip(quantiles, self.sketch.quantiles(quantiles))),
+            "rankErrorBound": QuantileSketch.rankErrorBound(self.sketch.k),
+            "histogram": {
+                "edges": self.histogram.edges.tolist(),
+                "counts": self.histogram.counts.tolist(),
+                "underflow": self.histogram.underflow,
+                "overflow": self.histogram.overflow,
+            },
+        }
@@ -0,0 +1,355 @@
+import bz2
+import gzip
+import math
+import os
+import re
+import struct
+
+import numpy as np
+
+#
+# Header-only inspection of NRRD / NIfTI files.
+#
+# Nothing in this file imports slicer: headers are parsed straight from disk so that a folder of scans can be
+# triaged without reading any voxel. The payload is only touched (memory-mapped when raw, streamed when
+# compressed) when statistics are explicitly requested.
+#
+
+NRRD_EXTENSIONS = (".nrrd", ".nhdr")
+NIFTI_EXTENSIONS = (".nii", ".nii.gz", ".hdr")
+
+# NRRD accepts several spellings for the same scalar type
+NRRD_TYPES = {
+    "int8": ("signed char", "int8", "int8_t"),
+    "uint8": ("uchar", "unsigned char", "uint8", "uint8_t"),
+    "int16": ("short", "short int", "signed short", "signed short int", "int16", "int16_t"),
+    "uint16": ("ushort", "unsigned short", "unsigned short int", "uint16", "uint16_t"),
+    "int32": ("int", "signed int", "int32", "int32_t"),
+    "uint32": ("uint", "unsigned int", "uint32", "uint32_t"),
+    "int64": ("longlong", "long long", "long long int", "signed long long", "signed long long int", "int64", "int64_t"),
+    "uint64": ("ulonglong", "unsigned long long", "unsigned long long int", "uint64", "uint64_t"),
+    "float32": ("float",),
+    "float64": ("double",),
+}
+NRRD_TYPE_ALIASES = {alias: dtype for dtype, aliases in NRRD_TYPES.items() for alias in aliases}
+
+# NIfTI datatype code -> (numpy scalar type, number of components)
+NIFTI_TYPES = {
+    2: ("uint8", 1), 4: ("int16", 1), 8: ("int32", 1), 16: ("float32", 1), 64: ("float64", 1),
+    256: ("int8", 1), 512: ("uint16", 1), 768: ("uint32", 1), 1024: ("int64", 1), 1280: ("uint64", 1),
+    128: ("uint8", 3), 2304: ("uint8", 4),
+}
+
+# Default amount of voxel data decoded at once when streaming a payload
+DEFAULT_CHUNK_BYTES = 64 * 1024 * 1024
+
+
+'''=================================================================================================================='''
+#
+# VolumeFileHeader
+#
+class VolumeFileHeader:
+    """ Geometry and storage layout of a volume file, as read from its header only. """
+
+    def __init__(self, path, fileFormat):
+        self.path = path
+        self.fileFormat = fileFormat      # "NRRD" or "NIfTI"
+        self.dimensions = (0, 0, 0)       # IJK voxel counts
+        self.numberOfComponents = 1
+        self.spacing = (1.0, 1.0, 1.0)
+        self.origin = (0.0, 0.0, 0.0)     # RAS, as Slicer would report it after loading
+        self.dataType = "uint8"           # numpy scalar type name
+        self.byteOrder = "<"
+        self.encoding = "raw"             # "raw", "gzip", "bzip2" or "ascii"
+        self.dataPath = path              # File holding the payload (differs for detached headers)
+        self.dataOffset = 0               # Byte offset of the payload in dataPath (-1: payload ends the file)
+        self.scaleSlope = 1.0
+        self.scaleIntercept = 0.0
+
+    # ------------------------------------------------------------------------------------------------------------------
+    @property
+    def numberOfVoxels(self):
+        return int(np.prod(self.dimensions, dtype=np.int64))
+
+    # ------------------------------------------------------------------------------------------------------------------
+    @property
+    def numpyDtype(self):
+        return np.dtype(self.dataType).newbyteorder(self.byteOrder)
+
+    # ------------------------------------------------------------------------------------------------------------------
+    @property
+    def inMemorySize(self):
+        """ Bytes the voxel array occupies once loaded. """
+        return self.numberOfVoxels * self.numberOfComponents * self.numpyDtype.itemsize
+
+    # ------------------------------------------------------------------------------------------------------------------
+    @property
+    def onDiskSize(self):
+        """ Bytes used on disk by the header and (possibly detached) payload. """
+        size = os.path.getsize(self.path)
+        if os.path.abspath(self.dataPath) != os.path.abspath(self.path) and os.path.exists(self.dataPath):
+            size += os.path.getsize(self.dataPath)
+        return size
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def toDict(self):
+        return {
+            "path": self.path,
+            "format": self.fileFormat,
+            "dimensions": list(self.dimensions),
+            "components": self.numberOfComponents,
+            "spacing": list(self.spacing),
+            "origin": list(self.origin),
+            "dataType": self.dataType,
+            "encoding": self.encoding,
+            "onDiskSize": self.onDiskSize,
+            "inMemorySize": self.inMemorySize,
+        }
+
+
+'''=================================================================================================================='''
+#
+# Header readers
+#
+def isSupportedVolumeFile(path):
+    """ True if the file name looks like a NRRD or NIfTI volume. """
+    lowerPath = path.lower()
+    return lowerPath.endswith(NRRD_EXTENSIONS) or lowerPath.endswith(NIFTI_EXTENSIONS)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def readVolumeFileHeader(path):
+    """ Parse the header of a NRRD or NIfTI file without reading its voxels. """
+    lowerPath = path.lower()
+    if lowerPath.endswith(NRRD_EXTENSIONS):
+        return readNrrdHeader(path)
+    if lowerPath.endswith(NIFTI_EXTENSIONS):
+        return readNiftiHeader(path)
+    raise ValueError(f"Unsupported volume file: {path}")
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def _parseNrrdVector(text):
+    """ '(1,0,0)' -> (1.0, 0.0, 0.0); 'none' -> None """
+    text = text.strip()
+    if text == "none":
+        return None
+    return tuple(float(value) for value in text.strip("()").split(","))
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def readNrrdHeader(path):
+    """ Parse an attached (.nrrd) or detached (.nhdr) NRRD header. """
+    fields = {}
+    with open(path, "rb") as f:
+        magic = f.readline()
+        if not magic.startswith(b"NRRD"):
+            raise ValueError(f"Not a NRRD file: {path}")
+        while True:
+            line = f.readline()
+            if not line or not line.strip():
+                break  # Blank line (or EOF for .nhdr) ends the header
+            line = line.decode("latin-1").rstrip("\r\n")
+            if line.startswith("#") or ":=" in line:
+                continue  # Comments and key/value pairs carry no geometry
+            key, _, value = line.partition(":")
+            fields[key.strip().lower()] = value.strip()
+        headerLength = f.tell()
+
+    header = VolumeFileHeader(path, "NRRD")
+
+    # 1. Scalar type and encoding
+    scalarType = fields.get("type", "")
+    if scalarType not in NRRD_TYPE_ALIASES:
+        raise ValueError(f"Unsupported NRRD type '{scalarType}' in {path}")
+    header.dataType = NRRD_TYPE_ALIASES[scalarType]
+    header.byteOrder = ">" if fields.get("endian") == "big" else "<"
+    encoding = fields.get("encoding", "raw")
+    header.encoding = {"gz": "gzip", "bz2": "bzip2", "txt": "ascii", "text": "ascii"}.get(encoding, encoding)
+
+    # 2. Axes: spatial axes have a direction vector, the others (vector/list/RGB...) hold components
+    sizes = [int(s) for s in fields["sizes"].split()]
+    if "space directions" in fields:
+        directions = [_parseNrrdVector(d) for d in re.findall(r"\([^)]*\)|none", fields["space directions"])]
+    else:
+        directions = [None] * len(sizes)
+        if "spacings" in fields:
+            spacings = fields["spacings"].split()
+            directions = [None if s == "nan" else (float(s),) for s in spacings]
+    if all(direction is None for direction in directions):  # No geometry at all: treat every axis as spatial
+        directions = [(1.0,)] * len(sizes)
+    spatialSizes = [size for size, direction in zip(sizes, directions) if direction is not None]
+    spatialDirections = [direction for direction in directions if direction is not None]
+    header.numberOfComponents = int(np.prod([size for size, direction in zip(sizes, directions)
+                                             if direction is None] or [1]))
+    header.dimensions = tuple(spatialSizes + [1] * (3 - len(spatialSizes)))
+    spacing = [math.sqrt(sum(c * c for c in direction)) for direction in spatialDirections]
+    header.spacing = tuple(spacing + [1.0] * (3 - len(spacing)))
+
+    # 3. Origin, converted to RAS the same way Slicer does when loading
+    if "space origin" in fields:
+        origin = list(_parseNrrdVector(fields["space origin"]))
+        space = fields.get("space", "")
+        if space in ("left-posterior-superior", "LPS"):
+            origin[0], origin[1] = -origin[0], -origin[1]
+        header.origin = tuple(origin + [0.0] * (3 - len(origin)))
+
+    # 4. Payload location
+    dataFile = fields.get("data file") or fields.get("datafile")
+    if dataFile:
+        if dataFile.startswith("LIST") or " " in dataFile:
+            raise ValueError(f"Multi-file NRRD payloads are not supported: {path}")
+        header.dataPath = os.path.join(os.path.dirname(path), dataFile)
+        header.dataOffset = int(fields.get("byte skip", 0))
+    else:
+        header.dataOffset = headerLength
+    return header
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def readNiftiHeader(path):
+    """ Parse a NIfTI-1 or NIfTI-2 header (.nii, .nii.gz or .hdr/.img pair). """
+    opener = gzip.open if path.lower().endswith(".gz") else open
+    with opener(path, "rb") as f:
+        raw = f.read(540)
+
+    # 1. sizeof_hdr tells both the version and the byte order
+    for byteOrder in ("<", ">"):
+        sizeofHdr = struct.unpack(byteOrder + "i", raw[:4])[0]
+        if sizeofHdr in (348, 540):
+            break
+    else:
+        raise ValueError(f"Not a NIfTI file: {path}")
+
+    def unpack(fmt, offset):
+        return struct.unpack_from(byteOrder + fmt, raw, offset)
+
+    if sizeofHdr == 348:
+        dim = unpack("8h", 40)
+        datatype = unpack("h", 70)[0]
+        pixdim = unpack("8f", 76)
+        voxOffset = int(unpack("f", 108)[0])
+        sclSlope, sclInter = unpack("2f", 112)
+        qformCode, sformCode = unpack("2h", 252)
+        qoffset = unpack("3f", 268)
+        srowX, srowY, srowZ = unpack("4f", 280), unpack("4f", 296), unpack("4f", 312)
+    else:
+        datatype = unpack("h", 12)[0]
+        dim = unpack("8q", 16)
+        pixdim = unpack("8d", 104)
+        voxOffset = unpack("q", 168)[0]
+        sclSlope, sclInter = unpack("2d", 176)
+        qformCode, sformCode = unpack("2i", 344)
+        qoffset = unpack("3d", 376)
+        srowX, srowY, srowZ = unpack("4d", 400), unpack("4d", 432), unpack("4d", 464)
+
+    if datatype not in NIFTI_TYPES:
+        raise ValueError(f"Unsupported NIfTI datatype {datatype} in {path}")
+
+    header = VolumeFileHeader(path, "NIfTI")
+    header.dataType, header.numberOfComponents = NIFTI_TYPES[datatype]
+    header.byteOrder = byteOrder
+    header.encoding = "gzip" if path.lower().endswith(".gz") else "raw"
+
+    # 2. Geometry: NIfTI world space is RAS already
+    numberOfDims = max(1, min(int(dim[0]), 7))
+    sizes = [int(d) for d in dim[1:numberOfDims + 1]]
+    header.dimensions = tuple(sizes[:3] + [1] * (3 - len(sizes[:3])))
+    header.numberOfComponents *= int(np.prod(sizes[3:] or [1]))  # 4th+ axes (time, vectors) become components
+    header.spacing = tuple(abs(float(p)) or 1.0 for p in pixdim[1:4])
+    if sformCode > 0:
+        header.origin = (srowX[3], srowY[3], srowZ[3])
+    elif qformCode > 0:
+        header.origin = tuple(qoffset)
+    if sclSlope not in (0.0, 1.0) or sclInter != 0.0:
+        header.scaleSlope, header.scaleIntercept = (sclSlope or 1.0), sclInter
+
+    # 3. Payload location (.hdr keeps voxels in a sibling .img)
+    if path.lower().endswith(".hdr"):
+        header.dataPath = path[:-4] + (".img" if path.endswith(".hdr") else ".IMG")
+        header.dataOffset = 0
+    else:
+        header.dataOffset = voxOffset
+    return header
+
+
+'''=================================================================================================================='''
+#
+# Payload access (only used when statistics are requested)
+#
+def iterateVoxelChunks(header, chunkBytes=DEFAULT_CHUNK_BYTES):
+    """ Yield the payload as consecutive flat numpy arrays of at most ~chunkBytes each.
+        Raw payloads are memory-mapped, compressed ones are decompressed as a stream. """
+    dtype = header.numpyDtype
+    numberOfValues = header.numberOfVoxels * header.numberOfComponents
+    chunkValues = max(1, chunkBytes // dtype.itemsize)
+
+    # 1. Raw: memory-map, the OS pages data in as slices are touched
+    if header.encoding == "raw":
+        offset = header.dataOffset
+        if offset < 0:
+            offset = os.path.getsize(header.dataPath) - numberOfValues * dtype.itemsize
+        values = np.memmap(header.dataPath, dtype=dtype, mode="r", offset=offset, shape=(numberOfValues,))
+        for start in range(0, numberOfValues, chunkValues):
+            yield values[start:start + chunkValues]
+        return
+
+    # 2. Compressed: decode a bounded amount at a time
+    if header.encoding not in ("gzip", "bzip2"):
+        raise ValueError(f"Statistics are not supported for '{header.encoding}' encoded payloads")
+    fileObject = open(header.dataPath, "rb")
+    skip = header.dataOffset
+    if header.fileFormat == "NRRD" and header.dataPath == header.path:
+        fileObject.seek(header.dataOffset)  # Attached NRRD: compressed data starts right after the header
+        skip = 0
+    stream = gzip.GzipFile(fileobj=fileObject) if header.encoding == "gzip" else bz2.BZ2File(fileObject)
+    with fileObject, stream:
+        if skip > 0:
+            stream.seek(skip)  # NIfTI vox_offset / NRRD "byte skip" count decompressed bytes
+        remaining = numberOfValues
+        while remaining > 0:
+            count = min(chunkValues, remaining)
+            buffer = stream.read(count * dtype.itemsize)
+            if len(buffer) < count * dtype.itemsize:
+                raise ValueError(f"Truncated payload in {header.dataPath}")
+            yield np.frombuffer(buffer, dtype=dtype)
+            remaining -= count
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def iterateVoxelSlabs(header, slabBytes=DEFAULT_CHUNK_BYTES):
+    """ Like iterateVoxelChunks, but each chunk holds whole slices and is shaped [k, j, i] (single component only).
+        Slabs hold an even number of slices (except the last) so that 2x2x2 reductions can run slab by slab. """
+    if header.numberOfComponents != 1:
+        raise ValueError("Slabs are only available for single component volumes")
+    columns, rows, _ = header.dimensions
+    sliceBytes = columns * rows * header.numpyDtype.itemsize
+    slicesPerSlab = max(2, (slabBytes // max(1, sliceBytes)) // 2 * 2)
+    for chunk in iterateVoxelChunks(header, slicesPerSlab * sliceBytes):
+        yield chunk.reshape(-1, rows, columns)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def computeFileStatistics(header, chunkBytes=DEFAULT_CHUNK_BYTES):
+    """ Min/max/mean/std of the payload in one streaming pass, with bounded memory. """
+    minimum, maximum = math.inf, -math.inf
+    count, total, totalSquares = 0, 0.0, 0.0
+    for chunk in iterateVoxelChunks(header, chunkBytes):
+        values = chunk.astype(np.float64)
+        if header.scaleSlope != 1.0 or header.scaleIntercept != 0.0:
+            values = values * header.scaleSlope + header.scaleIntercept
+        minimum = min(minimum, float(values.min()))
+        maximum = max(maximum, float(values.max()))
+        count += values.size
+        total += float(values.sum())
+        totalSquares += float(np.dot(values, values))
+    if count == 0:
+        return None
+    mean = total / count
+    return {
+        "min": minimum,
+        "max": maximum,
+        "mean": mean,
+        "std": math.sqrt(max(0.0, totalSquares / count - mean * mean)),
+        "voxels": count,
+    }
@@ -0,0 +1,205 @@
+import hashlib
+import math
+import os
+
+import numpy as np
+
+#
+# Multi-resolution (2x, 4x, 8x) block-mean pyramid of a volume, for instant previews of huge scans.
+#
+# The pyramid is built in one streaming pass over K-slabs. Besides the block means, block minima / maxima are
+# carried down to the coarsest level so that the scalar range read from it is exact, not smoothed. Pyramids are
+# saved as compressed .npz sidecars named after a fingerprint of the source file, so a scan that was already seen
+# (even renamed or copied) is previewed without reading its voxels again.
+#
+# The fingerprint only samples the file, so it is a lookup key, not a proof: a sidecar also stores the (size, mtime)
+# and the full content hash of the files it was built from. It is used as is when (size, mtime) match, after a full
+# hash check when only the mtime differs (a copy, a touched file), and rebuilt otherwise.
+#
+
+PYRAMID_FACTORS = (2, 4, 8)
+
+# Fingerprint: file size plus evenly spaced samples of the content. Reading a few MB is what keeps reopening a
+# multi-GB scan instant; a modification that leaves size and all sampled blocks untouched is caught by the source
+# stamp / hash stored in the sidecar, not by the fingerprint.
+FINGERPRINT_SAMPLES = 16
+FINGERPRINT_SAMPLE_BYTES = 64 * 1024
+CONTENT_HASH_CHUNK_BYTES = 16 * 1024 * 1024
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def fileFingerprint(*paths):
+    """ Cheap content hash of one or more files (e.g. a .nhdr header and its payload). """
+    digest = hashlib.sha256()
+    for path in paths:
+        size = os.path.getsize(path)
+        digest.update(str(size).encode())
+        with open(path, "rb") as f:
+            if size <= FINGERPRINT_SAMPLES * FINGERPRINT_SAMPLE_BYTES:
+                digest.update(f.read())
+                continue
+            step = (size - FINGERPRINT_SAMPLE_BYTES) // (FINGERPRINT_SAMPLES - 1)
+            for sample in range(FINGERPRINT_SAMPLES):
+                f.seek(sample * step)
+                digest.update(f.read(FINGERPRINT_SAMPLE_BYTES))
+    return digest.hexdigest()
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def fileStamp(*paths):
+    """ (size, modification time in ns) of each file, to confirm that a sidecar found by fingerprint is current. """
+    stamps = []
+    for path in paths:
+        status = os.stat(path)
+        stamps.append((status.st_size, status.st_mtime_ns))
+    return tuple(stamps)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def fileContentHash(*paths):
+    """ Full sha256 of one or more files, read in chunks. """
+    digest = hashlib.sha256()
+    for path in paths:
+        digest.update(str(os.path.getsize(path)).encode())
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(CONTENT_HASH_CHUNK_BYTES), b""):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def blockReduce(voxels, reduction):
+    """ Reduce 2x2x2 blocks of a [k, j, i] array. Odd axes are padded by repeating their last slice. """
+    padding = [(0, n % 2) for n in voxels.shape]
+    if any(after for _, after in padding):
+        voxels = np.pad(voxels, padding, mode="edge")
+    k, j, i = voxels.shape
+    return reduction(voxels.reshape(k // 2, 2, j // 2, 2, i // 2, 2), axis=(1, 3, 5))
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def _blockMean(blocks, axis):
+    return blocks.mean(axis=axis, dtype=np.float32)
+
+
+'''=================================================================================================================='''
+#
+# VolumePyramid
+#
+class VolumePyramid:
+    """ levels: {factor: block-mean array}; minimum / maximum: block extrema at the coarsest factor.
+        sourceStamp / sourceHash: fileStamp and fileContentHash of the files it was built from (None for nodes). """
+
+    def __init__(self, levels, minimum, maximum, shape, sourceStamp=None, sourceHash=None):
+        self.levels = levels
+        self.minimum = minimum
+        self.maximum = maximum
+        self.shape = tuple(int(n) for n in shape)  # Full resolution [k, j, i] shape
+        self.sourceStamp = sourceStamp
+        self.sourceHash = sourceHash
+
+    # ------------------------------------------------------------------------------------------------------------------
+    @property
+    def coarsestFactor(self):
+        return max(self.levels)
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def coarseStatistics(self):
+        """ Statistics read from the coarsest level: exact range, approximate mean / std (smoothed by averaging). """
+        coarsest = self.levels[self.coarsestFactor].astype(np.float64)
+        mean = float(coarsest.mean())
+        return {
+            "min": float(self.minimum.min()),
+            "max": float(self.maximum.max()),
+            "mean": mean,
+            "std": math.sqrt(max(0.0, float(np.dot(coarsest.ravel(), coarsest.ravel())) / coarsest.size - mean * mean)),
+            "factor": self.coarsestFactor,
+        }
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def matchesSource(self, *paths):
+        """ Whether the pyramid was built from the current content of these files: same (size, mtime), or same
+            sizes and full content hash. Pyramids without a stored source (older sidecars) never match. """
+        if self.sourceStamp is None:
+            return False
+        stamp = fileStamp(*paths)
+        if stamp == self.sourceStamp:
+            return True
+        if self.sourceHash is None or [size for size, _ in stamp] != [size for size, _ in self.sourceStamp]:
+            return False
+        return fileContentHash(*paths) == self.sourceHash
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def save(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporaryPath = path + ".tmp.npz"  # Never leave a truncated sidecar behind
+        source = {}
+        if self.sourceStamp is not None:
+            source["sourceStamp"] = np.array(self.sourceStamp, dtype=np.int64)
+        if self.sourceHash is not None:
+            source["sourceHash"] = np.array(self.sourceHash)
+        np.savez_compressed(temporaryPath, shape=np.array(self.shape), minimum=self.minimum, maximum=self.maximum,
+                            **source, **{f"level{factor}": level for factor, level in self.levels.items()})
+        os.replace(temporaryPath, path)
+
+    # ------------------------------------------------------------------------------------------------------------------
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            levels = {int(name[len("level"):]): data[name] for name in data.files if name.startswith("level")}
+            sourceStamp = tuple((int(size), int(mtime)) for size, mtime in data["sourceStamp"]) \
+                if "sourceStamp" in data.files else None
+            sourceHash = str(data["sourceHash"]) if "sourceHash" in data.files else None
+            return cls(levels, data["minimum"], data["maximum"], data["shape"], sourceStamp, sourceHash)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def buildPyramid(slabs, factors=PYRAMID_FACTORS):
+    """ Build a pyramid from an iterable of consecutive [k, j, i] slabs (e.g. memory-mapped K ranges).
+        Only one slab plus the 2x level are held in memory. Integer volumes keep their type (means are rounded). """
+    meanParts, minimumParts, maximumParts = [], [], []
+    carry = None
+    shape = None
+    dtype = None
+
+    def reduceSlab(slab):
+        meanParts.append(blockReduce(slab, _blockMean))
+        minimumParts.append(blockReduce(slab, np.min))
+        maximumParts.append(blockReduce(slab, np.max))
+
+    # 1. First level, streamed: pairs of slices are reduced as soon as they are available
+    for slab in slabs:
+        if shape is None:
+            shape, dtype = [0] + list(slab.shape[1:]), slab.dtype
+        shape[0] += slab.shape[0]
+        if carry is not None:
+            slab = np.concatenate((carry, slab))
+            carry = None
+        if slab.shape[0] % 2:
+            slab, carry = slab[:-1], slab[-1:]
+        if slab.shape[0]:
+            reduceSlab(slab)
+    if carry is not None:
+        reduceSlab(carry)
+    if shape is None:
+        raise ValueError("Cannot build a pyramid of an empty volume")
+
+    def storedType(level):
+        if dtype.kind in "iu":
+            return np.rint(level).astype(dtype)
+        return level
+
+    # 2. Coarser levels, from the previous one
+    levels = {}
+    mean = np.concatenate(meanParts)
+    minimum, maximum = np.concatenate(minimumParts), np.concatenate(maximumParts)
+    factor = 2
+    while True:
+        if factor in factors:
+            levels[factor] = storedType(mean)
+        if factor >= max(factors):
+            break
+        mean = blockReduce(mean, _blockMean)
+        minimum, maximum = blockReduce(minimum, np.min), blockReduce(maximum, np.max)
+        factor *= 2
+    return VolumePyramid(levels, minimum, maximum, shape)
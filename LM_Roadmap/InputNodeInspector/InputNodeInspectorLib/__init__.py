@@ -0,0 +1,27 @@
+from .BatchInspection import readCompletedPaths, readReportRows, runBatchInspection
+from .FrameStatistics import FrameStatisticsWorker, computeFrameStatistics, histogramEdges
+from .MaskedStatistics import (
+    maskedStatistics,
+    nonzeroBounds,
+    sampleBoxOnBlock,
+    sampleLabelmapOnBlock,
+    voxelBlockOfBox,
+)
+from .MemoryAccounting import buildMemoryReport, formatBytes
+from .ModelFileHeader import isSupportedModelFile, readModelFileHeader
+from .NodeExtractors import (
+    NodePropertyExtractor,
+    getNodeExtractor,
+    registerNodeExtractor,
+    unregisterNodeExtractor,
+)
+from .StreamingStatistics import FixedBinHistogram, QuantileSketch, StreamingStatistics
+from .VolumeFileHeader import (
+    VolumeFileHeader,
+    computeFileStatistics,
+    isSupportedVolumeFile,
+    iterateVoxelChunks,
+    iterateVoxelSlabs,
+    readVolumeFileHeader,
+)
+from .VolumePyramid import PYRAMID_FACTORS, VolumePyramid, buildPyramid, fileContentHash, fileFingerprint, fileStamp
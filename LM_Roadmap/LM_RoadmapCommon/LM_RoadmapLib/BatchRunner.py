@@ -0,0 +1,340 @@
+import argparse
+import json
+import os
+import queue
+import subprocess
+import sys
+import threading
+import time
+
+#
+# Headless batch runner of the LM_Roadmap logic (fiducial generation, surface measurement, volume inspection, landmark
+# reset and alignment), for compute nodes without GUI. Only Logic classes are used, no Widget is ever created.
+#
+#   PythonSlicer <...>/LM_RoadmapLib/BatchRunner.py manifest.json results.jsonl --slicer <...>/Slicer --workers 8
+#   Slicer --no-main-window --python-script <...>/LM_RoadmapLib/BatchRunner.py manifest.json results.jsonl
+#
+# Manifest: {"defaults": {...}, "jobs": [{"id": "case01", "type": "measureSurface", "input": "case01.vtk"}, ...]}
+# Each job is merged over the defaults; relative paths are relative to the manifest. Job types and their keys:
+#
+#   generateFiducials   output (optional markups file)
+#   measureSurface      input (model file)
+#   inspectVolume       input (volume file)
+#   resetLandmarks      input (markups file), positions ([[r, a, s], ...]) or positionsFile (markups file), output
+#   alignLandmarks      moving, fixed (markups files), mode ("rigid", "similarity", "affine"), output (optional)
+#
+# Inputs are loaded when their job runs and removed from the scene after it. With --workers N the jobs are dispatched
+# to N worker processes (Slicer --no-main-window), one job at a time, each worker getting its next job as soon as it
+# returns a result; with --workers 0 they run in the calling Slicer process. Every result is appended to the JSON
+# lines output as soon as it arrives, and a restarted run skips the jobs already reported as "ok".
+#
+
+RESULT_PREFIX = "LM_ROADMAP_RESULT "  # Marks result lines in the output of the workers, among Slicer messages
+ALIGNMENT_MODES = ("rigid", "similarity", "affine")
+
+
+'''=================================================================================================================='''
+#
+# Jobs (run in a Slicer process)
+#
+def _loadNode(loader, path):
+    node = loader(path)
+    if node is None:
+        raise OSError(f"Failed to load {path}")
+    return node
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def _saveNode(node, path):
+    import slicer
+    if not slicer.util.saveNode(node, path):
+        raise OSError(f"Failed to save {path}")
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def _controlPoints(node):
+    import slicer
+    return slicer.util.arrayFromMarkupsControlPoints(node).tolist()
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def runGenerateFiducials(job, nodes):
+    from FiducialGenerator import FiducialGeneratorLogic
+    fiducialNode = FiducialGeneratorLogic().createRandomFiducialNode()
+    nodes.append(fiducialNode)
+    if job.get("output"):
+        _saveNode(fiducialNode, job["output"])
+    return {"positions": _controlPoints(fiducialNode)}
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def runMeasureSurface(job, nodes):
+    import slicer
+    from SurfaceMeasurementTool import SurfaceMeasurementToolLogic
+    logic = SurfaceMeasurementToolLogic()
+    modelNode = _loadNode(slicer.util.loadModel, job["input"])
+    nodes.append(modelNode)
+    return {"area": logic.getSurfaceArea(modelNode), "boundingBox": list(logic.getBoundingBox(modelNode)),
+            "centerOfMass": list(logic.getCenterOfMass(modelNode))}
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def runInspectVolume(job, nodes):
+    import slicer
+    from InputNodeInspector import InputNodeInspectorLogic
+    logic = InputNodeInspectorLogic()
+    volumeNode = _loadNode(slicer.util.loadVolume, job["input"])
+    nodes.append(volumeNode)
+    return {"dimensions": list(logic.getDimensions(volumeNode)), "spacing": list(logic.getSpacing(volumeNode)),
+            "scalarRange": list(logic.getScalarRange(volumeNode)),
+            "properties": {key: str(value) for key, value in logic.getNodeProperties(volumeNode).items()}}
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def runResetLandmarks(job, nodes):
+    import slicer
+    from LiveLandmarkMonitor import LiveLandmarkMonitorLogic
+    fiducialNode = _loadNode(slicer.util.loadMarkups, job["input"])
+    nodes.append(fiducialNode)
+    positions = job.get("positions")
+    if positions is None:
+        positionsNode = _loadNode(slicer.util.loadMarkups, job["positionsFile"])
+        nodes.append(positionsNode)
+        positions = _controlPoints(positionsNode)
+    LiveLandmarkMonitorLogic().resetLandmarks(fiducialNode, positions)
+    _saveNode(fiducialNode, job.get("output") or job["input"])
+    return {"numberOfPoints": fiducialNode.GetNumberOfControlPoints()}
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def alignLandmarks(movingNode, fixedNode, mode="rigid"):
+    """ vtkLandmarkTransform mapping the points of movingNode on the corresponding points of fixedNode. """
+    import vtk
+    if mode not in ALIGNMENT_MODES:
+        raise ValueError(f"Alignment mode must be one of {ALIGNMENT_MODES}: {mode}")
+    if movingNode.GetNumberOfControlPoints() != fixedNode.GetNumberOfControlPoints():
+        raise ValueError("Moving and fixed landmarks must have the same number of points")
+    sourcePoints, targetPoints = vtk.vtkPoints(), vtk.vtkPoints()
+    movingNode.GetControlPointPositionsWorld(sourcePoints)
+    fixedNode.GetControlPointPositionsWorld(targetPoints)
+    transform = vtk.vtkLandmarkTransform()
+    transform.SetSourceLandmarks(sourcePoints)
+    transform.SetTargetLandmarks(targetPoints)
+    {"rigid": transform.SetModeToRigidBody, "similarity": transform.SetModeToSimilarity,
+     "affine": transform.SetModeToAffine}[mode]()
+    transform.Update()
+    return transform
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def runAlignLandmarks(job, nodes):
+    import numpy as np
+    import slicer
+    movingNode = _loadNode(slicer.util.loadMarkups, job["moving"])
+    fixedNode = _loadNode(slicer.util.loadMarkups, job["fixed"])
+    nodes += [movingNode, fixedNode]
+    transform = alignLandmarks(movingNode, fixedNode, job.get("mode", "rigid"))
+    movingNode.ApplyTransform(transform)
+    residuals = np.array(_controlPoints(movingNode)) - np.array(_controlPoints(fixedNode))
+    if job.get("output"):
+        _saveNode(movingNode, job["output"])
+    matrix = transform.GetMatrix()
+    return {"matrix": [[matrix.GetElement(row, column) for column in range(4)] for row in range(4)],
+            "rms": float(np.sqrt((residuals ** 2).sum(axis=1).mean()))}
+
+
+JOB_TYPES = {
+    "generateFiducials": runGenerateFiducials,
+    "measureSurface": runMeasureSurface,
+    "inspectVolume": runInspectVolume,
+    "resetLandmarks": runResetLandmarks,
+    "alignLandmarks": runAlignLandmarks,
+}
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def runJob(job):
+    """ Result row of one job. Failures are reported in the row, never raised. """
+    import slicer
+    row = {"id": job["id"], "type": job.get("type"), "status": "ok"}
+    nodes = []
+    start = time.perf_counter()
+    try:
+        if job.get("type") not in JOB_TYPES:
+            raise ValueError(f"Unknown job type: {job.get('type')}")
+        row["result"] = JOB_TYPES[job["type"]](job, nodes)
+    except Exception as e:
+        row["status"], row["error"] = "error", f"{type(e).__name__}: {e}"
+    finally:
+        for node in nodes:  # Inputs only live during their job, with their display and storage nodes
+            helperNodes = [node.GetNthDisplayNode(index) for index in range(node.GetNumberOfDisplayNodes())]
+            helperNodes.append(node.GetStorageNode())
+            slicer.mrmlScene.RemoveNode(node)
+            for helperNode in helperNodes:
+                if helperNode is not None and helperNode.GetScene():
+                    slicer.mrmlScene.RemoveNode(helperNode)
+    row["seconds"] = time.perf_counter() - start
+    return row
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def runWorker(inputStream=None, outputStream=None):
+    """ Worker process loop: one job (JSON line) in, one prefixed result line out, until the input is closed. """
+    inputStream = inputStream or sys.__stdin__ or sys.stdin
+    outputStream = outputStream or sys.__stdout__ or sys.stdout  # Not the Slicer Python console redirection
+    for line in inputStream:
+        if line.strip():
+            outputStream.write(RESULT_PREFIX + json.dumps(runJob(json.loads(line))) + "\n")
+            outputStream.flush()
+
+
+'''=================================================================================================================='''
+#
+# Manifest and dispatch (no Slicer needed, except with workers=0)
+#
+def readManifest(manifestPath):
+    """ Jobs of a manifest, merged over its defaults, with paths made absolute. Jobs without id are numbered. """
+    with open(manifestPath) as f:
+        manifest = json.load(f)
+    baseDirectory = os.path.dirname(os.path.abspath(manifestPath))
+    jobs = []
+    for index, job in enumerate(manifest["jobs"]):
+        job = dict(manifest.get("defaults", {}), **job)
+        job.setdefault("id", f"job{index:06d}")
+        for key in ("input", "output", "positionsFile", "moving", "fixed"):
+            if job.get(key):
+                job[key] = os.path.join(baseDirectory, os.path.expanduser(job[key]))
+        jobs.append(job)
+    if len({job["id"] for job in jobs}) != len(jobs):
+        raise ValueError(f"Job ids must be unique: {manifestPath}")
+    return jobs
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def readCompletedJobs(outputPath):
+    """ Ids of the jobs with an "ok" row in a (possibly partial) output. """
+    completed = set()
+    if os.path.exists(outputPath):
+        with open(outputPath) as f:
+            for line in f:
+                try:
+                    row = json.loads(line)
+                except ValueError:
+                    continue  # Line cut by an interruption
+                if row.get("status") == "ok":
+                    completed.add(row["id"])
+    return completed
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def _workerCommand(slicerExecutable):
+    return [slicerExecutable, "--no-splash", "--no-main-window", "--python-script", os.path.abspath(__file__), "--worker"]
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def _dispatch(jobs, numberOfWorkers, slicerExecutable, writeRow):
+    """ Run jobs in worker processes. Each worker thread feeds its process one job at a time from a shared queue. """
+    pending = queue.Queue()
+    for job in jobs:
+        pending.put(job)
+
+    def serve():
+        process = subprocess.Popen(_workerCommand(slicerExecutable), stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                   stderr=subprocess.DEVNULL, text=True, bufsize=1)
+        try:
+            while True:
+                try:
+                    job = pending.get_nowait()
+                except queue.Empty:
+                    break
+                process.stdin.write(json.dumps(job) + "\n")
+                process.stdin.flush()
+                for line in process.stdout:
+                    if line.startswith(RESULT_PREFIX):
+                        writeRow(json.loads(line[len(RESULT_PREFIX):]))
+                        break
+                else:  # The worker died: report the job, the next ones go to the other workers
+                    writeRow({"id": job["id"], "type": job.get("type"), "status": "error", "error": "Worker exited"})
+                    return
+        finally:
+            process.stdin.close()
+            process.wait()
+
+    threads = [threading.Thread(target=serve) for _ in range(min(numberOfWorkers, len(jobs)))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    while not pending.empty():  # Every worker exited early
+        job = pending.get()
+        writeRow({"id": job["id"], "type": job.get("type"), "status": "error", "error": "No worker left"})
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def runManifest(manifestPath, outputPath, numberOfWorkers=0, slicerExecutable=None, progressCallback=None):
+    """ Run the jobs of a manifest and append one JSON line per job to outputPath. Jobs already reported as "ok"
+        are skipped, so an interrupted run can be restarted with the same arguments. Returns a summary dict. """
+    completedJobs = readCompletedJobs(outputPath)
+    jobs = [job for job in readManifest(manifestPath) if job["id"] not in completedJobs]
+    summary = {"written": 0, "skipped": len(completedJobs), "errors": 0, "seconds": 0.0}
+    start = time.perf_counter()
+    lock = threading.Lock()
+
+    with open(outputPath, "a") as output:
+        def writeRow(row):
+            with lock:
+                output.write(json.dumps(row) + "\n")
+                output.flush()
+                summary["written"] += 1
+                summary["errors"] += row["status"] != "ok"
+            if progressCallback:
+                progressCallback(row)
+
+        if numberOfWorkers > 0:
+            if not slicerExecutable:
+                raise ValueError("Worker processes need the Slicer executable")
+            _dispatch(jobs, numberOfWorkers, slicerExecutable, writeRow)
+        else:
+            for job in jobs:
+                writeRow(runJob(job))
+
+    summary["seconds"] = time.perf_counter() - start
+    return summary
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run LM_Roadmap logic jobs without GUI.")
+    parser.add_argument("manifest", nargs="?")
+    parser.add_argument("output", nargs="?", help="JSON lines results. Existing ok rows are kept and skipped.")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Worker processes (default: number of CPUs, 0 in Slicer runs the jobs in this process)")
+    parser.add_argument("--slicer", help="Slicer launcher of the workers (default: this one when run in Slicer)")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        runWorker()
+        return 0
+    if not args.manifest or not args.output:
+        parser.error("manifest and output are required")
+
+    slicerExecutable = args.slicer
+    numberOfWorkers = args.workers
+    if "slicer" in sys.modules and hasattr(sys.modules["slicer"], "app"):
+        slicerExecutable = slicerExecutable or sys.modules["slicer"].app.launcherExecutableFilePath
+        numberOfWorkers = 0 if numberOfWorkers is None else numberOfWorkers
+    elif numberOfWorkers is None:
+        numberOfWorkers = os.cpu_count() or 1
+
+    summary = runManifest(args.manifest, args.output, numberOfWorkers, slicerExecutable)
+    print(json.dumps(summary), file=sys.stderr)
+    return 1 if summary["errors"] else 0
+
+
+if __name__ == "__main__":
+    status = main(sys.argv[1:])
+    if "slicer" in sys.modules and hasattr(sys.modules["slicer"], "app"):
+        sys.modules["slicer"].util.exit(status)
+    else:
+        sys.exit(status)
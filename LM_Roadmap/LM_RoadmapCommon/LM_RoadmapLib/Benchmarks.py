@@ -0,0 +1,254 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+import numpy as np
+
+#
+# Benchmarks of the LM_Roadmap Logic classes on synthetic inputs, without main window:
+#
+#   Slicer --no-main-window --python-script <...>/LM_RoadmapLib/Benchmarks.py --output results.json [--baseline old.json]
+#
+# Inputs are generated, never downloaded: spheres of increasing resolution, fiducial sets of 10 to 10^6 points, and
+# int16 volumes of increasing size (allocated in VTK and filled in place, so a volume costs its size once). Each case
+# is timed several times on a fresh MRML scene state; the JSON results hold every timing and the median, and comparing
+# them to a previous run (--baseline) flags the cases that became slower.
+#
+
+DEFAULT_REPEATS = 3
+DEFAULT_TOLERANCE = 0.25  # A case regresses when its median is more than 25% slower than in the baseline
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def timeCall(function, repeats=DEFAULT_REPEATS, setup=None):
+    """ Durations (seconds) of repeated calls. setup() runs before each call, untimed; its result is passed to function. """
+    durations = []
+    for _ in range(repeats):
+        argument = setup() if setup else None
+        start = time.perf_counter()
+        function(argument) if setup else function()
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def _result(benchmark, size, durations, **parameters):
+    return {"benchmark": benchmark, "size": size, "parameters": parameters, "seconds": durations,
+            "median": statistics.median(durations)}
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def _sizes(start, maximum, factor):
+    sizes = []
+    while start <= maximum:
+        sizes.append(start)
+        start *= factor
+    return sizes
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def benchmarkSurfaceMeasurements(options):
+    """ Area, center of mass and bounds of spheres of increasing resolution. """
+    import slicer
+    import vtk
+    from SurfaceMeasurementTool import SurfaceMeasurementToolLogic
+    logic = SurfaceMeasurementToolLogic()
+    results = []
+    for resolution in _sizes(16, options.maxSphereResolution, 4):
+        sphere = vtk.vtkSphereSource()
+        sphere.SetThetaResolution(resolution)
+        sphere.SetPhiResolution(resolution)
+        sphere.Update()
+        modelNode = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLModelNode")
+        modelNode.SetAndObservePolyData(sphere.GetOutput())
+        cells = sphere.GetOutput().GetNumberOfCells()
+        for name, method in (("getSurfaceArea", logic.getSurfaceArea), ("getCenterOfMass", logic.getCenterOfMass),
+                             ("getBoundingBox", logic.getBoundingBox)):
+            results.append(_result(f"SurfaceMeasurementTool.{name}", cells,
+                                   timeCall(lambda: method(modelNode), options.repeats), resolution=resolution))
+        slicer.mrmlScene.RemoveNode(modelNode)
+    return results
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def benchmarkFiducials(options):
+    """ Random fiducial node creation, and landmark resets of 10 to maxPoints points. """
+    import slicer
+    from FiducialGenerator import FiducialGeneratorLogic
+    from LiveLandmarkMonitor import LiveLandmarkMonitorLogic
+    results = []
+
+    # 1. Node creation (5 points each)
+    fiducialLogic = FiducialGeneratorLogic()
+    for numberOfNodes in _sizes(10, options.maxFiducialNodes, 10):
+        def createNodes():
+            for _ in range(numberOfNodes):
+                fiducialLogic.createRandomFiducialNode()
+        results.append(_result("FiducialGenerator.createRandomFiducialNode", numberOfNodes,
+                               timeCall(createNodes, options.repeats)))
+        for node in slicer.util.getNodesByClass("vtkMRMLMarkupsFiducialNode"):
+            slicer.mrmlScene.RemoveNode(node)
+
+    # 2. Landmark reset, on a node that already holds the same number of points
+    landmarkLogic = LiveLandmarkMonitorLogic()
+    rng = np.random.default_rng(0)
+    for numberOfPoints in _sizes(10, options.maxPoints, 10):
+        positions = rng.uniform(-100, 100, (numberOfPoints, 3)).tolist()
+        fiducialNode = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLMarkupsFiducialNode")
+        landmarkLogic.resetLandmarks(fiducialNode, positions)
+        results.append(_result("LiveLandmarkMonitor.resetLandmarks", numberOfPoints,
+                               timeCall(lambda: landmarkLogic.resetLandmarks(fiducialNode, positions), options.repeats)))
+        slicer.mrmlScene.RemoveNode(fiducialNode)
+    return results
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def createSyntheticVolume(numberOfBytes, name="BenchmarkVolume"):
+    """ int16 cube of about numberOfBytes, allocated by VTK and filled in place with uniform noise. """
+    import slicer
+    import vtk
+    side = max(2, int(round((numberOfBytes / 2) ** (1.0 / 3.0))))
+    imageData = vtk.vtkImageData()
+    imageData.SetDimensions(side, side, side)
+    imageData.AllocateScalars(vtk.VTK_SHORT, 1)
+    volumeNode = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLScalarVolumeNode", name)
+    volumeNode.SetAndObserveImageData(imageData)
+    voxels = slicer.util.arrayFromVolume(volumeNode)
+    rng = np.random.default_rng(0)
+    for k in range(side):  # Plane by plane: no temporary of the volume size
+        voxels[k] = rng.integers(-1000, 3000, (side, side), dtype=np.int16)
+    slicer.util.arrayFromVolumeModified(volumeNode)
+    return volumeNode
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def benchmarkVolumes(options):
+    """ Volume inspection and threshold preview on volumes of 16 MB to maxVolumeMB. """
+    import slicer
+    from InputNodeInspector import InputNodeInspectorLogic
+    from PersistentGuiState import PersistentGuiStateLogic
+    inspectorLogic = InputNodeInspectorLogic()
+    previewLogic = PersistentGuiStateLogic()
+    parameterNode = previewLogic.getParameterNode()
+    results = []
+    for megabytes in _sizes(16, options.maxVolumeMB, 4):
+        volumeNode = createSyntheticVolume(megabytes * 1024 * 1024)
+        voxelScalars = volumeNode.GetImageData().GetPointData().GetScalars()
+        size = voxelScalars.GetNumberOfTuples()
+
+        # 1. Scalar range: VTK caches it, the array is marked modified so that every call computes it
+        results.append(_result("InputNodeInspector.getScalarRange", size,
+                               timeCall(inspectorLogic.getScalarRange, options.repeats, setup=lambda: (voxelScalars.Modified(), volumeNode)[1]),
+                               megabytes=megabytes))
+        results.append(_result("InputNodeInspector.getDimensions", size,
+                               timeCall(lambda: inspectorLogic.getDimensions(volumeNode), options.repeats), megabytes=megabytes))
+        results.append(_result("InputNodeInspector.getNodeProperties", size,
+                               timeCall(lambda: inspectorLogic.getNodeProperties(volumeNode), options.repeats), megabytes=megabytes))
+        results.append(_result("InputNodeInspector.computeMemoryReport", size,
+                               timeCall(inspectorLogic.computeMemoryReport, options.repeats), megabytes=megabytes))
+
+        # 2. Threshold preview: one plane (drag) and the whole volume (release)
+        labelmapNode = previewLogic.getPreviewLabelmap(parameterNode, volumeNode)
+        middlePlane = [(0, volumeNode.GetImageData().GetDimensions()[2] // 2)]
+        results.append(_result("PersistentGuiState.updatePreviewPlanes", size,
+                               timeCall(lambda: previewLogic.updatePreviewPlanes(volumeNode, labelmapNode, 50.0, False, middlePlane), options.repeats),
+                               megabytes=megabytes))
+        results.append(_result("PersistentGuiState.startFullPreviewUpdate", size,
+                               timeCall(lambda: previewLogic.startFullPreviewUpdate(volumeNode, labelmapNode, 50.0, False).result(), options.repeats),
+                               megabytes=megabytes))
+        previewLogic.pollFullPreviewUpdate()
+
+        parameterNode.SetNodeReferenceID("PreviewLabelmap", None)
+        slicer.mrmlScene.RemoveNode(labelmapNode)
+        slicer.mrmlScene.RemoveNode(volumeNode)
+    previewLogic.backgroundThreshold.shutdown()
+    return results
+
+
+BENCHMARKS = {
+    "surface": benchmarkSurfaceMeasurements,
+    "fiducials": benchmarkFiducials,
+    "volumes": benchmarkVolumes,
+}
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def getEnvironment():
+    import slicer
+    return {
+        "slicerVersion": slicer.app.applicationVersion,
+        "slicerRevision": slicer.app.revision,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "cpuCount": os.cpu_count(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def runBenchmarks(options, names=None):
+    """ Results of the selected benchmarks (all by default), with the environment they ran in. """
+    results = []
+    for name in names or BENCHMARKS:
+        results.extend(BENCHMARKS[name](options))
+    return {"environment": getEnvironment(), "repeats": options.repeats, "results": results}
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def compareResults(baseline, current, tolerance=DEFAULT_TOLERANCE):
+    """ Cases (benchmark, size) whose median is more than tolerance slower than in the baseline. """
+    baselineMedians = {(result["benchmark"], result["size"]): result["median"] for result in baseline["results"]}
+    regressions = []
+    for result in current["results"]:
+        before = baselineMedians.get((result["benchmark"], result["size"]))
+        if before and result["median"] > before * (1.0 + tolerance):
+            regressions.append({"benchmark": result["benchmark"], "size": result["size"], "baseline": before,
+                                "median": result["median"], "ratio": result["median"] / before})
+    return regressions
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def createArgumentParser():
+    parser = argparse.ArgumentParser(description="Benchmark the LM_Roadmap Logic classes on synthetic data.")
+    parser.add_argument("--output", help="JSON file receiving the results (printed otherwise)")
+    parser.add_argument("--baseline", help="JSON results of a previous run: exit with 1 if a case became slower")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument("--only", help=f"Comma separated benchmarks among: {', '.join(BENCHMARKS)}")
+    parser.add_argument("--repeats", type=int, default=DEFAULT_REPEATS)
+    parser.add_argument("--max-sphere-resolution", dest="maxSphereResolution", type=int, default=1024)
+    parser.add_argument("--max-fiducial-nodes", dest="maxFiducialNodes", type=int, default=1000)
+    parser.add_argument("--max-points", dest="maxPoints", type=int, default=10 ** 6)
+    parser.add_argument("--max-volume-mb", dest="maxVolumeMB", type=int, default=4096)
+    return parser
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def main(argv=None):
+    options = createArgumentParser().parse_args(argv)
+    report = runBenchmarks(options, options.only.split(",") if options.only else None)
+    text = json.dumps(report, indent=1)
+    if options.output:
+        with open(options.output, "w") as f:
+            f.write(text)
+    else:
+        print(text)
+
+    if not options.baseline:
+        return 0
+    with open(options.baseline) as f:
+        regressions = compareResults(json.load(f), report, options.tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression['benchmark']} [{regression['size']}]: "
+              f"{regression['baseline']:.4f} s -> {regression['median']:.4f} s (x{regression['ratio']:.2f})", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    import slicer
+    slicer.util.exit(main(sys.argv[1:]))
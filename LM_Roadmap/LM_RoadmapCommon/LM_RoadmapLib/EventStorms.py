@@ -0,0 +1,200 @@
+import argparse
+import json
+import sys
+import time
+
+import numpy as np
+
+from LM_RoadmapLib.Benchmarks import createSyntheticVolume, getEnvironment
+from LM_RoadmapLib.Instrumentation import getCallbackStatistics, resetCallbackStatistics, setCallbackTimingEnabled
+
+#
+# GUI responsiveness of the LM_Roadmap widgets under synthetic event storms:
+#
+#   Slicer --python-script <...>/LM_RoadmapLib/EventStorms.py --output storms.json [--events 5000]
+#
+# Each storm loads a module widget, then replays a scripted burst through the same entry points as the user or the
+# scene would: PointModifiedEvents on the fiducial observed by LiveLandmarkMonitor, a slider drag in PersistentGuiState,
+# node selection changes in InputNodeInspector. Events are delivered in frames of a few events, and the Qt event loop
+# runs between frames so that timers (write throttle, preview) fire as they would interactively.
+#
+# The GUI thread is blocked during each event (synchronous observers) and during each event loop run (timers, queued
+# work). A storm reports the callbacks called (from the @timedCallback statistics), the total blocked time, and the
+# worst stall: the longest of these blocked periods.
+#
+
+DEFAULT_NUMBER_OF_EVENTS = 2000
+DEFAULT_EVENTS_PER_FRAME = 10
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def getEnteredModuleWidget(moduleName):
+    """ Widget of a module, entered as if the user opened it (also without main window). """
+    import slicer
+    if slicer.util.mainWindow():
+        slicer.util.selectModule(moduleName)
+        return slicer.util.getModuleWidget(moduleName)
+    widget = slicer.util.getModuleWidget(moduleName)
+    widget.enter()
+    return widget
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def measureStorm(stormName, events, eventsPerFrame=DEFAULT_EVENTS_PER_FRAME):
+    """ Replay events (callables), processing the Qt events after each frame. Returns the storm report. """
+    import slicer
+    slicer.app.processEvents()  # Work queued by the setup is not part of the storm
+    resetCallbackStatistics()
+    setCallbackTimingEnabled(True)
+    blocked = []
+    for index, event in enumerate(events):
+        start = time.perf_counter()
+        event()
+        blocked.append(time.perf_counter() - start)
+        if (index + 1) % eventsPerFrame == 0:
+            start = time.perf_counter()
+            slicer.app.processEvents()
+            blocked.append(time.perf_counter() - start)
+    start = time.perf_counter()
+    slicer.app.processEvents()
+    blocked.append(time.perf_counter() - start)
+
+    callbacks = getCallbackStatistics()
+    return {
+        "storm": stormName,
+        "events": len(events),
+        "callbacks": sum(values["calls"] for values in callbacks.values()),
+        "blockedMs": 1e3 * sum(blocked),
+        "worstStallMs": 1e3 * max(blocked),
+        "p95StallMs": 1e3 * float(np.percentile(blocked, 95)),
+        "callbackStatistics": callbacks,
+    }
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def landmarkStorm(options):
+    """ PointModifiedEvents on the fiducial observed by LiveLandmarkMonitor: points moved one at a time. """
+    import slicer
+    fiducialNode = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLMarkupsFiducialNode", "EventStormFiducial")
+    rng = np.random.default_rng(0)
+    slicer.util.updateMarkupsControlPointsFromArray(fiducialNode, rng.uniform(-100, 100, (options.points, 3)))
+    widget = getEnteredModuleWidget("LiveLandmarkMonitor")
+    widget.logic.getParameterNode().SetNodeReferenceID("SelectedFiducial", fiducialNode.GetID())
+
+    indices = rng.integers(0, options.points, options.events)
+    positions = rng.uniform(-100, 100, (options.events, 3))
+    events = [lambda index=int(index), position=position: fiducialNode.SetNthControlPointPosition(index, position)
+              for index, position in zip(indices, positions)]
+    report = measureStorm("LiveLandmarkMonitor.PointModifiedEvent", events, options.eventsPerFrame)
+    slicer.mrmlScene.RemoveNode(fiducialNode)
+    return report
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def sliderStorm(options):
+    """ Slider drag in PersistentGuiState: press, one value change per event, release. """
+    import slicer
+    volumeNode = createSyntheticVolume(options.volumeMB * 1024 * 1024, "EventStormVolume")
+    widget = getEnteredModuleWidget("PersistentGuiState")
+    widget.logic.getParameterNode().SetNodeReferenceID("InputVolume", volumeNode.GetID())
+
+    # 1. Distinct integer values, back and forth between the slider bounds: every event is a value change
+    slider = widget.ui.imageThresholdSliderWidget
+    values, value, step = [], slider.value, 1
+    for _ in range(options.events):
+        if not slider.minimum <= value + step <= slider.maximum:
+            step = -step
+        value += step
+        values.append(value)
+    events = [lambda value=value: slider.setValue(value) for value in values]
+    events.insert(0, lambda: slider.setSliderDown(True))  # Emits sliderPressed, as a mouse press on the handle
+    events.append(lambda: slider.setSliderDown(False))  # Emits sliderReleased
+
+    # 2. Visible plane previews counted on the logic
+    previewPlaneUpdates = [0]
+    updatePreviewPlanes = widget.logic.updatePreviewPlanes
+
+    def countedUpdatePreviewPlanes(*args):
+        previewPlaneUpdates[0] += 1
+        return updatePreviewPlanes(*args)
+
+    widget.logic.updatePreviewPlanes = countedUpdatePreviewPlanes
+    widget.sliderWriteThrottle.resetCounters()
+    try:
+        report = measureStorm("PersistentGuiState.SliderDrag", events, options.eventsPerFrame)
+    finally:
+        del widget.logic.updatePreviewPlanes
+    report["valueChanges"] = len(values)
+    report["previewPlaneUpdates"] = previewPlaneUpdates[0]
+    report["sliderWrites"] = widget.sliderWriteThrottle.getCounters()
+
+    widget.logic.backgroundThreshold.cancel(wait=True)
+    widget.logic.pollFullPreviewUpdate()
+    widget.logic.getParameterNode().SetNodeReferenceID("InputVolume", None)
+    slicer.mrmlScene.RemoveNode(volumeNode)
+    return report
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def selectionStorm(options):
+    """ Input node selection changes in InputNodeInspector, cycling through a few small volumes. """
+    import slicer
+    volumeNodes = [createSyntheticVolume(256 * 1024, f"EventStormVolume{index}") for index in range(options.nodes)]
+    widget = getEnteredModuleWidget("InputNodeInspector")
+    selector = widget.ui.inputNodeSelector
+    events = [lambda node=volumeNodes[index % len(volumeNodes)]: selector.setCurrentNode(node)
+              for index in range(options.events)]
+    report = measureStorm("InputNodeInspector.NodeSelection", events, options.eventsPerFrame)
+
+    selector.setCurrentNode(None)
+    for volumeNode in volumeNodes:
+        slicer.mrmlScene.RemoveNode(volumeNode)
+    return report
+
+
+STORMS = {
+    "landmarks": landmarkStorm,
+    "slider": sliderStorm,
+    "selection": selectionStorm,
+}
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def runStorms(options, names=None):
+    """ Reports of the selected storms (all by default), with the environment they ran in. """
+    return {"environment": getEnvironment(), "storms": [STORMS[name](options) for name in names or STORMS]}
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def createArgumentParser():
+    parser = argparse.ArgumentParser(description="Measure the LM_Roadmap widget latency under synthetic event storms.")
+    parser.add_argument("--output", help="JSON file receiving the reports (printed otherwise)")
+    parser.add_argument("--only", help=f"Comma separated storms among: {', '.join(STORMS)}")
+    parser.add_argument("--events", type=int, default=DEFAULT_NUMBER_OF_EVENTS, help="Events per storm")
+    parser.add_argument("--events-per-frame", dest="eventsPerFrame", type=int, default=DEFAULT_EVENTS_PER_FRAME,
+                        help="Events delivered between two runs of the Qt event loop")
+    parser.add_argument("--points", type=int, default=100, help="Points of the observed fiducial")
+    parser.add_argument("--volume-mb", dest="volumeMB", type=int, default=64, help="Size of the thresholded volume")
+    parser.add_argument("--nodes", type=int, default=4, help="Volumes the node selection cycles through")
+    return parser
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def main(argv=None):
+    options = createArgumentParser().parse_args(argv)
+    report = runStorms(options, options.only.split(",") if options.only else None)
+    text = json.dumps(report, indent=1)
+    if options.output:
+        with open(options.output, "w") as f:
+            f.write(text)
+    else:
+        print(text)
+    for storm in report["storms"]:
+        print(f"{storm['storm']}: {storm['events']} events, {storm['callbacks']} callbacks, "
+              f"blocked {storm['blockedMs']:.1f} ms, worst stall {storm['worstStallMs']:.1f} ms", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    import slicer
+    slicer.util.exit(main(sys.argv[1:]))
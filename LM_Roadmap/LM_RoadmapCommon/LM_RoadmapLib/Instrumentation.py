@@ -0,0 +1,214 @@
+import functools
+import json
+import logging
+import os
+import time
+
+#
+# Leveled logging and per-callback latency statistics shared by the LM_Roadmap modules.
+#
+# Traces go to the "LM_Roadmap.<module>" loggers at DEBUG level. They are disabled by default (level from
+# $LM_ROADMAP_LOG_LEVEL, WARNING otherwise), and a disabled logger call costs one level check; arguments are passed
+# %-style so that nothing is formatted unless the message is emitted.
+#
+# Observer callbacks are wrapped with @timedCallback, which counts calls and adds each duration to a histogram of
+# power-of-two microsecond bins (a few hundred nanoseconds per call). The statistics show which callback a drag or an
+# event storm spends its time in: in the panel of showInstrumentationPanel(), or as JSON.
+#
+
+LOGGER_NAME = "LM_Roadmap"
+LOG_LEVEL_ENVIRONMENT_VARIABLE = "LM_ROADMAP_LOG_LEVEL"
+NUMBER_OF_LATENCY_BINS = 24  # Bin 0: < 1 us, bin n: [2^(n-1), 2^n) us, last bin: everything longer (> 4 s)
+
+logging.getLogger(LOGGER_NAME).setLevel(os.environ.get(LOG_LEVEL_ENVIRONMENT_VARIABLE, "WARNING").upper())
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def getLogger(moduleName):
+    """ Logger of one module, child of the "LM_Roadmap" logger whose level controls them all. """
+    return logging.getLogger(f"{LOGGER_NAME}.{moduleName}")
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def setLogLevel(level):
+    """ level: logging level or name ("DEBUG" shows the call traces). """
+    logging.getLogger(LOGGER_NAME).setLevel(level.upper() if isinstance(level, str) else level)
+
+
+'''=================================================================================================================='''
+#
+# CallbackStatistics
+#
+class CallbackStatistics:
+    """ Call count and latency histogram of one callback. """
+
+    __slots__ = ("calls", "totalNs", "maximumNs", "bins")
+
+    def __init__(self):
+        self.calls = 0
+        self.totalNs = 0
+        self.maximumNs = 0
+        self.bins = [0] * NUMBER_OF_LATENCY_BINS
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def add(self, elapsedNs):
+        self.calls += 1
+        self.totalNs += elapsedNs
+        if elapsedNs > self.maximumNs:
+            self.maximumNs = elapsedNs
+        self.bins[min((elapsedNs // 1000).bit_length(), NUMBER_OF_LATENCY_BINS - 1)] += 1
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def percentileUs(self, percent):
+        """ Upper bound of the bin holding the percentile (at most the maximum): a factor-of-two estimate. """
+        target = self.calls * percent / 100.0
+        cumulative = 0
+        for index, count in enumerate(self.bins):
+            cumulative += count
+            if count and cumulative >= target:
+                return min(float(2 ** index), self.maximumNs / 1e3)
+        return 0.0
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def toDict(self):
+        return {
+            "calls": self.calls,
+            "totalMs": self.totalNs / 1e6,
+            "meanUs": self.totalNs / 1e3 / self.calls if self.calls else 0.0,
+            "p50Us": self.percentileUs(50),
+            "p95Us": self.percentileUs(95),
+            "maximumUs": self.maximumNs / 1e3,
+            "histogramUs": {("<1" if index == 0 else f"<{2 ** index}"): count for index, count in enumerate(self.bins) if count},
+        }
+
+
+_statistics = {}  # "Module.Class.method" -> CallbackStatistics
+_timingEnabled = True
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def timedCallback(function):
+    """ Decorator counting the calls of a callback and recording their duration. """
+    name = f"{function.__module__}.{function.__qualname__}"
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        if not _timingEnabled:
+            return function(*args, **kwargs)
+        start = time.perf_counter_ns()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            statistics = _statistics.get(name)
+            if statistics is None:
+                statistics = _statistics[name] = CallbackStatistics()
+            statistics.add(time.perf_counter_ns() - start)
+
+    return wrapper
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def setCallbackTimingEnabled(enabled):
+    global _timingEnabled
+    _timingEnabled = bool(enabled)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def resetCallbackStatistics():
+    _statistics.clear()
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def getCallbackStatistics():
+    """ {callback name: statistics dict}, the most expensive callbacks (total time) first. """
+    ordered = sorted(_statistics.items(), key=lambda item: item[1].totalNs, reverse=True)
+    return {name: statistics.toDict() for name, statistics in ordered}
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def dumpCallbackStatistics(path=None):
+    """ Statistics as JSON text, also written to path if given. """
+    text = json.dumps(getCallbackStatistics(), indent=1)
+    if path:
+        with open(path, "w") as f:
+            f.write(text)
+    return text
+
+
+_panel = None
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def showInstrumentationPanel():
+    """ Non-modal window with the callback statistics and the log level, usable while working in any module. """
+    global _panel
+    if _panel is None:
+        _panel = _createInstrumentationPanel()
+    _panel.refresh()
+    _panel.show()
+    _panel.raise_()
+    return _panel
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def _createInstrumentationPanel():
+    import qt
+    import slicer
+
+    panel = qt.QDialog(slicer.util.mainWindow())
+    panel.setWindowTitle("LM_Roadmap callback statistics")
+    panel.resize(900, 400)
+    layout = qt.QVBoxLayout(panel)
+
+    # 1. Log level and timing switch
+    optionsLayout = qt.QHBoxLayout()
+    optionsLayout.addWidget(qt.QLabel("Log level:"))
+    levelComboBox = qt.QComboBox()
+    levelComboBox.addItems(["DEBUG", "INFO", "WARNING", "ERROR"])
+    levelComboBox.currentText = logging.getLevelName(logging.getLogger(LOGGER_NAME).level)
+    levelComboBox.currentTextChanged.connect(setLogLevel)
+    optionsLayout.addWidget(levelComboBox)
+    timingCheckBox = qt.QCheckBox("Time callbacks")
+    timingCheckBox.checked = _timingEnabled
+    timingCheckBox.toggled.connect(setCallbackTimingEnabled)
+    optionsLayout.addWidget(timingCheckBox)
+    optionsLayout.addStretch()
+    layout.addLayout(optionsLayout)
+
+    # 2. One row per callback
+    columns = ["Callback", "Calls", "Total (ms)", "Mean (us)", "p50 (us)", "p95 (us)", "Max (us)"]
+    table = qt.QTableWidget()
+    table.setColumnCount(len(columns))
+    table.setHorizontalHeaderLabels(columns)
+    table.horizontalHeader().setSectionResizeMode(0, qt.QHeaderView.Stretch)
+    table.setEditTriggers(qt.QAbstractItemView.NoEditTriggers)
+    layout.addWidget(table)
+
+    def refresh():
+        statistics = getCallbackStatistics()
+        table.setRowCount(len(statistics))
+        for row, (name, values) in enumerate(statistics.items()):
+            cells = [name, str(values["calls"]), f"{values['totalMs']:.1f}", f"{values['meanUs']:.0f}",
+                     f"{values['p50Us']:.0f}", f"{values['p95Us']:.0f}", f"{values['maximumUs']:.0f}"]
+            for column, text in enumerate(cells):
+                table.setItem(row, column, qt.QTableWidgetItem(text))
+
+    def reset():
+        resetCallbackStatistics()
+        refresh()
+
+    def save():
+        path = qt.QFileDialog.getSaveFileName(panel, "Save callback statistics", "", "JSON (*.json)")
+        if path:
+            dumpCallbackStatistics(path)
+
+    # 3. Actions
+    buttonsLayout = qt.QHBoxLayout()
+    for text, action in (("Refresh", refresh), ("Reset", reset), ("Save JSON...", save)):
+        button = qt.QPushButton(text)
+        button.clicked.connect(lambda checked=False, action=action: action())
+        buttonsLayout.addWidget(button)
+    layout.addLayout(buttonsLayout)
+
+    panel.refresh = refresh
+    return panel
@@ -0,0 +1,197 @@
+import os
+import struct
+
+from .LazyImport import lazyImport
+
+np = lazyImport("numpy")
+
+#
+# Bulk import/export of markups control points as arrays, for landmark sets too large for .mrk.json / .fcsv text.
+#
+# Formats, chosen by file extension:
+#   .npy  (n, 3) float64 RAS positions, no labels
+#   .npz  "positions" (n, 3) float64 and optionally "labels" (n,) fixed-width unicode (no pickled objects)
+#   .lmb  memory-mappable binary layout, little-endian:
+#           header    64 bytes: magic "LMBPTS01", number of points, then the byte offsets of the positions, of the
+#                     label offsets and of the label string table (0 without labels), as uint64
+#           positions (n, 3) float64 RAS, at a 64-byte aligned offset
+#           labels    (n,) uint64 offsets into the string table, then the string table: UTF-8 labels, each ending
+#                     with a NUL byte (as in ELF string tables)
+#         Positions are read as a numpy memory map, so opening a file costs nothing until points are used, and one
+#         label can be read without decoding the others (readLandmarkLabel).
+#
+# Nodes are filled in one bulk operation (slicer.util.updateMarkupsControlPointsFromArray, a single vtkPoints), labels
+# are then set between StartModify/EndModify so observers see one modification.
+#
+# Labels have no bulk path: the markups API reads and writes them one control point at a time, from Python
+# (GetControlPointLabels fills a vtkStringArray, which is again read one value per call). With labels, export and
+# import cost one Python call per point on top of the bulk positions, several times the positions alone for millions
+# of points; pass labels=False when positions are enough.
+#
+
+LANDMARK_ARRAY_EXTENSIONS = (".npy", ".npz", ".lmb")
+BINARY_MAGIC = b"LMBPTS01"
+_BINARY_HEADER = struct.Struct("<8s4Q")
+_BINARY_HEADER_BYTES = 64
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def _extension(path):
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in LANDMARK_ARRAY_EXTENSIONS:
+        raise ValueError(f"Unsupported landmark array file {path}, expected {', '.join(LANDMARK_ARRAY_EXTENSIONS)}")
+    return extension
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def _align(offset, alignment=64):
+    return (offset + alignment - 1) // alignment * alignment
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def writeLandmarkArrays(path, positions, labels=None):
+    """ Write (n, 3) RAS positions, and optionally n labels, in the format of the path extension. """
+    extension = _extension(path)
+    positions = np.ascontiguousarray(positions, dtype="<f8").reshape(-1, 3)
+    if labels is not None and len(labels) != len(positions):
+        raise ValueError(f"{len(labels)} labels for {len(positions)} positions")
+
+    if extension == ".npy":
+        if labels is not None:
+            raise ValueError(".npy files store positions only, use .npz or .lmb to keep labels")
+        np.save(path, positions)
+    elif extension == ".npz":
+        arrays = {"positions": positions}
+        if labels is not None:
+            arrays["labels"] = np.asarray(labels, dtype=str)
+        np.savez(path, **arrays)
+    else:
+        _writeBinary(path, positions, labels)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def _stringTable(labels):
+    """ NUL-terminated UTF-8 labels and their (n,) uint64 byte offsets. """
+    text = "".join(label + "\0" for label in labels)
+    stringTable = text.encode("utf-8")
+    if stringTable.count(b"\0") != len(labels):
+        raise ValueError("Labels cannot contain NUL characters")
+    if len(stringTable) == len(text):  # ASCII: byte lengths are the string lengths
+        lengths = np.fromiter(map(len, labels), dtype="<u8", count=len(labels))
+    else:
+        lengths = np.fromiter((len(label.encode("utf-8")) for label in labels), dtype="<u8", count=len(labels))
+    labelOffsets = np.zeros(len(labels), dtype="<u8")
+    labelOffsets[1:] = np.cumsum(lengths[:-1] + 1)
+    return stringTable, labelOffsets
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def _writeBinary(path, positions, labels):
+    positionsOffset = _BINARY_HEADER_BYTES
+    labelOffsetsOffset = stringTableOffset = 0
+    if labels is not None:
+        stringTable, labelOffsets = _stringTable(labels)
+        labelOffsetsOffset = _align(positionsOffset + positions.nbytes)
+        stringTableOffset = labelOffsetsOffset + labelOffsets.nbytes
+    with open(path, "wb") as f:
+        header = _BINARY_HEADER.pack(BINARY_MAGIC, len(positions), positionsOffset, labelOffsetsOffset,
+                                     stringTableOffset)
+        f.write(header.ljust(_BINARY_HEADER_BYTES, b"\0"))
+        f.write(positions.data)
+        if labels is not None:
+            f.write(b"\0" * (labelOffsetsOffset - f.tell()))
+            f.write(labelOffsets.data)
+            f.write(stringTable)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def _readBinaryHeader(path):
+    with open(path, "rb") as f:
+        magic, numberOfPoints, positionsOffset, labelOffsetsOffset, stringTableOffset = _BINARY_HEADER.unpack(
+            f.read(_BINARY_HEADER.size))
+    if magic != BINARY_MAGIC:
+        raise ValueError(f"{path} is not a landmark binary file")
+    return numberOfPoints, positionsOffset, labelOffsetsOffset, stringTableOffset
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def readLandmarkArrays(path, mmap=True, readLabels=True):
+    """ (positions, labels) of a landmark array file: (n, 3) float64 RAS positions (a read-only memory map of .npy and
+        .lmb files with mmap) and a list of n labels, or None if the file has none (or readLabels is False). """
+    extension = _extension(path)
+    if extension == ".npy":
+        return np.load(path, mmap_mode="r" if mmap else None).reshape(-1, 3), None
+    if extension == ".npz":
+        with np.load(path) as arrays:
+            labels = arrays["labels"].tolist() if readLabels and "labels" in arrays.files else None
+            return arrays["positions"].reshape(-1, 3), labels
+
+    numberOfPoints, positionsOffset, labelOffsetsOffset, stringTableOffset = _readBinaryHeader(path)
+    if numberOfPoints == 0:
+        positions = np.zeros((0, 3))  # Empty files cannot be mapped
+    elif mmap:
+        positions = np.memmap(path, dtype="<f8", mode="r", offset=positionsOffset, shape=(numberOfPoints, 3))
+    else:
+        positions = np.fromfile(path, dtype="<f8", count=3 * numberOfPoints, offset=positionsOffset).reshape(-1, 3)
+    labels = None
+    if readLabels and stringTableOffset:
+        with open(path, "rb") as f:
+            f.seek(stringTableOffset)
+            labels = f.read().decode("utf-8").split("\0")[:numberOfPoints]
+    return positions, labels
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def readLandmarkLabel(path, index):
+    """ Label of one point of a .lmb file, read without the other labels (None if the file has no labels). """
+    numberOfPoints, _, labelOffsetsOffset, stringTableOffset = _readBinaryHeader(path)
+    if not stringTableOffset:
+        return None
+    if not 0 <= index < numberOfPoints:
+        raise IndexError(f"Point {index} out of range, the file has {numberOfPoints} points")
+    with open(path, "rb") as f:
+        f.seek(labelOffsetsOffset + 8 * index)
+        labelOffset, = struct.unpack("<Q", f.read(8))
+        f.seek(stringTableOffset + labelOffset)
+        label = bytearray()
+        while b"\0" not in label:
+            chunk = f.read(256)
+            if not chunk:
+                break
+            label += chunk
+    return bytes(label).split(b"\0", 1)[0].decode("utf-8")
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def exportMarkupsArrays(markupsNode, path, labels=True, world=False):
+    """ Write the control points of a markups node to a landmark array file (labels ignored for .npy). Labels are
+        read one point at a time, labels=False skips them. """
+    import slicer
+    positions = slicer.util.arrayFromMarkupsControlPoints(markupsNode, world=world).reshape(-1, 3)
+    pointLabels = None
+    if labels and _extension(path) != ".npy":
+        pointLabels = [markupsNode.GetNthControlPointLabel(index) for index in range(len(positions))]
+    writeLandmarkArrays(path, positions, pointLabels)
+    return len(positions)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def importMarkupsArrays(path, markupsNode=None, labels=True, world=False):
+    """ Replace the control points of a markups node (a new fiducial node named after the file by default) by those of
+        a landmark array file, in one bulk update (labels, if any, are then set one point at a time). Returns the
+        node. """
+    import slicer
+    positions, pointLabels = readLandmarkArrays(path, readLabels=labels)
+    if markupsNode is None:
+        name = os.path.basename(path).split(".")[0]
+        markupsNode = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLMarkupsFiducialNode",
+                                                         slicer.mrmlScene.GenerateUniqueName(name))
+    wasModified = markupsNode.StartModify()
+    try:
+        slicer.util.updateMarkupsControlPointsFromArray(markupsNode, np.asarray(positions), world=world)
+        if pointLabels is not None:
+            for index, label in enumerate(pointLabels):
+                markupsNode.SetNthControlPointLabel(index, label)
+    finally:
+        markupsNode.EndModify(wasModified)
+    return markupsNode
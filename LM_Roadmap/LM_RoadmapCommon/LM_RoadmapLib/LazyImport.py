@@ -0,0 +1,28 @@
+import importlib.util
+import sys
+
+#
+# Deferred imports, to keep the import of the module files (done by Slicer for every module at startup) cheap.
+#
+# np = lazyImport("numpy") binds a module object whose code only runs on first attribute access, so module code keeps
+# using np.* unchanged. Packages used by a few methods only (the <Module>Lib packages) are imported in those methods.
+#
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def lazyImport(name):
+    """ Module name, imported on first attribute access (immediately available if it was already imported). """
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ModuleNotFoundError(f"No module named '{name}'", name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    parentName, _, childName = name.rpartition(".")
+    if parentName:
+        setattr(sys.modules[parentName], childName, module)  # As the import system does, for "import parent.child"
+    return module
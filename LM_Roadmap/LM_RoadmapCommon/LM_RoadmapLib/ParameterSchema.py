@@ -0,0 +1,150 @@
+import json
+
+from .Instrumentation import getLogger
+
+#
+# Typed access to the string parameters of a module's parameter node.
+#
+# Each module declares its parameters once (name, python type, default, bounds). The schema writes the defaults,
+# validates writes, serializes values in the strings the modules always used ("50.0", "True", JSON), and caches parsed
+# values per parameter node. A cached value is keyed by the stored string it was parsed from, so it is valid whatever
+# changed the parameter (set(), SetParameter, scene load) and even between StartModify/EndModify, when the node MTime
+# does not move; updateGUIFromParameterNode no longer re-parses unchanged values, at the cost of one string read.
+#
+
+logger = getLogger(__name__)
+
+
+'''=================================================================================================================='''
+#
+# Parameter
+#
+class Parameter:
+    """ One string parameter. valueType is bool, int, float, str, list or dict (the last two are stored as JSON). """
+
+    def __init__(self, name, valueType, default, minimum=None, maximum=None, choices=None):
+        self.name = name
+        self.valueType = valueType
+        self.default = default
+        self.minimum = minimum
+        self.maximum = maximum
+        self.choices = choices
+        self.validate(default)
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def validate(self, value):
+        """ Raise ValueError if value is not acceptable. """
+        if self.valueType is float and isinstance(value, int) and not isinstance(value, bool):
+            value = float(value)
+        if not isinstance(value, self.valueType):
+            raise ValueError(f"{self.name}: expected {self.valueType.__name__}, got {value!r}")
+        if self.minimum is not None and value < self.minimum:
+            raise ValueError(f"{self.name}: {value} is below {self.minimum}")
+        if self.maximum is not None and value > self.maximum:
+            raise ValueError(f"{self.name}: {value} is above {self.maximum}")
+        if self.choices is not None and value not in self.choices:
+            raise ValueError(f"{self.name}: {value!r} is not one of {self.choices}")
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def serialize(self, value):
+        if self.valueType is bool:
+            return "True" if value else "False"
+        if self.valueType in (list, dict):
+            return json.dumps(value, separators=(",", ":"))
+        return str(self.valueType(value))
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def parse(self, text):
+        """ Typed value of a stored string. Empty or invalid strings give the default (invalid ones are logged). """
+        if not text:
+            return self.default
+        try:
+            if self.valueType is bool:
+                value = text in ("True", "true", "1")
+            elif self.valueType in (list, dict):
+                value = json.loads(text)
+            else:
+                value = self.valueType(text)
+            self.validate(value)
+            return value
+        except ValueError as e:
+            logger.warning("Invalid parameter value %r, using default %r: %s", text, self.default, e)
+            return self.default
+
+
+'''=================================================================================================================='''
+#
+# ParameterSchema
+#
+class ParameterSchema:
+    """ Parameters of one module, plus the node reference roles it uses (for tools that walk all module state). """
+
+    def __init__(self, parameters, references=()):
+        self.parameters = {parameter.name: parameter for parameter in parameters}
+        self.references = tuple(references)
+        self._cache = {}  # parameter node ID -> {name: (stored string, parsed value)}
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def setDefaultParameters(self, parameterNode):
+        """ Write the default of every parameter that is not set yet, in one modification. """
+        wasModified = parameterNode.StartModify()
+        for name, parameter in self.parameters.items():
+            if not parameterNode.GetParameter(name):
+                parameterNode.SetParameter(name, parameter.serialize(parameter.default))
+        parameterNode.EndModify(wasModified)
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def get(self, parameterNode, name):
+        """ Parsed value, cached until the stored string changes. JSON values are shared: do not mutate them. """
+        text = parameterNode.GetParameter(name)
+        values = self._cache.setdefault(parameterNode.GetID(), {})
+        cached = values.get(name)
+        if cached is None or cached[0] != text:
+            cached = values[name] = (text, self.parameters[name].parse(text))
+        return cached[1]
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def getAll(self, parameterNode):
+        return {name: self.get(parameterNode, name) for name in self.parameters}
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def set(self, parameterNode, name, value):
+        """ Validate and store a value. Raises ValueError for invalid values. """
+        parameter = self.parameters[name]
+        parameter.validate(value)
+        parameterNode.SetParameter(name, parameter.serialize(value))
+
+
+'''=================================================================================================================='''
+#
+# AppliedValues
+#
+class AppliedValues:
+    """ Last parameter values and node reference IDs applied to a module GUI. updateGUIFromParameterNode
+        asks it which of them changed, and only touches the widgets backed by those: setting a Qt widget, even to the
+        value it already shows, can repaint it and emit signals. Clear it whenever the GUI may be out of sync (new
+        parameter node, module re-entered). """
+
+    def __init__(self):
+        self._values = {}  # ("parameter" | "reference", name) -> value
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def clear(self):
+        self._values.clear()
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def _changed(self, key, value):
+        if key in self._values and self._values[key] == value:
+            return False
+        self._values[key] = value
+        return True
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def parameterChanged(self, schema, parameterNode, name):
+        """ True (and remembered as applied) if the parameter differs from the last applied value. """
+        return self._changed(("parameter", name), schema.get(parameterNode, name))
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def referenceChanged(self, parameterNode, role):
+        """ True (and remembered as applied) if the referenced node differs from the last applied one. """
+        return self._changed(("reference", role), parameterNode.GetNodeReferenceID(role))
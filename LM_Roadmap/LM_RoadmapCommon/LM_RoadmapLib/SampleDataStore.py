@@ -0,0 +1,276 @@
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import shutil
+import sys
+import tarfile
+import tempfile
+import zipfile
+
+from .Instrumentation import getLogger
+
+logger = getLogger(__name__)
+
+#
+# Local content-addressed store of sample datasets, for machines without network access.
+#
+# Files are stored under objects/<first 2 hex digits>/<sha256> and found by the SHA256 checksum that SampleData
+# sources already carry ("SHA256:<hex>"), or by file name for sources without checksum. installSampleDataStore hooks
+# the store into SampleData itself (SampleDataLogic.downloadFileIntoCache, through which SampleData.downloadSample and
+# the Sample Data module fetch every file): before a file is downloaded, the store places it in the SampleData cache
+# folder (hard link when possible), where SampleData finds it, verifies it and never goes to the network.
+#
+# Hashing memory-maps each file and feeds it to hashlib in chunks, so no chunk is copied into Python. One SHA256 stream
+# is inherently sequential, so parallelism is across files: hashlib releases the GIL on large updates, and a thread
+# pool verifies several files at disk speed.
+#
+
+HASH_CHUNK_BYTES = 8 * 1024 * 1024
+STORE_ENVIRONMENT_VARIABLE = "LM_ROADMAP_SAMPLE_DATA_STORE"
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def sha256OfFile(path, chunkBytes=HASH_CHUNK_BYTES):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:  # Empty files cannot be mapped
+            return digest.hexdigest()
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            view = memoryview(mapped)
+            try:
+                for offset in range(0, len(view), chunkBytes):
+                    digest.update(view[offset:offset + chunkBytes])
+            finally:
+                view.release()
+    return digest.hexdigest()
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def sha256OfFiles(paths, numberOfThreads=None):
+    """ {path: sha256} of several files, hashed in parallel. """
+    import concurrent.futures  # Not at module level: this package is imported by every module at startup
+    paths = list(paths)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=numberOfThreads or os.cpu_count() or 1) as pool:
+        return dict(zip(paths, pool.map(sha256OfFile, paths)))
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def parseChecksum(checksum):
+    """ Hex digest of a SampleData checksum string ("SHA256:<hex>"), None for other algorithms or no checksum. """
+    if not checksum:
+        return None
+    algorithm, _, value = checksum.partition(":")
+    return value.lower() if algorithm.upper() == "SHA256" and value else None
+
+
+'''=================================================================================================================='''
+#
+# SampleDataStore
+#
+class SampleDataStore:
+    """ Content-addressed file store with a file name index (index.json). """
+
+    def __init__(self, rootPath):
+        self.rootPath = rootPath
+        self._indexPath = os.path.join(rootPath, "index.json")
+        self._namesToDigests = {}
+        if os.path.exists(self._indexPath):
+            with open(self._indexPath) as f:
+                self._namesToDigests = json.load(f)
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def objectPath(self, digest):
+        return os.path.join(self.rootPath, "objects", digest[:2], digest)
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def contains(self, digest):
+        return bool(digest) and os.path.exists(self.objectPath(digest))
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def findByName(self, fileName):
+        digest = self._namesToDigests.get(fileName)
+        return digest if self.contains(digest) else None
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def _saveIndex(self):
+        os.makedirs(self.rootPath, exist_ok=True)
+        temporaryPath = self._indexPath + ".tmp"
+        with open(temporaryPath, "w") as f:
+            json.dump(self._namesToDigests, f, indent=1, sort_keys=True)
+        os.replace(temporaryPath, self._indexPath)
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def _addFile(self, path, digest, fileName, move=False):
+        """ Store one already hashed file. Returns True if its content was new. """
+        self._namesToDigests[fileName] = digest
+        objectPath = self.objectPath(digest)
+        if os.path.exists(objectPath):
+            return False
+        os.makedirs(os.path.dirname(objectPath), exist_ok=True)
+        temporaryPath = objectPath + ".tmp"  # Never expose a partially copied object
+        if move:
+            shutil.move(path, temporaryPath)
+        else:
+            shutil.copyfile(path, temporaryPath)
+        os.replace(temporaryPath, objectPath)
+        return True
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def seed(self, sourcePath, numberOfThreads=None):
+        """ Add every file of a directory (recursively) or of a .zip / .tar(.gz, .bz2, .xz) archive.
+            Files are indexed under their base name. Returns the number of new objects. """
+        with tempfile.TemporaryDirectory(dir=self._temporaryParent()) as extractedPath:
+            isArchive = os.path.isfile(sourcePath)
+            if isArchive:
+                self._extractArchive(sourcePath, extractedPath)
+                sourcePath = extractedPath
+            paths = [os.path.join(folder, name) for folder, _, names in os.walk(sourcePath) for name in sorted(names)]
+            digests = sha256OfFiles(paths, numberOfThreads)
+            added = sum(self._addFile(path, digests[path], os.path.basename(path), move=isArchive) for path in paths)
+        self._saveIndex()
+        return added
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def _temporaryParent(self):
+        """ Extract inside the store so that extracted files are moved, not copied, into it. """
+        os.makedirs(self.rootPath, exist_ok=True)
+        return self.rootPath
+
+    # ------------------------------------------------------------------------------------------------------------------
+    @staticmethod
+    def _extractArchive(archivePath, targetPath):
+        if zipfile.is_zipfile(archivePath):
+            with zipfile.ZipFile(archivePath) as archive:
+                members = [m for m in archive.infolist() if not m.is_dir()]
+                for member in members:  # Flatten: only base names are indexed, and this rules out path traversal
+                    with archive.open(member) as source, open(os.path.join(targetPath, os.path.basename(member.filename)), "wb") as target:
+                        shutil.copyfileobj(source, target, HASH_CHUNK_BYTES)
+        elif tarfile.is_tarfile(archivePath):
+            with tarfile.open(archivePath) as archive:
+                for member in archive:
+                    if member.isfile():
+                        with archive.extractfile(member) as source, open(os.path.join(targetPath, os.path.basename(member.name)), "wb") as target:
+                            shutil.copyfileobj(source, target, HASH_CHUNK_BYTES)
+        else:
+            raise ValueError(f"Unsupported archive: {archivePath}")
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def verify(self, numberOfThreads=None):
+        """ Re-hash every object in parallel. Corrupted objects are deleted; returns their digests. """
+        objectsPath = os.path.join(self.rootPath, "objects")
+        paths = [os.path.join(folder, name) for folder, _, names in os.walk(objectsPath) for name in names
+                 if not name.endswith(".tmp")]
+        corrupted = [os.path.basename(path) for path, digest in sha256OfFiles(paths, numberOfThreads).items()
+                     if digest != os.path.basename(path)]
+        for digest in corrupted:
+            os.remove(self.objectPath(digest))
+        return corrupted
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def materialize(self, digest, targetPath):
+        """ Make the object available at targetPath: hard link if possible (same volume), copy otherwise. """
+        os.makedirs(os.path.dirname(targetPath) or ".", exist_ok=True)
+        if os.path.exists(targetPath):
+            os.remove(targetPath)
+        try:
+            os.link(self.objectPath(digest), targetPath)
+        except OSError:
+            shutil.copyfile(self.objectPath(digest), targetPath)
+        return targetPath
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def provideFiles(self, files, targetFolder):
+        """ files: (fileName, checksum or None) pairs. Places every stored file in targetFolder, unless an identical
+            file is already there. Returns the file names that the store could not provide. """
+        missing = []
+        for fileName, checksum in files:
+            digest = parseChecksum(checksum) or self.findByName(fileName)
+            if not self.contains(digest):
+                missing.append(fileName)
+                continue
+            targetPath = os.path.join(targetFolder, fileName)
+            if os.path.exists(targetPath) and os.path.getsize(targetPath) == os.path.getsize(self.objectPath(digest)) \
+                    and sha256OfFile(targetPath) == digest:
+                continue
+            self.materialize(digest, targetPath)
+        return missing
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def getSampleDataStore(rootPath=None):
+    """ Store at rootPath, $LM_ROADMAP_SAMPLE_DATA_STORE, or by default in the Slicer cache folder. """
+    if rootPath is None:
+        rootPath = os.environ.get(STORE_ENVIRONMENT_VARIABLE)
+    if rootPath is None:
+        import slicer
+        rootPath = os.path.join(slicer.app.cachePath, "LM_Roadmap", "SampleDataStore")
+    return SampleDataStore(rootPath)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def resolveSampleData(sampleName, store=None):
+    """ Place the files of a registered SampleData sample in the SampleData cache folder, from the local store.
+        Returns the names of the files that still have to be downloaded. """
+    import slicer
+    import SampleData
+    source = SampleData.SampleDataLogic().sourceForSampleName(sampleName)
+    if source is None:
+        raise ValueError(f"Unknown sample: {sampleName}")
+    checksums = source.checksums or [None] * len(source.fileNames)
+    cacheFolder = slicer.mrmlScene.GetCacheManager().GetRemoteCacheDirectory()
+    return (store or getSampleDataStore()).provideFiles(zip(source.fileNames, checksums), cacheFolder)
+
+
+_installedStore = None  # Store used by the SampleData hook (None: getSampleDataStore() at each download)
+_originalDownloadFileIntoCache = None
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def _downloadFileIntoCacheFromStore(sampleDataLogic, uri, name, checksum=None):
+    """ SampleDataLogic.downloadFileIntoCache, the local store first. """
+    import slicer
+    cacheFolder = slicer.mrmlScene.GetCacheManager().GetRemoteCacheDirectory()
+    try:
+        (_installedStore or getSampleDataStore()).provideFiles([(name, checksum)], cacheFolder)
+    except OSError as e:  # The download still works without the store
+        logger.warning("Sample data store unavailable for %s: %s", name, e)
+    return _originalDownloadFileIntoCache(sampleDataLogic, uri, name, checksum)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def installSampleDataStore(store=None):
+    """ Make SampleData look in the local store (store, or getSampleDataStore() by default) before downloading any
+        file. SampleData is patched once per process; later calls only change the store. """
+    global _installedStore, _originalDownloadFileIntoCache
+    import SampleData
+    _installedStore = store
+    if _originalDownloadFileIntoCache is None:
+        _originalDownloadFileIntoCache = SampleData.SampleDataLogic.downloadFileIntoCache
+        SampleData.SampleDataLogic.downloadFileIntoCache = _downloadFileIntoCacheFromStore
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def main(argv=None):
+    """ Command line: python -m LM_RoadmapLib.SampleDataStore <store> seed <folder or archive> | verify """
+    parser = argparse.ArgumentParser(description="Manage the local LM_Roadmap sample data store.")
+    parser.add_argument("store", help=f"Store folder (the modules read ${STORE_ENVIRONMENT_VARIABLE})")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    seedParser = subparsers.add_parser("seed", help="Add the files of a folder or archive")
+    seedParser.add_argument("source")
+    subparsers.add_parser("verify", help="Re-hash every object, delete corrupted ones")
+    parser.add_argument("--threads", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    store = SampleDataStore(args.store)
+    if args.command == "seed":
+        print(json.dumps({"added": store.seed(args.source, args.threads)}))
+        return 0
+    corrupted = store.verify(args.threads)
+    print(json.dumps({"corrupted": corrupted}))
+    return 1 if corrupted else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,227 @@
+import weakref
+
+import vtk
+
+import slicer
+
+from .Instrumentation import timedCallback
+
+#
+# Incrementally maintained index of the MRML scene, shared by all LM_Roadmap modules.
+#
+# Every node is filed under its own class and all its vtkMRML superclasses when it is added, and removed again on
+# NodeRemovedEvent, so "first node of class X", "number of nodes of class X" are dict lookups instead of a scene scan.
+# Bulk data memory (image data, meshes) is kept as running per-class totals; a node whose data changes is only marked
+# dirty and re-measured on the next memory query, using VTK's own array sizes.
+#
+# Caches keyed on node IDs register a node removed callback, called with the ID of every node leaving the scene, one
+# by one or with a scene close, so that their entries do not outlive the nodes. Views showing counts register a node
+# added callback too, called with every node added to the scene after the index was built.
+#
+
+# Events signalling that the bulk data of a node was replaced or modified
+_DATA_MODIFIED_EVENTS = {
+    "vtkMRMLVolumeNode": "ImageDataModifiedEvent",
+    "vtkMRMLModelNode": "MeshModifiedEvent",
+}
+
+_sceneIndices = {}
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def getSceneIndex(scene=None):
+    """ Shared index of a scene (slicer.mrmlScene by default), built on first use. """
+    scene = scene or slicer.mrmlScene
+    key = scene.GetAddressAsString("vtkMRMLScene")
+    if key not in _sceneIndices:
+        _sceneIndices[key] = SceneIndex(scene)
+    return _sceneIndices[key]
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def nodeMemorySize(node):
+    """ Bytes held by the bulk data of a node (0 for nodes without image data or mesh). O(number of arrays). """
+    if node.IsA("vtkMRMLVolumeNode"):
+        data = node.GetImageData()
+    elif node.IsA("vtkMRMLModelNode"):
+        data = node.GetMesh()
+    else:
+        return 0
+    return int(data.GetActualMemorySize()) * 1024 if data else 0
+
+
+'''=================================================================================================================='''
+#
+# SceneIndex
+#
+class SceneIndex:
+    """ Per-class node lists (in insertion order), counts and memory totals of one scene. """
+
+    def __init__(self, scene):
+        self.scene = scene
+        self._nodesByClass = {}       # class name -> {node ID: node}, insertion ordered like the scene
+        self._classNamesByType = {}   # python type -> class names the node is filed under
+        self._memoryByID = {}         # node ID -> bytes, as last measured
+        self._memoryByClass = {}      # class name -> bytes
+        self._dirtyMemoryIDs = set()  # node IDs to re-measure on the next memory query
+        self._dataObservations = {}   # node ID -> (node, observer tag)
+        self._nodeAddedCallbacks = []    # Functions returning the callback, or None once its object was deleted
+        self._nodeRemovedCallbacks = []  # Same, for removed nodes
+        self._sceneObservations = [
+            scene.AddObserver(scene.NodeAddedEvent, self.onNodeAdded),
+            scene.AddObserver(scene.NodeRemovedEvent, self.onNodeRemoved),
+            scene.AddObserver(scene.EndCloseEvent, self.onSceneEndClose),
+        ]
+        self.rebuild()
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def rebuild(self):
+        """ Full scan, only needed once (and after a scene close, which removes nodes in bulk). """
+        for node, tag in self._dataObservations.values():
+            node.RemoveObserver(tag)
+        self._nodesByClass.clear()
+        self._memoryByID.clear()
+        self._memoryByClass.clear()
+        self._dirtyMemoryIDs.clear()
+        self._dataObservations.clear()
+        for index in range(self.scene.GetNumberOfNodes()):
+            self._addNode(self.scene.GetNthNode(index))
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def close(self):
+        """ Stop tracking the scene. """
+        for tag in self._sceneObservations:
+            self.scene.RemoveObserver(tag)
+        self._sceneObservations = []
+        for node, tag in self._dataObservations.values():
+            node.RemoveObserver(tag)
+        self._dataObservations.clear()
+        _sceneIndices.pop(self.scene.GetAddressAsString("vtkMRMLScene"), None)
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def _classNames(self, node):
+        nodeType = type(node)
+        classNames = self._classNamesByType.get(nodeType)
+        if classNames is None:
+            classNames = [c.__name__ for c in nodeType.__mro__ if c.__name__.startswith("vtkMRML")] or [node.GetClassName()]
+            self._classNamesByType[nodeType] = classNames
+        return classNames
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def _addNode(self, node):
+        nodeID = node.GetID()
+        for className in self._classNames(node):
+            self._nodesByClass.setdefault(className, {})[nodeID] = node
+        self._memoryByID[nodeID] = 0
+        self._dirtyMemoryIDs.add(nodeID)
+        for className, eventName in _DATA_MODIFIED_EVENTS.items():
+            if node.IsA(className):
+                tag = node.AddObserver(getattr(type(node), eventName), self.onNodeDataModified)
+                self._dataObservations[nodeID] = (node, tag)
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def _removeNode(self, node):
+        nodeID = node.GetID()
+        if nodeID not in self._memoryByID:
+            return
+        memory = self._memoryByID.pop(nodeID)
+        for className in self._classNames(node):
+            self._nodesByClass[className].pop(nodeID, None)
+            self._memoryByClass[className] = self._memoryByClass.get(className, 0) - memory
+        self._dirtyMemoryIDs.discard(nodeID)
+        observation = self._dataObservations.pop(nodeID, None)
+        if observation:
+            node.RemoveObserver(observation[1])
+        self._notifyNodesRemoved([nodeID])
+
+    # ------------------------------------------------------------------------------------------------------------------
+    @staticmethod
+    def _reference(callback):
+        """ Bound methods are held weakly: registering does not keep their object alive, and the callback is dropped
+            with it. """
+        if hasattr(callback, "__self__"):
+            return weakref.WeakMethod(callback)
+        return lambda: callback
+
+    # ------------------------------------------------------------------------------------------------------------------
+    @staticmethod
+    def _liveCallbacks(references):
+        """ Callbacks whose object is still alive; references to deleted objects are removed from the list. """
+        callbacks = [reference() for reference in references]
+        references[:] = [reference for reference, callback in zip(references, callbacks) if callback is not None]
+        return [callback for callback in callbacks if callback is not None]
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def addNodeAddedCallback(self, callback):
+        """ Call callback(node) for every node added to the scene, once it is indexed. """
+        self._nodeAddedCallbacks.append(self._reference(callback))
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def addNodeRemovedCallback(self, callback):
+        """ Call callback(nodeID) for every node leaving the scene, one by one or with a scene close. """
+        self._nodeRemovedCallbacks.append(self._reference(callback))
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def _notifyNodesRemoved(self, nodeIDs):
+        for callback in self._liveCallbacks(self._nodeRemovedCallbacks):
+            for nodeID in nodeIDs:
+                callback(nodeID)
+
+    # ------------------------------------------------------------------------------------------------------------------
+    @vtk.calldata_type(vtk.VTK_OBJECT)
+    @timedCallback
+    def onNodeAdded(self, caller, event, node):
+        self._addNode(node)
+        for callback in self._liveCallbacks(self._nodeAddedCallbacks):
+            callback(node)
+
+    # ------------------------------------------------------------------------------------------------------------------
+    @vtk.calldata_type(vtk.VTK_OBJECT)
+    @timedCallback
+    def onNodeRemoved(self, caller, event, node):
+        self._removeNode(node)
+
+    # ------------------------------------------------------------------------------------------------------------------
+    @timedCallback
+    def onSceneEndClose(self, caller, event):
+        nodeIDs = set(self._memoryByID)
+        self.rebuild()
+        self._notifyNodesRemoved(nodeIDs.difference(self._memoryByID))  # Nodes removed without NodeRemovedEvent
+
+    # ------------------------------------------------------------------------------------------------------------------
+    @timedCallback
+    def onNodeDataModified(self, node, event):
+        self._dirtyMemoryIDs.add(node.GetID())
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def getNodes(self, className="vtkMRMLNode", includeHidden=True):
+        """ Nodes of a class (or of its subclasses), in the order they were added. """
+        nodes = self._nodesByClass.get(className, {}).values()
+        return [node for node in nodes if includeHidden or not node.GetHideFromEditors()]
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def getFirstNode(self, className, includeHidden=True):
+        """ Like vtkMRMLScene.GetFirstNodeByClass, without the scene scan. Hidden nodes are skipped on request. """
+        for node in self._nodesByClass.get(className, {}).values():
+            if includeHidden or not node.GetHideFromEditors():
+                return node
+        return None
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def getCount(self, className="vtkMRMLNode"):
+        return len(self._nodesByClass.get(className, ()))
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def getMemory(self, className="vtkMRMLNode"):
+        """ Bytes of bulk data held by the nodes of a class. Only nodes modified since the last query are measured. """
+        for nodeID in self._dirtyMemoryIDs:
+            node = self._nodesByClass.get("vtkMRMLNode", {}).get(nodeID)
+            if node is None:
+                continue
+            memory = nodeMemorySize(node)
+            delta = memory - self._memoryByID[nodeID]
+            self._memoryByID[nodeID] = memory
+            for nodeClassName in self._classNames(node):
+                self._memoryByClass[nodeClassName] = self._memoryByClass.get(nodeClassName, 0) + delta
+        self._dirtyMemoryIDs.clear()
+        return self._memoryByClass.get(className, 0)
@@ -0,0 +1,102 @@
+import argparse
+import importlib.util
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from LM_RoadmapLib.StateSnapshot import MODULE_NAMES
+
+#
+# Startup cost of the LM_Roadmap modules.
+#
+# Application level:
+#
+#   Slicer --no-main-window --python-script <...>/LM_RoadmapLib/StartupTime.py --repeats 5 --output startup.json
+#
+# starts Slicer (the same launcher by default, --slicer otherwise) without main window and exiting after startup,
+# alternately with and without the LM_Roadmap modules (--modules-to-ignore), and reports the median durations and
+# their difference: what the extension adds to startup.
+#
+# Module level, from the Slicer Python console: measureModuleImports() executes each module file as Slicer does at
+# startup and reports its duration and the modules it imported, to find which import made startup slower.
+#
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def measureModuleImport(filePath):
+    """ Duration of executing a module file in a fresh namespace, and the modules it imported (not already loaded). """
+    loadedBefore = set(sys.modules)
+    spec = importlib.util.spec_from_file_location(f"_StartupTime_{os.path.basename(filePath)[:-3]}", filePath)
+    module = importlib.util.module_from_spec(spec)
+    start = time.perf_counter()
+    spec.loader.exec_module(module)
+    seconds = time.perf_counter() - start
+    return {"file": filePath, "seconds": seconds, "importedModules": sorted(set(sys.modules) - loadedBefore)}
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def measureModuleImports(moduleNames=MODULE_NAMES):
+    """ measureModuleImport of the files of loaded modules. Must run in Slicer. """
+    import slicer
+    return [measureModuleImport(getattr(slicer.modules, moduleName.lower()).path) for moduleName in moduleNames]
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def measureApplicationStartup(slicerExecutable, repeats=5, ignoredModules=()):
+    """ Durations (seconds) of starting the application without main window and exiting after startup. """
+    command = [slicerExecutable, "--no-splash", "--no-main-window", "--exit-after-startup"]
+    if ignoredModules:
+        command += ["--modules-to-ignore", ",".join(ignoredModules)]
+    durations = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def compareApplicationStartup(slicerExecutable, repeats=5, moduleNames=MODULE_NAMES):
+    """ Startup durations with and without the modules, interleaved so that disk caches favour neither. """
+    measureApplicationStartup(slicerExecutable, 1)  # Warm-up: the first start reads everything from disk
+    withModules, withoutModules = [], []
+    for _ in range(repeats):
+        withModules += measureApplicationStartup(slicerExecutable, 1)
+        withoutModules += measureApplicationStartup(slicerExecutable, 1, moduleNames)
+    return {
+        "modules": list(moduleNames),
+        "withModules": withModules,
+        "withoutModules": withoutModules,
+        "medianWithModules": statistics.median(withModules),
+        "medianWithoutModules": statistics.median(withoutModules),
+        "moduleCost": statistics.median(withModules) - statistics.median(withoutModules),
+    }
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure what the LM_Roadmap modules add to Slicer startup.")
+    parser.add_argument("--slicer", help="Slicer launcher to measure (this one by default)")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--output", help="JSON file receiving the measurements (printed otherwise)")
+    options = parser.parse_args(argv)
+
+    import slicer
+    report = compareApplicationStartup(options.slicer or slicer.app.launcherExecutableFilePath, options.repeats)
+    text = json.dumps(report, indent=1)
+    if options.output:
+        with open(options.output, "w") as f:
+            f.write(text)
+    else:
+        print(text)
+    print(f"Startup: {report['medianWithModules']:.2f} s with the LM_Roadmap modules, "
+          f"{report['medianWithoutModules']:.2f} s without ({1e3 * report['moduleCost']:+.0f} ms)", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    import slicer
+    slicer.util.exit(main(sys.argv[1:]))
@@ -0,0 +1,180 @@
+import json
+import struct
+
+from .LazyImport import lazyImport
+
+np = lazyImport("numpy")
+
+#
+# Save / restore of the LM_Roadmap module states, without saving or loading the scene.
+#
+# A snapshot holds the singleton parameter node of every module: its string parameters, and its node references as
+# (ID, name, class) so that they can be resolved in the same scene by ID in constant time, or in a reloaded scene by
+# name and class. Parameters holding JSON arrays of numbers (stored landmark positions...) are written as raw arrays
+# instead of text. The cost of a snapshot depends on the module states only, never on the size of the scene.
+#
+# Loading restores the saved state, it does not merge into the current one: parameters missing from the snapshot are
+# unset, and reference roles that were empty when saving (recorded as null, from the node and the module's
+# ParameterSchema references) or not recorded at all are cleared.
+#
+# Layout: magic (8 bytes), version (uint32), header length (uint32), JSON header, padding to 8 bytes, array data.
+# Array offsets in the header are relative to the start of the array data, and 8-byte aligned.
+#
+
+MODULE_NAMES = ("FiducialGenerator", "InputNodeInspector", "LiveLandmarkMonitor", "PersistentGuiState",
+                "SurfaceMeasurementTool")
+SNAPSHOT_MAGIC = b"LMRSNAP\0"
+SNAPSHOT_VERSION = 1
+_PREFIX = struct.Struct("<8sII")
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def getModuleParameterNode(moduleName, scene=None, create=False):
+    """ Singleton parameter node of a module, as ScriptedLoadableModuleLogic.getParameterNode finds or creates it. """
+    import slicer
+    scene = scene or slicer.mrmlScene
+    parameterNode = scene.GetSingletonNode(moduleName, "vtkMRMLScriptedModuleNode")
+    if parameterNode or not create:
+        return parameterNode
+    parameterNode = scene.CreateNodeByClass("vtkMRMLScriptedModuleNode")
+    parameterNode.UnRegister(None)
+    parameterNode.SetSingletonTag(moduleName)
+    parameterNode.SetName(scene.GenerateUniqueName(moduleName))
+    parameterNode.SetAttribute("ModuleName", moduleName)
+    return scene.AddNode(parameterNode)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def getModuleParameterSchema(moduleName):
+    """ ParameterSchema declared by the logic class of a module (None if the module cannot be imported). """
+    import importlib
+    try:
+        module = importlib.import_module(moduleName)
+    except ImportError:
+        return None
+    logicClass = getattr(module, f"{moduleName}Logic", None)
+    return getattr(logicClass, "parameterSchema", None)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def _numericArray(text):
+    """ Array of a parameter holding a JSON array of numbers (or of equal length number lists), None otherwise. """
+    if not text.startswith("["):
+        return None
+    try:
+        value = json.loads(text)
+        array = np.array(value)
+    except ValueError:
+        return None
+    if array.size == 0 or array.dtype.kind not in "if":
+        return None
+    return array
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def saveStateSnapshot(path, moduleNames=MODULE_NAMES, scene=None):
+    """ Write the parameter nodes of the modules to path. Modules without parameter node are skipped.
+        Returns the names of the saved modules. """
+    header = {"modules": {}}
+    arrays = []
+    dataLength = 0
+    for moduleName in moduleNames:
+        parameterNode = getModuleParameterNode(moduleName, scene)
+        if parameterNode is None:
+            continue
+        moduleState = header["modules"][moduleName] = {"parameters": {}, "arrays": {}, "references": {}}
+
+        # 1. Parameters, numeric JSON arrays as raw arrays
+        for name in parameterNode.GetParameterNames():
+            text = parameterNode.GetParameter(name)
+            array = _numericArray(text)
+            if array is None:
+                moduleState["parameters"][name] = text
+                continue
+            array = np.ascontiguousarray(array)
+            moduleState["arrays"][name] = {"dtype": array.dtype.str, "shape": list(array.shape), "offset": dataLength}
+            arrays.append(array)
+            dataLength += (array.nbytes + 7) // 8 * 8
+
+        # 2. Node references, empty roles as None
+        schema = getModuleParameterSchema(moduleName)
+        roles = [parameterNode.GetNthNodeReferenceRole(index)
+                 for index in range(parameterNode.GetNumberOfNodeReferenceRoles())]
+        for role in roles + [role for role in (schema.references if schema else ()) if role not in roles]:
+            node = parameterNode.GetNodeReference(role)
+            moduleState["references"][role] = (
+                {"id": node.GetID(), "name": node.GetName(), "class": node.GetClassName()} if node else None)
+
+    headerBytes = json.dumps(header, separators=(",", ":")).encode("utf-8")
+    with open(path, "wb") as f:
+        f.write(_PREFIX.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, len(headerBytes)))
+        f.write(headerBytes)
+        f.write(b"\0" * (-(_PREFIX.size + len(headerBytes)) % 8))
+        for array in arrays:
+            f.write(array.tobytes())
+            f.write(b"\0" * (-array.nbytes % 8))
+    return list(header["modules"])
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def readStateSnapshot(path):
+    """ (header, {(moduleName, parameterName): array}) of a snapshot file. Arrays are views of the file content. """
+    with open(path, "rb") as f:
+        content = f.read()
+    magic, version, headerLength = _PREFIX.unpack_from(content)
+    if magic != SNAPSHOT_MAGIC:
+        raise ValueError(f"Not an LM_Roadmap state snapshot: {path}")
+    if version > SNAPSHOT_VERSION:
+        raise ValueError(f"Snapshot version {version} is newer than supported version {SNAPSHOT_VERSION}: {path}")
+    headerEnd = _PREFIX.size + headerLength
+    header = json.loads(content[_PREFIX.size:headerEnd].decode("utf-8"))
+    dataStart = headerEnd + (-headerEnd % 8)
+    arrays = {}
+    for moduleName, moduleState in header["modules"].items():
+        for name, description in moduleState["arrays"].items():
+            dtype = np.dtype(description["dtype"])
+            count = int(np.prod(description["shape"]))
+            arrays[(moduleName, name)] = np.frombuffer(content, dtype, count, dataStart + description["offset"]).reshape(description["shape"])
+    return header, arrays
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def _resolveReference(scene, reference):
+    """ Same node if its ID still designates it, otherwise the first node of the same name and class. """
+    node = scene.GetNodeByID(reference["id"])
+    if node is not None and node.GetName() == reference["name"] and node.IsA(reference["class"]):
+        return node
+    nodes = scene.GetNodesByClassByName(reference["class"], reference["name"])
+    return nodes.GetItemAsObject(0) if nodes.GetNumberOfItems() else None
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def loadStateSnapshot(path, scene=None):
+    """ Restore the parameter nodes saved in path (created if missing), one modification per node, so each module
+        GUI updates once. Parameters and references that are not in the snapshot are unset.
+        Returns the references that could not be resolved, as (moduleName, role) pairs. """
+    import slicer
+    scene = scene or slicer.mrmlScene
+    header, arrays = readStateSnapshot(path)
+    unresolved = []
+    for moduleName, moduleState in header["modules"].items():
+        parameterNode = getModuleParameterNode(moduleName, scene, create=True)
+        wasModified = parameterNode.StartModify()
+        for name in parameterNode.GetParameterNames():
+            if name not in moduleState["parameters"] and name not in moduleState["arrays"]:
+                parameterNode.UnsetParameter(name)
+        for index in reversed(range(parameterNode.GetNumberOfNodeReferenceRoles())):
+            role = parameterNode.GetNthNodeReferenceRole(index)
+            if role not in moduleState["references"]:
+                parameterNode.RemoveNodeReferenceIDs(role)
+        for name, text in moduleState["parameters"].items():
+            parameterNode.SetParameter(name, text)
+        for name in moduleState["arrays"]:
+            parameterNode.SetParameter(name, json.dumps(arrays[(moduleName, name)].tolist(), separators=(",", ":")))
+        for role, reference in moduleState["references"].items():
+            node = _resolveReference(scene, reference) if reference else None
+            if reference and node is None:
+                unresolved.append((moduleName, role))
+            parameterNode.SetNodeReferenceID(role, node.GetID() if node else None)
+        parameterNode.EndModify(wasModified)
+    return unresolved
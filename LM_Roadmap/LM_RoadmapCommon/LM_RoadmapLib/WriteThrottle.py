@@ -0,0 +1,92 @@
+import time
+
+#
+# Rate limiting of GUI -> parameter node writes during continuous interactions (slider drags).
+#
+# Every write to a parameter node fires ModifiedEvent and a full GUI update, so writing on every valueChanged tick of a
+# dragged slider costs hundreds of round trips per drag. During an interaction the throttle lets at most one write
+# through per minimumInterval and keeps the latest value pending; the pending value is written by flush() (called from
+# a timer by the widget) and always when the interaction ends. With commitOnRelease nothing is written until the end.
+# Outside interactions (keyboard, programmatic changes) every request is written immediately.
+#
+
+DEFAULT_MINIMUM_WRITE_INTERVAL = 0.05  # Seconds, i.e. at most 20 writes per second while dragging
+
+
+'''=================================================================================================================='''
+#
+# WriteThrottle
+#
+class WriteThrottle:
+    """ Calls write() for requests, at a capped rate during interactions. Counts committed and suppressed requests:
+        a request is suppressed when a later request replaces it before it was written. """
+
+    def __init__(self, write, minimumInterval=DEFAULT_MINIMUM_WRITE_INTERVAL, commitOnRelease=False,
+                 clock=time.monotonic):
+        self.write = write
+        self.minimumInterval = minimumInterval
+        self.commitOnRelease = commitOnRelease
+        self.enabled = True
+        self.clock = clock
+        self.interacting = False
+        self.pending = False
+        self._lastWriteTime = None
+        self.resetCounters()
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def resetCounters(self):
+        self.committedWrites = 0
+        self.suppressedWrites = 0
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def getCounters(self):
+        return {"committed": self.committedWrites, "suppressed": self.suppressedWrites}
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def beginInteraction(self):
+        self.interacting = True
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def endInteraction(self):
+        """ The final value is always committed. """
+        self.interacting = False
+        self.flush()
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def request(self):
+        """ A new value is available. Returns True if it is left pending (the caller should schedule a flush()
+            after timeUntilNextWrite()). """
+        if self.pending:
+            self.suppressedWrites += 1  # The pending value is replaced before being written
+        self.pending = True
+        if not self.enabled or not self.interacting:
+            self.flush()
+            return False
+        if not self.commitOnRelease and self.timeUntilNextWrite() == 0.0:
+            self.flush()
+            return False
+        return True
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def timeUntilNextWrite(self):
+        if self._lastWriteTime is None:
+            return 0.0
+        return max(0.0, self._lastWriteTime + self.minimumInterval - self.clock())
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def flush(self):
+        """ Write the pending value, if any. """
+        if not self.pending:
+            return
+        self.pending = False
+        self._lastWriteTime = self.clock()
+        self.committedWrites += 1
+        self.write()
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def flushDue(self):
+        """ Timer callback: write the pending value once the interval has elapsed (never with commitOnRelease).
+            Returns True if a value is still pending. """
+        if self.pending and not self.commitOnRelease and self.timeUntilNextWrite() == 0.0:
+            self.flush()
+        return self.pending and not self.commitOnRelease
@@ -0,0 +1,38 @@
+from .Instrumentation import (
+    dumpCallbackStatistics,
+    getCallbackStatistics,
+    getLogger,
+    resetCallbackStatistics,
+    setCallbackTimingEnabled,
+    setLogLevel,
+    showInstrumentationPanel,
+    timedCallback,
+)
+from .LandmarkArrays import (
+    LANDMARK_ARRAY_EXTENSIONS,
+    exportMarkupsArrays,
+    importMarkupsArrays,
+    readLandmarkArrays,
+    readLandmarkLabel,
+    writeLandmarkArrays,
+)
+from .LazyImport import lazyImport
+from .ParameterSchema import AppliedValues, Parameter, ParameterSchema
+from .SampleDataStore import (
+    SampleDataStore,
+    getSampleDataStore,
+    installSampleDataStore,
+    resolveSampleData,
+    sha256OfFile,
+    sha256OfFiles,
+)
+from .SceneIndex import SceneIndex, getSceneIndex, nodeMemorySize
+from .StateSnapshot import (
+    MODULE_NAMES,
+    getModuleParameterNode,
+    getModuleParameterSchema,
+    loadStateSnapshot,
+    readStateSnapshot,
+    saveStateSnapshot,
+)
+from .WriteThrottle import WriteThrottle
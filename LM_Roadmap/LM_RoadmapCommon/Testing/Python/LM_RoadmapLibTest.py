@@ -0,0 +1,188 @@
+import os
+
+import vtk
+
+import slicer
+from slicer.ScriptedLoadableModule import *
+
+from LM_RoadmapLib import getLogger
+
+logger = getLogger(__name__)
+
+#
+# Tests of the tools of the shared LM_RoadmapLib package that belong to no single module: benchmarks, event storms,
+# batch runner and landmark arrays. Registered as a ctest, can also be run from the Slicer Python console:
+#   exec(open(<...>/LM_RoadmapLibTest.py).read()); LM_RoadmapLibTest().runTest()
+#
+
+'''=================================================================================================================='''
+'''=================================================================================================================='''
+#
+# LM_RoadmapLibTest
+#
+class LM_RoadmapLibTest(ScriptedLoadableModuleTest):
+
+    def setUp(self):
+        slicer.mrmlScene.Clear()
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def runTest(self):
+        self.setUp()
+        self.test_LM_RoadmapLib_Benchmarks()
+        self.test_LM_RoadmapLib_EventStorms()
+        self.test_LM_RoadmapLib_BatchRunner()
+        self.test_LM_RoadmapLib_LandmarkArrays()
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def test_LM_RoadmapLib_Benchmarks(self):
+        self.delayDisplay("Starting the benchmarks test")
+
+        from LM_RoadmapLib import Benchmarks
+
+        # 1. Smallest case of every benchmark
+        options = Benchmarks.createArgumentParser().parse_args(
+            ["--repeats", "2", "--max-sphere-resolution", "16", "--max-fiducial-nodes", "10", "--max-points", "10",
+             "--max-volume-mb", "16"])
+        report = Benchmarks.runBenchmarks(options)
+        names = {result["benchmark"] for result in report["results"]}
+        self.assertIn("SurfaceMeasurementTool.getSurfaceArea", names)
+        self.assertIn("LiveLandmarkMonitor.resetLandmarks", names)
+        self.assertIn("InputNodeInspector.getScalarRange", names)
+        self.assertTrue(all(len(result["seconds"]) == 2 for result in report["results"]))
+        self.assertEqual(len(slicer.util.getNodesByClass("vtkMRMLScalarVolumeNode")), 0)  # Synthetic inputs are removed
+
+        # 2. Regressions: a case twice slower than its baseline
+        slower = {"results": [dict(result, median=2 * result["median"] + 1e-3) for result in report["results"]]}
+        self.assertEqual(len(Benchmarks.compareResults(report, slower)), len(report["results"]))
+        self.assertEqual(Benchmarks.compareResults(report, report), [])
+
+        self.delayDisplay('Test passed')
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def test_LM_RoadmapLib_EventStorms(self):
+        self.delayDisplay("Starting the event storms test")
+
+        from LM_RoadmapLib import EventStorms
+
+        # 1. Small storm of every kind
+        options = EventStorms.createArgumentParser().parse_args(["--events", "50", "--volume-mb", "1", "--nodes", "2"])
+        report = EventStorms.runStorms(options)
+        storms = {storm["storm"]: storm for storm in report["storms"]}
+        self.assertEqual(len(storms), 3)
+
+        # 2. Every moved point reaches the monitor, and every blocked period is part of the total
+        callbacks = storms["LiveLandmarkMonitor.PointModifiedEvent"]["callbackStatistics"]
+        self.assertGreaterEqual(callbacks["LiveLandmarkMonitor.LiveLandmarkMonitorWidget.updateGUIFromMRML"]["calls"], 50)
+        for storm in storms.values():
+            self.assertGreater(storm["callbacks"], 0)
+            self.assertLessEqual(storm["worstStallMs"], storm["blockedMs"])
+
+        # 3. Every value of the drag previewed the visible planes and went through the write throttle
+        drag = storms["PersistentGuiState.SliderDrag"]
+        self.assertEqual(drag["valueChanges"], 50)
+        self.assertEqual(drag["previewPlaneUpdates"], 50)
+        sliderWrites = drag["sliderWrites"]
+        self.assertGreater(sliderWrites["committed"], 0)
+        self.assertEqual(sliderWrites["committed"] + sliderWrites["suppressed"], 50)
+
+        self.delayDisplay('Test passed')
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def test_LM_RoadmapLib_BatchRunner(self):
+        self.delayDisplay("Starting the batch runner test")
+
+        import json
+        from LM_RoadmapLib import BatchRunner
+
+        # 1. Manifest: generate two landmark sets, align one on the other, measure a sphere
+        folder = os.path.join(slicer.app.temporaryPath, "LM_RoadmapLibBatch")
+        os.makedirs(folder, exist_ok=True)
+        sphere = vtk.vtkSphereSource()
+        sphere.SetRadius(10.0)
+        sphere.Update()
+        writer = vtk.vtkPolyDataWriter()
+        writer.SetInputData(sphere.GetOutput())
+        writer.SetFileName(os.path.join(folder, "sphere.vtk"))
+        writer.Write()
+        manifestPath = os.path.join(folder, "manifest.json")
+        with open(manifestPath, "w") as f:
+            json.dump({"jobs": [
+                {"id": "fixed", "type": "generateFiducials", "output": "fixed.mrk.json"},
+                {"id": "moving", "type": "generateFiducials", "output": "moving.mrk.json"},
+                {"id": "reset", "type": "resetLandmarks", "input": "moving.mrk.json", "positionsFile": "fixed.mrk.json",
+                 "output": "reset.mrk.json"},
+                {"id": "align", "type": "alignLandmarks", "moving": "reset.mrk.json", "fixed": "fixed.mrk.json"},
+                {"id": "sphere", "type": "measureSurface", "input": "sphere.vtk"},
+                {"id": "unknown", "type": "unknownJob"},
+            ]}, f)
+        outputPath = os.path.join(folder, "results.jsonl")
+        if os.path.exists(outputPath):
+            os.remove(outputPath)
+
+        # 2. In this process: every job reported, inputs removed from the scene
+        numberOfNodes = slicer.mrmlScene.GetNumberOfNodes()
+        summary = BatchRunner.runManifest(manifestPath, outputPath, numberOfWorkers=0)
+        self.assertEqual((summary["written"], summary["errors"]), (6, 1))
+        self.assertEqual(slicer.mrmlScene.GetNumberOfNodes(), numberOfNodes)
+        with open(outputPath) as f:
+            rows = {row["id"]: row for row in map(json.loads, f)}
+        self.assertAlmostEqual(rows["align"]["result"]["rms"], 0.0, places=3)  # Reset to the fixed positions
+        self.assertAlmostEqual(rows["sphere"]["result"]["area"], 4 * 3.14159 * 100, delta=200)  # Coarse tessellation
+
+        # 3. A second run only retries the failed job
+        summary = BatchRunner.runManifest(manifestPath, outputPath, numberOfWorkers=0)
+        self.assertEqual((summary["written"], summary["skipped"]), (1, 5))
+
+        self.delayDisplay('Test passed')
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def test_LM_RoadmapLib_LandmarkArrays(self):
+        self.delayDisplay("Starting the landmark arrays test")
+
+        import time
+        import numpy as np
+        from LM_RoadmapLib import exportMarkupsArrays, importMarkupsArrays, readLandmarkLabel
+
+        # 1. Small node with labels: every format round-trips positions, .npz and .lmb labels too
+        node = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLMarkupsFiducialNode")
+        slicer.util.updateMarkupsControlPointsFromArray(node, np.random.default_rng(1).uniform(-50, 50, (5, 3)))
+        node.SetNthControlPointLabel(2, "Nasion é")
+        positions = slicer.util.arrayFromMarkupsControlPoints(node)
+        labels = [node.GetNthControlPointLabel(index) for index in range(node.GetNumberOfControlPoints())]
+        folder = os.path.join(slicer.app.temporaryPath, "LM_RoadmapLibArrays")
+        os.makedirs(folder, exist_ok=True)
+        for extension in (".npy", ".npz", ".lmb"):
+            path = os.path.join(folder, "points" + extension)
+            self.assertEqual(exportMarkupsArrays(node, path), len(positions))
+            imported = importMarkupsArrays(path)
+            np.testing.assert_allclose(slicer.util.arrayFromMarkupsControlPoints(imported), positions)
+            if extension != ".npy":
+                self.assertEqual([imported.GetNthControlPointLabel(index) for index in range(len(labels))], labels)
+        self.assertEqual(readLandmarkLabel(os.path.join(folder, "points.lmb"), 2), "Nasion é")
+
+        # 2. One million points, positions only, in a few seconds at most (about one second expected)
+        bigNode = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLMarkupsFiducialNode")
+        bigPositions = np.random.default_rng(0).uniform(-100, 100, (1000000, 3))
+        slicer.util.updateMarkupsControlPointsFromArray(bigNode, bigPositions)
+        path = os.path.join(folder, "big.lmb")
+        start = time.perf_counter()
+        exportMarkupsArrays(bigNode, path, labels=False)
+        importMarkupsArrays(path, bigNode)
+        seconds = time.perf_counter() - start
+        np.testing.assert_allclose(slicer.util.arrayFromMarkupsControlPoints(bigNode), bigPositions)
+        self.assertLess(seconds, 10.0)
+        logger.info("1M control points exported and imported in %.2f s", seconds)
+
+        # 3. The same million points with labels, set and read one point at a time: within a minute
+        path = os.path.join(folder, "bigLabels.lmb")
+        bigNode.SetNthControlPointLabel(500000, "Middle é")
+        bigLabels = [bigNode.GetNthControlPointLabel(index) for index in (0, 500000, 999999)]
+        start = time.perf_counter()
+        exportMarkupsArrays(bigNode, path)
+        labelledNode = importMarkupsArrays(path)
+        seconds = time.perf_counter() - start
+        self.assertEqual([labelledNode.GetNthControlPointLabel(index) for index in (0, 500000, 999999)], bigLabels)
+        self.assertLess(seconds, 60.0)
+        logger.info("1M labelled control points exported and imported in %.2f s", seconds)
+
+        self.delayDisplay('Test passed')
@@ -1,7 +1,6 @@
 import logging
 import os
 import random
-import json
 
 import vtk
 
@@ -9,6 +8,19 @@ import slicer, qt
 from slicer.ScriptedLoadableModule import *
 from slicer.util import VTKObservationMixin
 
+from LM_RoadmapLib import (
+    AppliedValues,
+    Parameter,
+    ParameterSchema,
+    getLogger,
+    getSceneIndex,
+    lazyImport,
+    timedCallback,
+)
+
+logger = getLogger(__name__)
+np = lazyImport("numpy")
+
 '''=================================================================================================================='''
 '''=================================================================================================================='''
 #
@@ -26,7 +38,7 @@ class LiveLandmarkMonitor(ScriptedLoadableModule):
         self.parent.helpText = """This module demonstrates real-time MRML observation by monitoring the number of points in a fiducial node. """
         self.parent.acknowledgementText = 'Learning Roadmap Project 5. \nPart of the LM_Roadmap extension.'
 
-        print("LiveLandmarkMonitor(ScriptedLoadableModule):    __init__(self, parent)")
+        logger.debug("LiveLandmarkMonitor(ScriptedLoadableModule):    __init__(self, parent)")
 
 '''=================================================================================================================='''
 '''=================================================================================================================='''
@@ -42,12 +54,13 @@ class LiveLandmarkMonitorWidget(ScriptedLoadableModuleWidget, VTKObservationMixi
         self.logic = None
         self._parameterNode = None # SingleTon initialized through self.setParameterNode(self.logic.getParameterNode())
         self._updatingGUIFromParameterNode = False
+        self._appliedValues = AppliedValues()  # What the GUI already shows, to only touch widgets whose value changed
         self._observedNode = None # Local reference to the node being observed
-        print("**Widget.__init__(self, parent)")
+        logger.debug("**Widget.__init__(self, parent)")
 
     # ------------------------------------------------------------------------------------------------------------------
     def setup(self):
-        print("**Widget.setup(self), \tLM_Roadmap")
+        logger.debug("**Widget.setup(self), \tLM_Roadmap")
 
         """    00. Called when the user opens the module the first time and the widget is initialized. """
         ScriptedLoadableModuleWidget.setup(self)
@@ -80,19 +93,19 @@ class LiveLandmarkMonitorWidget(ScriptedLoadableModuleWidget, VTKObservationMixi
     # ------------------------------------------------------------------------------------------------------------------
     def cleanup(self):
         """    Called when the application closes and the module widget is destroyed.    """
-        print("**Widget.cleanup(self)")
+        logger.debug("**Widget.cleanup(self)")
         self.removeObservers()
 
     # ------------------------------------------------------------------------------------------------------------------
     def enter(self):
         """    Called each time the user opens this module.    """
-        print("\n**Widget.enter(self)")
+        logger.debug("\n**Widget.enter(self)")
         self.initializeParameterNode()
 
     # ------------------------------------------------------------------------------------------------------------------
     def exit(self):
         """    Called each time the user opens a different module.    """
-        print("**Widget.exit(self)")
+        logger.debug("**Widget.exit(self)")
         # Slicer. Do not react to parameter node changes (GUI will be updated when the user enters into the module)
         if self._parameterNode:
             self.removeObserver(self._parameterNode, vtk.vtkCommand.ModifiedEvent, self.updateGUIFromParameterNode)
@@ -102,7 +115,7 @@ class LiveLandmarkMonitorWidget(ScriptedLoadableModuleWidget, VTKObservationMixi
 
     # ------------------------------------------------------------------------------------------------------------------
     def removeMarkupsObservers(self, node):
-        print(f"\tRemoving observers from: {node.GetName()}")
+        logger.debug("\tRemoving observers from: %s", node.GetName())
         self.removeObserver(node, slicer.vtkMRMLMarkupsNode.PointModifiedEvent, self.updateGUIFromMRML)
         self.removeObserver(node, slicer.vtkMRMLMarkupsNode.PointAddedEvent, self.updateGUIFromMRML)
         self.removeObserver(node, slicer.vtkMRMLMarkupsNode.PointRemovedEvent, self.updateGUIFromMRML)
@@ -110,7 +123,7 @@ class LiveLandmarkMonitorWidget(ScriptedLoadableModuleWidget, VTKObservationMixi
 
     # ------------------------------------------------------------------------------------------------------------------
     def addMarkupsObservers(self, node):
-        print(f"\tAdding observers to: {node.GetName()}")
+        logger.debug("\tAdding observers to: %s", node.GetName())
         # Observe specific markup events for point count/movement
         self.addObserver(node, slicer.vtkMRMLMarkupsNode.PointModifiedEvent, self.updateGUIFromMRML)
         self.addObserver(node, slicer.vtkMRMLMarkupsNode.PointAddedEvent, self.updateGUIFromMRML)
@@ -119,28 +132,36 @@ class LiveLandmarkMonitorWidget(ScriptedLoadableModuleWidget, VTKObservationMixi
         self.addObserver(node, vtk.vtkCommand.ModifiedEvent, self.updateGUIFromMRML)
 
     # ------------------------------------------------------------------------------------------------------------------
+    @timedCallback
     def onSceneStartClose(self, caller, event):
         """    Called just before the scene is closed.    """
-        print("**Widget.onSceneStartClose(self, caller, event)")
+        logger.debug("**Widget.onSceneStartClose(self, caller, event)")
         self.setParameterNode(None)
 
     # ------------------------------------------------------------------------------------------------------------------
+    @timedCallback
     def onSceneEndClose(self, caller, event):
         """     Called just after the scene is closed.    """
-        print("**Widget.onSceneEndClose(self, caller, event)")
+        logger.debug("**Widget.onSceneEndClose(self, caller, event)")
         if self.parent.isEntered:
             self.initializeParameterNode()
 
     # ------------------------------------------------------------------------------------------------------------------
     def initializeParameterNode(self):
         """    Ensure parameter node exists and observed. """
-        print("\t**Widget.initializeParameterNode(self), \t LM_Roadmap")
+        logger.debug("\t**Widget.initializeParameterNode(self), \t LM_Roadmap")
         self.setParameterNode(self.logic.getParameterNode())
 
+        # Select default input nodes if nothing is selected yet to save a few clicks for the user
+        if not self._parameterNode.GetNodeReference("SelectedFiducial"):
+            firstFiducialNode = getSceneIndex().getFirstNode("vtkMRMLMarkupsFiducialNode", includeHidden=False)
+            if firstFiducialNode:
+                self._parameterNode.SetNodeReferenceID("SelectedFiducial", firstFiducialNode.GetID())
+
     # ------------------------------------------------------------------------------------------------------------------
     def setParameterNode(self, inputParameterNode):
         """    Set and observe the SingleTon ParameterNode. """
-        print("\t\t**Widget.setParameterNode(self, inputParameterNode)")
+        logger.debug("\t\t**Widget.setParameterNode(self, inputParameterNode)")
         if inputParameterNode:
             if not inputParameterNode.IsSingleton():
                 raise ValueError(f'LM_Roadmap Alert! \tinputParameterNode is not a singleton!')
@@ -155,10 +176,12 @@ class LiveLandmarkMonitorWidget(ScriptedLoadableModuleWidget, VTKObservationMixi
         if self._parameterNode is not None:
             self.addObserver(self._parameterNode, vtk.vtkCommand.ModifiedEvent, self.updateGUIFromParameterNode)
         
-        # 03. Initial GUI update
+        # 03. Initial GUI update, of every widget
+        self._appliedValues.clear()
         self.updateGUIFromParameterNode()
 
     # ------------------------------------------------------------------------------------------------------------------
+    @timedCallback
     def updateGUIFromParameterNode(self, caller=None, event=None):
         """   Update GUI from ParameterNode. Includes node observation management. """
         if self._parameterNode is None or self._updatingGUIFromParameterNode:
@@ -167,7 +190,7 @@ class LiveLandmarkMonitorWidget(ScriptedLoadableModuleWidget, VTKObservationMixi
         # I. Open-Brace: Prevent infinite loops
         self._updatingGUIFromParameterNode = True
         
-        print("**Widget.updateGUIFromParameterNode(self, caller=None, event=None), \tLM_Roadmap")
+        logger.debug("**Widget.updateGUIFromParameterNode(self, caller=None, event=None), \tLM_Roadmap")
         
         # II. Handle Node Selection Observation
         currentFiducial = self._parameterNode.GetNodeReference("SelectedFiducial")
@@ -182,19 +205,20 @@ class LiveLandmarkMonitorWidget(ScriptedLoadableModuleWidget, VTKObservationMixi
             if self._observedNode:
                 self.addMarkupsObservers(self._observedNode)
 
-        # III. Sync GUI widgets
-        self.ui.fiducialSelector.setCurrentNode(self._observedNode)
-        
-        # IV. Trigger info update (handles button enabled states and checkbox sync)
-        self.updateGUIFromMRML()
+        # III. Sync GUI widgets, and trigger info update (handles button enabled states and checkbox sync), if the
+        #      selection changed. Stored positions are not shown, writing them must not refresh the panel.
+        if self._appliedValues.referenceChanged(self._parameterNode, "SelectedFiducial"):
+            self.ui.fiducialSelector.setCurrentNode(self._observedNode)
+            self.updateGUIFromMRML()
 
         # V. Close-Brace
         self._updatingGUIFromParameterNode = False
 
     # ------------------------------------------------------------------------------------------------------------------
+    @timedCallback
     def updateParameterNodeFromGUI(self, caller=None, event=None):
         """ Save GUI selection into ParameterNode. """
-        print(f"**Widget.updateParameterNodeFromGUI(self, caller=None, event=None),     \t LM_Roadmap")
+        logger.debug("**Widget.updateParameterNodeFromGUI(self, caller=None, event=None),     \t LM_Roadmap")
         if self._parameterNode is None or self._updatingGUIFromParameterNode:
             return
 
@@ -208,12 +232,13 @@ class LiveLandmarkMonitorWidget(ScriptedLoadableModuleWidget, VTKObservationMixi
         self._parameterNode.EndModify(wasModified)
 
     # ------------------------------------------------------------------------------------------------------------------
+    @timedCallback
     def updateGUIFromMRML(self, caller=None, event=None):
         """ Update UI elements based on the observed node state. """
         '''if self._updatingGUIFromParameterNode:
             return'''
             
-        print("\t**Widget.updateGUIFromMRML(self)")
+        logger.debug("\t**Widget.updateGUIFromMRML(self)")
         
         # 1. Handle Selection Availability
         enabled = self._observedNode is not None
@@ -243,7 +268,7 @@ class LiveLandmarkMonitorWidget(ScriptedLoadableModuleWidget, VTKObservationMixi
         """ Level 6 interaction control. """
         if not self._observedNode:
             return
-        print(f"**Widget.onEditModeToggle(checked={checked})")
+        logger.debug("**Widget.onEditModeToggle(checked=%s)", checked)
         # checked = movable = not locked
         self.logic.setFiducialLocked(self._observedNode, not checked)
 
@@ -252,7 +277,7 @@ class LiveLandmarkMonitorWidget(ScriptedLoadableModuleWidget, VTKObservationMixi
         """ Level 7 logic. """
         if not self._observedNode:
             return
-        print("**Widget.onAutoGenerateButton()")
+        logger.debug("**Widget.onAutoGenerateButton()")
         
         with slicer.util.tryWithErrorDisplay("Failed to auto-generate landmarks.", waitCursor=True):
             # 1. Generate points via logic
@@ -260,8 +285,10 @@ class LiveLandmarkMonitorWidget(ScriptedLoadableModuleWidget, VTKObservationMixi
             
             # 2. Store positions in ParameterNode for Reset functionality
             if self._parameterNode:
-                self._parameterNode.SetParameter("StoredPositions", json.dumps(positions))
-                self._parameterNode.SetParameter("HasAutoGenerated", "1")
+                wasModified = self._parameterNode.StartModify()
+                self.logic.parameterSchema.set(self._parameterNode, "StoredPositions", positions)
+                self.logic.parameterSchema.set(self._parameterNode, "HasAutoGenerated", True)
+                self._parameterNode.EndModify(wasModified)
             
             # 3. Enable edit mode automatically
             self.ui.editModeCheckBox.checked = True
@@ -271,15 +298,14 @@ class LiveLandmarkMonitorWidget(ScriptedLoadableModuleWidget, VTKObservationMixi
         """ Level 7 reset logic. """
         if not self._observedNode or not self._parameterNode:
             return
-        print("**Widget.onResetButton()")
+        logger.debug("**Widget.onResetButton()")
         
-        storedPositionsStr = self._parameterNode.GetParameter("StoredPositions")
-        if not storedPositionsStr:
+        positions = self.logic.parameterSchema.get(self._parameterNode, "StoredPositions")
+        if not positions:
             slicer.util.messageBox("No auto-generated positions stored to reset to.")
             return
 
         with slicer.util.tryWithErrorDisplay("Failed to reset landmarks.", waitCursor=True):
-            positions = json.loads(storedPositionsStr)
             self.logic.resetLandmarks(self._observedNode, positions)
 
 '''=================================================================================================================='''
@@ -289,15 +315,21 @@ class LiveLandmarkMonitorWidget(ScriptedLoadableModuleWidget, VTKObservationMixi
 #
 class LiveLandmarkMonitorLogic(ScriptedLoadableModuleLogic):
 
+    # Typed parameters of the SingleTon ParameterNode
+    parameterSchema = ParameterSchema([
+        Parameter("StoredPositions", list, []),
+        Parameter("HasAutoGenerated", bool, False),
+    ], references=("SelectedFiducial",))
+
     def __init__(self):
         ScriptedLoadableModuleLogic.__init__(self)
-        print("**Logic.__init__(self)")
+        logger.debug("**Logic.__init__(self)")
 
     # ------------------------------------------------------------------------------------------------------------------
     def setDefaultParameters(self, parameterNode):
         """    Initialize parameter node with defaults if empty.    """
-        print("\t\t\t**Logic.setDefaultParameters(self, parameterNode), \tLM_Roadmap");
-        pass
+        logger.debug("\t\t\t**Logic.setDefaultParameters(self, parameterNode), \tLM_Roadmap");
+        self.parameterSchema.setDefaultParameters(parameterNode)
 
     # ------------------------------------------------------------------------------------------------------------------
     def setFiducialLocked(self, node, locked):
@@ -346,6 +378,36 @@ class LiveLandmarkMonitorLogic(ScriptedLoadableModuleLogic):
             
         node.EndModify(wasModified)
 
+    # ------------------------------------------------------------------------------------------------------------------
+    def stackLandmarkSets(self, sources):
+        """ (subjects, points, 3) RAS positions of fiducial nodes and / or markups files (read without loading them),
+            which must all have the same number of points. """
+        from LiveLandmarkMonitorLib import readMarkupsPositions, stackLandmarkSets
+        landmarkSets, names = [], []
+        for source in sources:
+            if isinstance(source, str):
+                landmarkSets.append(readMarkupsPositions(source))
+                names.append(os.path.basename(source))
+            else:
+                landmarkSets.append(slicer.util.arrayFromMarkupsControlPoints(source, world=True))
+                names.append(source.GetName())
+        return stackLandmarkSets(landmarkSets, names)
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def alignLandmarkSets(self, sources, scaling=True):
+        """ Generalized Procrustes alignment of fiducial nodes / markups files to their mean shape.
+            Returns mean shape, aligned sets, per-subject Procrustes distances and transforms (see generalizedProcrustes). """
+        from LiveLandmarkMonitorLib import generalizedProcrustes
+        logger.debug("\t\t\t**Logic.alignLandmarkSets(self, %d sets)", len(sources))
+        return generalizedProcrustes(self.stackLandmarkSets(sources), scaling=scaling)
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def createLandmarksNode(self, positions, name="MeanShape"):
+        """ New fiducial node holding positions (mean shape, aligned set...), added in one modification. """
+        node = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLMarkupsFiducialNode", slicer.mrmlScene.GenerateUniqueName(name))
+        slicer.util.updateMarkupsControlPointsFromArray(node, np.asarray(positions))
+        return node
+
 '''=================================================================================================================='''
 '''=================================================================================================================='''
 #
@@ -360,6 +422,7 @@ class LiveLandmarkMonitorTest(ScriptedLoadableModuleTest):
     def runTest(self):
         self.setUp()
         self.test_LiveLandmarkMonitor_HybridWorkflow()
+        self.test_LiveLandmarkMonitor_Procrustes()
 
     # ------------------------------------------------------------------------------------------------------------------
     def test_LiveLandmarkMonitor_HybridWorkflow(self):
@@ -385,3 +448,46 @@ class LiveLandmarkMonitorTest(ScriptedLoadableModuleTest):
         self.assertAlmostEqual(restoredPos[0], positions[0][0])
         
         self.delayDisplay('Test passed')
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def test_LiveLandmarkMonitor_Procrustes(self):
+        self.delayDisplay("Starting the Procrustes test")
+
+        from LiveLandmarkMonitorLib import generalizedProcrustes, optimalRotations
+
+        # 1. Copies of one shape, rotated, scaled and moved, with a little noise
+        rng = np.random.default_rng(0)
+        shape = rng.normal(size=(12, 3)) * 20
+        rotations = optimalRotations(rng.normal(size=(20, 12, 3)), shape)  # Arbitrary proper rotations
+        landmarkSets = rng.uniform(0.5, 2, (20, 1, 1)) * (shape @ rotations) + rng.normal(size=(20, 1, 3)) * 50
+        landmarkSets += rng.normal(size=landmarkSets.shape) * 0.01
+
+        # 2. Aligned from nodes and files alike: the mean is the shape, up to position, size and rotation
+        logic = LiveLandmarkMonitorLogic()
+        nodes = [logic.createLandmarksNode(positions, "Subject") for positions in landmarkSets[:10]]
+        files = []
+        for index, positions in enumerate(landmarkSets[10:]):
+            node = logic.createLandmarksNode(positions, "Subject")
+            files.append(os.path.join(slicer.app.temporaryPath, f"LiveLandmarkMonitorSubject{index}.mrk.json"))
+            slicer.util.saveNode(node, files[-1])
+            slicer.mrmlScene.RemoveNode(node)
+        result = logic.alignLandmarkSets(nodes + files)
+        self.assertTrue(result["converged"])
+        self.assertEqual(result["aligned"].shape, (20, 12, 3))
+        self.assertLess(result["distances"].max(), 1e-2)
+        centeredShape = shape - shape.mean(axis=0)
+        centeredShape /= np.linalg.norm(centeredShape)
+        self.assertLess(np.abs(centeredShape @ optimalRotations(centeredShape[np.newaxis], result["mean"])[0] - result["mean"]).max(), 1e-3)
+
+        # 3. Mismatching point counts are refused
+        nodes[0].RemoveNthControlPoint(0)
+        with self.assertRaises(ValueError):
+            logic.alignLandmarkSets(nodes)
+
+        # 4. Vectorized: 1000 subjects x 500 landmarks in seconds
+        import time
+        start = time.perf_counter()
+        generalizedProcrustes(rng.normal(size=(1000, 500, 3)))
+        self.assertLess(time.perf_counter() - start, 10.0)
+
+        self.delayDisplay('Test passed')
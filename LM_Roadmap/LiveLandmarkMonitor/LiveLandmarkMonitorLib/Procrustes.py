@@ -0,0 +1,124 @@
+import csv
+import json
+import os
+
+import numpy as np
+
+#
+# Generalized Procrustes analysis (GPA) of landmark sets stacked as one (subjects x points x 3) array.
+#
+# Every step works on the whole stack at once: centering and centroid sizes are reductions over the points axis, the
+# 3x3 cross-covariance of every subject with the mean is one einsum, and the optimal rotations come from one batched
+# SVD of all the 3x3 matrices. Rotations are recomputed from the centered (and scaled) input at each iteration rather
+# than accumulated, so rounding errors do not build up. 1000 subjects x 500 landmarks are aligned in a fraction of a
+# second; the mean shape usually converges in a few iterations.
+#
+# Conventions: positions in RAS millimeters; a rotation R acts on row vectors, aligned = (input - centroid) / size @ R.
+#
+
+DEFAULT_TOLERANCE = 1e-10  # Convergence: squared change of the mean shape (unit centroid size with scaling)
+DEFAULT_MAXIMUM_ITERATIONS = 100
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def optimalRotations(shapes, target):
+    """ (n, 3, 3) proper rotations R minimizing ||shapes[i] @ R - target|| (Kabsch), reflections excluded. """
+    covariances = np.einsum("nki,kj->nij", shapes, target)
+    u, _, vt = np.linalg.svd(covariances)
+    reflections = np.linalg.det(u @ vt) < 0
+    u[reflections, :, -1] *= -1
+    return u @ vt
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def generalizedProcrustes(shapes, scaling=True, tolerance=DEFAULT_TOLERANCE, maximumIterations=DEFAULT_MAXIMUM_ITERATIONS):
+    """ Align (n, k, 3) landmark sets to their common mean shape. With scaling, every set is scaled to unit centroid
+        size and the mean shape too (partial Procrustes superimposition).
+        Returns a dict: mean (k, 3), aligned (n, k, 3), distances (n,) between each aligned set and the mean,
+        centroids (n, 3), sizes (n,) (centroid sizes, ones without scaling), rotations (n, 3, 3), iterations, converged. """
+    shapes = np.asarray(shapes, dtype=np.float64)
+    if shapes.ndim != 3 or shapes.shape[2] != 3:
+        raise ValueError(f"Landmark sets must be stacked as (subjects, points, 3), not {shapes.shape}")
+    if shapes.shape[0] < 2 or shapes.shape[1] < 3:
+        raise ValueError("Procrustes analysis needs at least 2 landmark sets of 3 points")
+
+    # 1. Remove position (and size)
+    centroids = shapes.mean(axis=1)
+    centered = shapes - centroids[:, np.newaxis, :]
+    sizes = np.sqrt(np.einsum("nki,nki->n", centered, centered))
+    if scaling:
+        if np.any(sizes == 0):
+            raise ValueError("A landmark set has all its points at the same position")
+        centered /= sizes[:, np.newaxis, np.newaxis]
+    else:
+        sizes = np.ones_like(sizes)
+
+    # 2. Rotate all sets onto the mean, until the mean stops changing. The first set is the initial reference.
+    mean = centered[0]
+    converged = False
+    for iteration in range(1, maximumIterations + 1):
+        rotations = optimalRotations(centered, mean)
+        aligned = centered @ rotations
+        newMean = aligned.mean(axis=0)
+        if scaling:
+            newMean /= np.linalg.norm(newMean)
+        change = np.sum((newMean - mean) ** 2)
+        mean = newMean
+        if change < tolerance:
+            converged = True
+            break
+
+    # 3. Final alignment on the converged mean
+    rotations = optimalRotations(centered, mean)
+    aligned = centered @ rotations
+    distances = np.sqrt(np.sum((aligned - mean) ** 2, axis=(1, 2)))
+    return {"mean": mean, "aligned": aligned, "distances": distances, "centroids": centroids, "sizes": sizes,
+            "rotations": rotations, "iterations": iteration, "converged": converged}
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def readMarkupsPositions(path):
+    """ (k, 3) RAS control point positions of a markups file (.mrk.json or .fcsv), read without loading a node. """
+    if path.lower().endswith(".fcsv"):
+        return _readFcsvPositions(path)
+    with open(path) as f:
+        markups = json.load(f)["markups"][0]
+    positions = np.array([point["position"] for point in markups.get("controlPoints", [])], dtype=np.float64).reshape(-1, 3)
+    if markups.get("coordinateSystem", "LPS") == "LPS":
+        positions[:, :2] *= -1
+    return positions
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def _readFcsvPositions(path):
+    isLps = False
+    positions = []
+    with open(path, newline="") as f:
+        for row in csv.reader(f):
+            if not row:
+                continue
+            if row[0].startswith("#"):
+                if "CoordinateSystem" in row[0]:
+                    isLps = row[0].split("=")[-1].strip() in ("LPS", "1")
+                continue
+            positions.append([float(value) for value in row[1:4]])
+    positions = np.array(positions, dtype=np.float64).reshape(-1, 3)
+    if isLps:
+        positions[:, :2] *= -1
+    return positions
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def stackLandmarkSets(landmarkSets, names=None):
+    """ (n, k, 3) array of landmark sets with the same number of points. names identify the sets in errors. """
+    landmarkSets = [np.asarray(positions, dtype=np.float64).reshape(-1, 3) for positions in landmarkSets]
+    if len({len(positions) for positions in landmarkSets}) > 1:
+        counts = {name: len(positions) for name, positions in zip(names or range(len(landmarkSets)), landmarkSets)}
+        raise ValueError(f"Landmark sets must have the same number of points: {counts}")
+    return np.stack(landmarkSets)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def stackLandmarkFiles(paths):
+    """ (n, k, 3) positions of markups files with the same number of points. """
+    return stackLandmarkSets([readMarkupsPositions(path) for path in paths], [os.path.basename(path) for path in paths])
@@ -0,0 +1,7 @@
+from .Procrustes import (
+    generalizedProcrustes,
+    optimalRotations,
+    readMarkupsPositions,
+    stackLandmarkFiles,
+    stackLandmarkSets,
+)
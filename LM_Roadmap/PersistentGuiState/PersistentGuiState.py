@@ -7,6 +7,20 @@ import slicer, qt
 from slicer.ScriptedLoadableModule import *
 from slicer.util import VTKObservationMixin
 
+from LM_RoadmapLib import (
+    AppliedValues,
+    Parameter,
+    ParameterSchema,
+    WriteThrottle,
+    getLogger,
+    loadStateSnapshot,
+    saveStateSnapshot,
+    showInstrumentationPanel,
+    timedCallback,
+)
+
+logger = getLogger(__name__)
+
 '''=================================================================================================================='''
 '''=================================================================================================================='''
 #
@@ -21,10 +35,11 @@ class PersistentGuiState(ScriptedLoadableModule):
         self.parent.dependencies = []  # TODO: add here list of module names that this module requires
         self.parent.contributors = ["Alex (Student)"]
         # TODO: update with short description of the module and a link to online module documentation
-        self.parent.helpText = """This module shows how to synchronize GUI state with a Singleton ParameterNode for persistence. """
+        self.parent.helpText = """This module shows how to synchronize GUI state with a Singleton ParameterNode for persistence.
+The threshold and invert values drive a live binary mask preview of a scalar volume. """
         self.parent.acknowledgementText = 'Learning Roadmap Project 1. \nThis module is part of the LM_Roadmap extension.'
 
-        print("PersistentGuiState(ScriptedLoadableModule):    __init__(self, parent)")
+        logger.debug("PersistentGuiState(ScriptedLoadableModule):    __init__(self, parent)")
 
 '''=================================================================================================================='''
 '''=================================================================================================================='''
@@ -40,11 +55,17 @@ class PersistentGuiStateWidget(ScriptedLoadableModuleWidget, VTKObservationMixin
         self.logic = None
         self._parameterNode = None # SingleTon initialized through self.setParameterNode(self.logic.getParameterNode())
         self._updatingGUIFromParameterNode = False
-        print("**Widget.__init__(self, parent)")
+        self._appliedValues = AppliedValues()  # What the GUI already shows, to only touch widgets whose value changed
+        self.sliderWriteThrottle = None  # Rate limits slider -> ParameterNode writes while dragging, counts them
+        self._sliderWriteTimer = None
+        self._previewTimer = None  # Polls the background full-volume preview update
+        self._fullPreviewKey = None  # (volume ID, labelmap ID, threshold, invert) of the last full preview update
+        self._shownVolumeID = None  # Volume last shown in the slice views, layers are only reassigned when it changes
+        logger.debug("**Widget.__init__(self, parent)")
 
     # ------------------------------------------------------------------------------------------------------------------
     def setup(self):
-        print("**Widget.setup(self), \tLM_Roadmap")
+        logger.debug("**Widget.setup(self), \tLM_Roadmap")
 
         """    00. Called when the user opens the module the first time and the widget is initialized. """
         ScriptedLoadableModuleWidget.setup(self)
@@ -65,9 +86,25 @@ class PersistentGuiStateWidget(ScriptedLoadableModuleWidget, VTKObservationMixin
         self.addObserver(slicer.mrmlScene, slicer.mrmlScene.EndCloseEvent, self.onSceneEndClose)
 
         # 05. LM_Roadmap. Connect Signal-Slot to ensure sync.
-        #     We connect GUI signals to updateParameterNodeFromGUI.
-        self.ui.imageThresholdSliderWidget.valueChanged.connect(self.updateParameterNodeFromGUI)
+        #     We connect GUI signals to updateParameterNodeFromGUI. Slider ticks go through the write throttle.
+        self.sliderWriteThrottle = WriteThrottle(self.updateParameterNodeFromGUI)
+        self._sliderWriteTimer = qt.QTimer()
+        self._sliderWriteTimer.setSingleShot(True)
+        self._sliderWriteTimer.timeout.connect(self.onSliderWriteTimer)
+        self._previewTimer = qt.QTimer()
+        self._previewTimer.setSingleShot(True)
+        self._previewTimer.setInterval(50)
+        self._previewTimer.timeout.connect(self.onPreviewTimer)
+        self.ui.inputVolumeSelector.currentNodeChanged.connect(self.updateParameterNodeFromGUI)
+        self.ui.imageThresholdSliderWidget.valueChanged.connect(self.onThresholdSliderValueChanged)
+        self.ui.imageThresholdSliderWidget.sliderPressed.connect(self.onThresholdSliderPressed)
+        self.ui.imageThresholdSliderWidget.sliderReleased.connect(self.onThresholdSliderReleased)
         self.ui.invertOutputCheckBox.toggled.connect(self.updateParameterNodeFromGUI)
+        self.ui.throttleSliderWritesCheckBox.toggled.connect(self.updateParameterNodeFromGUI)
+        self.ui.commitOnReleaseCheckBox.toggled.connect(self.updateParameterNodeFromGUI)
+        self.ui.saveSnapshotButton.clicked.connect(self.onSaveSnapshotButton)
+        self.ui.loadSnapshotButton.clicked.connect(self.onLoadSnapshotButton)
+        self.ui.callbackStatisticsButton.clicked.connect(lambda: showInstrumentationPanel())
         self.ui.statusLabel.text = "Current State: Initializing..."
 
         # 06. Needed for programmer-friendly  Module-Reload
@@ -77,46 +114,54 @@ class PersistentGuiStateWidget(ScriptedLoadableModuleWidget, VTKObservationMixin
     # ------------------------------------------------------------------------------------------------------------------
     def cleanup(self):
         """    Called when the application closes and the module widget is destroyed.    """
-        print("**Widget.cleanup(self)")
+        logger.debug("**Widget.cleanup(self)")
+        if self._sliderWriteTimer:
+            self._sliderWriteTimer.stop()
+            self._previewTimer.stop()
+        if self.logic:
+            self.logic.backgroundThreshold.shutdown()
         self.removeObservers()
 
     # ------------------------------------------------------------------------------------------------------------------
     def enter(self):
         """    Called each time the user opens this module.    """
-        print("\n**Widget.enter(self)")
+        logger.debug("\n**Widget.enter(self)")
         self.initializeParameterNode()
 
     # ------------------------------------------------------------------------------------------------------------------
     def exit(self):
         """    Called each time the user opens a different module.    """
-        print("**Widget.exit(self)")
+        logger.debug("**Widget.exit(self)")
         # Slicer. Do not react to parameter node changes (GUI will be updated when the user enters into the module)
         if self._parameterNode:
             self.removeObserver(self._parameterNode, vtk.vtkCommand.ModifiedEvent, self.updateGUIFromParameterNode)
 
     # ------------------------------------------------------------------------------------------------------------------
+    @timedCallback
     def onSceneStartClose(self, caller, event):
         """    Called just before the scene is closed.    """
-        print("**Widget.onSceneStartClose(self, caller, event)")
+        logger.debug("**Widget.onSceneStartClose(self, caller, event)")
+        self.logic.backgroundThreshold.cancel(wait=True)  # The preview labelmap is about to be deleted
         self.setParameterNode(None)
 
     # ------------------------------------------------------------------------------------------------------------------
+    @timedCallback
     def onSceneEndClose(self, caller, event):
         """     Called just after the scene is closed.    """
-        print("**Widget.onSceneEndClose(self, caller, event)")
+        logger.debug("**Widget.onSceneEndClose(self, caller, event)")
         if self.parent.isEntered:
             self.initializeParameterNode()
 
     # ------------------------------------------------------------------------------------------------------------------
     def initializeParameterNode(self):
         """    Ensure parameter node exists and observed. """
-        print("\t**Widget.initializeParameterNode(self), \t LM_Roadmap")
+        logger.debug("\t**Widget.initializeParameterNode(self), \t LM_Roadmap")
         self.setParameterNode(self.logic.getParameterNode())
 
     # ------------------------------------------------------------------------------------------------------------------
     def setParameterNode(self, inputParameterNode):
         """    Set and observe the SingleTon ParameterNode. """
-        print("\t\t**Widget.setParameterNode(self, inputParameterNode)")
+        logger.debug("\t\t**Widget.setParameterNode(self, inputParameterNode)")
         if inputParameterNode:
             if not inputParameterNode.IsSingleton():
                 raise ValueError(f'LM_Roadmap Alert! \tinputParameterNode is not a singleton!')
@@ -127,14 +172,20 @@ class PersistentGuiStateWidget(ScriptedLoadableModuleWidget, VTKObservationMixin
             self.removeObserver(self._parameterNode, vtk.vtkCommand.ModifiedEvent, self.updateGUIFromParameterNode)
         
         # 02. Set new SingleTon ParameterNode and add observer
+        #     Re-entering the module sets the same node again: the slice views and the preview are kept as they are
+        if inputParameterNode is not self._parameterNode:
+            self._fullPreviewKey = None
+            self._shownVolumeID = None
         self._parameterNode = inputParameterNode
         if self._parameterNode is not None:
             self.addObserver(self._parameterNode, vtk.vtkCommand.ModifiedEvent, self.updateGUIFromParameterNode)
         
-        # 03. Initial GUI update
+        # 03. Initial GUI update, of every widget
+        self._appliedValues.clear()
         self.updateGUIFromParameterNode()
 
     # ------------------------------------------------------------------------------------------------------------------
+    @timedCallback
     def updateGUIFromParameterNode(self, caller=None, event=None):
         """   Update GUI from ParameterNode. """
         if self._parameterNode is None or self._updatingGUIFromParameterNode:
@@ -143,27 +194,46 @@ class PersistentGuiStateWidget(ScriptedLoadableModuleWidget, VTKObservationMixin
         # I. Open-Brace: Prevent infinite loops
         self._updatingGUIFromParameterNode = True
         
-        print("**Widget.updateGUIFromParameterNode(self, caller=None, event=None), \tLM_Roadmap")
-        
-        # II. Pull values from ParameterNode and update UI
-        thresholdValue = self._parameterNode.GetParameter("ThresholdValue")
-        if thresholdValue:
-            self.ui.imageThresholdSliderWidget.value = float(thresholdValue)
+        logger.debug("**Widget.updateGUIFromParameterNode(self, caller=None, event=None), \tLM_Roadmap")
         
-        invertValue = self._parameterNode.GetParameter("InvertValue")
-        if invertValue:
-            self.ui.invertOutputCheckBox.checked = (invertValue == "True")
-
-        # III. Update status label
-        self.ui.statusLabel.text = f"Current Values: Slider={self.ui.imageThresholdSliderWidget.value}, Invert={self.ui.invertOutputCheckBox.checked}"
-
-        # IV. Close-Brace
+        # II. Pull typed values from ParameterNode (parsed once per modification), update only the widgets they changed
+        #     The slider is not moved while the user drags it: the stored value lags behind by design.
+        schema = self.logic.parameterSchema
+        applied = self._appliedValues
+        volumeChanged = applied.referenceChanged(self._parameterNode, "InputVolume")
+        if volumeChanged:
+            self.ui.inputVolumeSelector.setCurrentNode(self._parameterNode.GetNodeReference("InputVolume"))
+        thresholdChanged = not self.ui.imageThresholdSliderWidget.isSliderDown() and applied.parameterChanged(schema, self._parameterNode, "ThresholdValue")
+        if thresholdChanged:
+            self.ui.imageThresholdSliderWidget.value = schema.get(self._parameterNode, "ThresholdValue")
+        invertChanged = applied.parameterChanged(schema, self._parameterNode, "InvertValue")
+        if invertChanged:
+            self.ui.invertOutputCheckBox.checked = schema.get(self._parameterNode, "InvertValue")
+        if applied.parameterChanged(schema, self._parameterNode, "ThrottleSliderWrites"):
+            self.ui.throttleSliderWritesCheckBox.checked = schema.get(self._parameterNode, "ThrottleSliderWrites")
+            self.ui.commitOnReleaseCheckBox.enabled = self.ui.throttleSliderWritesCheckBox.checked
+            self.sliderWriteThrottle.enabled = self.ui.throttleSliderWritesCheckBox.checked
+        if applied.parameterChanged(schema, self._parameterNode, "CommitOnRelease"):
+            self.ui.commitOnReleaseCheckBox.checked = schema.get(self._parameterNode, "CommitOnRelease")
+            self.sliderWriteThrottle.commitOnRelease = self.ui.commitOnReleaseCheckBox.checked
+
+        # III. Update status labels
+        if thresholdChanged or invertChanged:
+            self.ui.statusLabel.text = f"Current Values: Slider={self.ui.imageThresholdSliderWidget.value}, Invert={self.ui.invertOutputCheckBox.checked}"
+        self.updateWriteCountersLabel()
+
+        # IV. Full mask preview (in the background) of the stored values
+        if volumeChanged or thresholdChanged or invertChanged:
+            self.updatePreview()
+
+        # V. Close-Brace
         self._updatingGUIFromParameterNode = False
 
     # ------------------------------------------------------------------------------------------------------------------
+    @timedCallback
     def updateParameterNodeFromGUI(self, caller=None, event=None):
         """ Save GUI changes into ParameterNode. """
-        print(f"**Widget.updateParameterNodeFromGUI(self, caller=None, event=None),     \t LM_Roadmap")
+        logger.debug("**Widget.updateParameterNodeFromGUI(self, caller=None, event=None),     \t LM_Roadmap")
         if self._parameterNode is None or self._updatingGUIFromParameterNode:
             return
 
@@ -171,12 +241,122 @@ class PersistentGuiStateWidget(ScriptedLoadableModuleWidget, VTKObservationMixin
         wasModified = self._parameterNode.StartModify()
 
         # II. Update facts
-        self._parameterNode.SetParameter("ThresholdValue", str(self.ui.imageThresholdSliderWidget.value))
-        self._parameterNode.SetParameter("InvertValue", "True" if self.ui.invertOutputCheckBox.checked else "False")
+        self._parameterNode.SetNodeReferenceID("InputVolume", self.ui.inputVolumeSelector.currentNodeID)
+        schema = self.logic.parameterSchema
+        schema.set(self._parameterNode, "ThresholdValue", float(self.ui.imageThresholdSliderWidget.value))
+        schema.set(self._parameterNode, "InvertValue", bool(self.ui.invertOutputCheckBox.checked))
+        schema.set(self._parameterNode, "ThrottleSliderWrites", bool(self.ui.throttleSliderWritesCheckBox.checked))
+        schema.set(self._parameterNode, "CommitOnRelease", bool(self.ui.commitOnReleaseCheckBox.checked))
 
         # III. End batch modification
         self._parameterNode.EndModify(wasModified)
 
+    # ------------------------------------------------------------------------------------------------------------------
+    @timedCallback
+    def onThresholdSliderValueChanged(self, value):
+        """ Slider tick: written now, or left pending for the timer / the release. """
+        if self._parameterNode is None or self._updatingGUIFromParameterNode:
+            return
+        if self.sliderWriteThrottle.request() and not self._sliderWriteTimer.isActive():
+            self._sliderWriteTimer.start(int(1000 * self.sliderWriteThrottle.timeUntilNextWrite()))
+        if self.ui.imageThresholdSliderWidget.isSliderDown():
+            self.updatePreview(visiblePlanesOnly=True)
+
+    # ------------------------------------------------------------------------------------------------------------------
+    @timedCallback
+    def onSliderWriteTimer(self):
+        """ Write the value left pending during a drag, even if the slider stopped moving. """
+        if self.sliderWriteThrottle.flushDue():
+            self._sliderWriteTimer.start(int(1000 * self.sliderWriteThrottle.timeUntilNextWrite()))
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def onThresholdSliderPressed(self):
+        self.sliderWriteThrottle.beginInteraction()
+        self.logic.backgroundThreshold.cancel()  # Its result would be outdated by the drag
+        self._fullPreviewKey = None
+
+    # ------------------------------------------------------------------------------------------------------------------
+    @timedCallback
+    def onThresholdSliderReleased(self):
+        """ End of the drag: the final value is always committed. """
+        self._sliderWriteTimer.stop()
+        self.sliderWriteThrottle.endInteraction()
+        self.updateWriteCountersLabel()
+        self.updatePreview()  # Even if the final value was already stored, only the visible planes are up to date
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def updateWriteCountersLabel(self):
+        counters = self.sliderWriteThrottle.getCounters()
+        self.ui.writeCountersLabel.text = f"Slider writes: committed {counters['committed']}, suppressed {counters['suppressed']}"
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def onSaveSnapshotButton(self):
+        """ Save the parameter nodes of all LM_Roadmap modules, not the scene. """
+        logger.debug("**Widget.onSaveSnapshotButton(self)")
+        path = qt.QFileDialog.getSaveFileName(slicer.util.mainWindow(), "Save state snapshot", "", "LM_Roadmap state snapshot (*.lmsnap)")
+        if not path:
+            return
+        with slicer.util.tryWithErrorDisplay("Failed to save the state snapshot.", waitCursor=True):
+            moduleNames = saveStateSnapshot(path)
+            self.ui.statusLabel.text = f"Snapshot saved: {', '.join(moduleNames)}"
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def onLoadSnapshotButton(self):
+        """ Restore the parameter nodes of all LM_Roadmap modules. Node selections are found again by ID, or by name. """
+        logger.debug("**Widget.onLoadSnapshotButton(self)")
+        path = qt.QFileDialog.getOpenFileName(slicer.util.mainWindow(), "Load state snapshot", "", "LM_Roadmap state snapshot (*.lmsnap)")
+        if not path:
+            return
+        with slicer.util.tryWithErrorDisplay("Failed to load the state snapshot.", waitCursor=True):
+            unresolved = loadStateSnapshot(path)
+            if unresolved:
+                slicer.util.warningDisplay("Selected nodes not found in the scene:\n" + "\n".join(f"{moduleName}: {role}" for moduleName, role in unresolved))
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def updatePreview(self, visiblePlanesOnly=False):
+        """ Threshold the input volume into the preview labelmap, with the values shown by the GUI. During a drag only
+            the planes shown in the slice views are recomputed; otherwise the whole volume, in the background.
+            The slice views are only assigned (and fitted) when another volume is selected. """
+        volumeNode = self._parameterNode.GetNodeReference("InputVolume") if self._parameterNode else None
+        if volumeNode is None or volumeNode.GetImageData() is None:
+            return
+        thresholdValue = float(self.ui.imageThresholdSliderWidget.value)
+        invert = bool(self.ui.invertOutputCheckBox.checked)
+        labelmapNode = self.logic.getPreviewLabelmap(self._parameterNode, volumeNode)
+        if volumeNode.GetID() != self._shownVolumeID:
+            slicer.util.setSliceViewerLayers(background=volumeNode, label=labelmapNode, fit=True)
+            self._shownVolumeID = volumeNode.GetID()
+        previewKey = (volumeNode.GetID(), labelmapNode.GetID(), thresholdValue, invert)
+        if not visiblePlanesOnly and previewKey == self._fullPreviewKey:
+            return
+
+        # 1. Drag: visible planes only, synchronously
+        if visiblePlanesOnly:
+            self._fullPreviewKey = None
+            planes = [self.logic.getSlicePlane(volumeNode, sliceNode) for sliceNode in self.getVisibleSliceNodes()]
+            self.logic.updatePreviewPlanes(volumeNode, labelmapNode, thresholdValue, invert, [plane for plane in planes if plane])
+            return
+
+        # 2. Full volume on the worker thread, the timer shows the result when it is complete
+        self._fullPreviewKey = previewKey
+        self.logic.startFullPreviewUpdate(volumeNode, labelmapNode, thresholdValue, invert)
+        self._previewTimer.start()
+
+    # ------------------------------------------------------------------------------------------------------------------
+    @timedCallback
+    def onPreviewTimer(self):
+        if self.logic.pollFullPreviewUpdate():
+            self._previewTimer.start()
+
+    # ------------------------------------------------------------------------------------------------------------------
+    @staticmethod
+    def getVisibleSliceNodes():
+        layoutManager = slicer.app.layoutManager()
+        if layoutManager is None:
+            return []
+        sliceWidgets = [layoutManager.sliceWidget(name) for name in layoutManager.sliceViewNames()]
+        return [sliceWidget.mrmlSliceNode() for sliceWidget in sliceWidgets if sliceWidget.isVisible()]
+
 '''=================================================================================================================='''
 '''=================================================================================================================='''
 #
@@ -184,19 +364,110 @@ class PersistentGuiStateWidget(ScriptedLoadableModuleWidget, VTKObservationMixin
 #
 class PersistentGuiStateLogic(ScriptedLoadableModuleLogic):
 
+    # Typed parameters of the SingleTon ParameterNode
+    parameterSchema = ParameterSchema([
+        Parameter("ThresholdValue", float, 50.0, minimum=0.0, maximum=100.0),
+        Parameter("InvertValue", bool, False),
+        Parameter("ThrottleSliderWrites", bool, True),
+        Parameter("CommitOnRelease", bool, False),
+    ], references=("InputVolume", "PreviewLabelmap"))
+
     def __init__(self):
+        from PersistentGuiStateLib import BackgroundThreshold
         ScriptedLoadableModuleLogic.__init__(self)
-        print("**Logic.__init__(self)")
+        self.backgroundThreshold = BackgroundThreshold()  # Full-volume preview updates, off the GUI thread
+        self._fullPreviewFuture = None
+        self._fullPreviewLabelmap = None
+        logger.debug("**Logic.__init__(self)")
 
     # ------------------------------------------------------------------------------------------------------------------
     def setDefaultParameters(self, parameterNode):
         """    Initialize parameter node with defaults if empty.    """
-        print("\t\t\t**Logic.setDefaultParameters(self, parameterNode), \tLM_Roadmap");
+        logger.debug("\t\t\t**Logic.setDefaultParameters(self, parameterNode), \tLM_Roadmap");
+        self.parameterSchema.setDefaultParameters(parameterNode)
 
-        if not parameterNode.GetParameter("ThresholdValue"):
-            parameterNode.SetParameter("ThresholdValue", "50.0")
-        if not parameterNode.GetParameter("InvertValue"):
-            parameterNode.SetParameter("InvertValue", "False")
+    # ------------------------------------------------------------------------------------------------------------------
+    def getThresholdFromPercent(self, volumeNode, thresholdValue):
+        """ ThresholdValue is a percentage of the scalar range of the volume. """
+        low, high = volumeNode.GetImageData().GetScalarRange()
+        return low + thresholdValue / 100.0 * (high - low)
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def getPreviewLabelmap(self, parameterNode, volumeNode):
+        """ Labelmap referenced as "PreviewLabelmap", on the grid of the volume. Its uint8 buffer is allocated once and
+            reused by every update, as long as the volume dimensions do not change. """
+        labelmapNode = parameterNode.GetNodeReference("PreviewLabelmap")
+        if labelmapNode is None:
+            labelmapNode = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLLabelMapVolumeNode", "ThresholdPreview")
+            parameterNode.SetNodeReferenceID("PreviewLabelmap", labelmapNode.GetID())
+
+        # 1. Geometry, only written if different (every write is a Modified event)
+        volumeIJKToRAS, labelmapIJKToRAS = vtk.vtkMatrix4x4(), vtk.vtkMatrix4x4()
+        volumeNode.GetIJKToRASMatrix(volumeIJKToRAS)
+        labelmapNode.GetIJKToRASMatrix(labelmapIJKToRAS)
+        if any(volumeIJKToRAS.GetElement(r, c) != labelmapIJKToRAS.GetElement(r, c) for r in range(4) for c in range(4)):
+            labelmapNode.SetIJKToRASMatrix(volumeIJKToRAS)
+        if labelmapNode.GetTransformNodeID() != volumeNode.GetTransformNodeID():
+            labelmapNode.SetAndObserveTransformNodeID(volumeNode.GetTransformNodeID())
+
+        # 2. Buffer
+        dimensions = volumeNode.GetImageData().GetDimensions()
+        imageData = labelmapNode.GetImageData()
+        if imageData is None or imageData.GetDimensions() != dimensions or imageData.GetScalarType() != vtk.VTK_UNSIGNED_CHAR:
+            self.backgroundThreshold.cancel(wait=True)  # Never free a buffer the worker is writing
+            imageData = vtk.vtkImageData()
+            imageData.SetDimensions(dimensions)
+            imageData.AllocateScalars(vtk.VTK_UNSIGNED_CHAR, 1)
+            labelmapNode.SetAndObserveImageData(imageData)
+        return labelmapNode
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def getSlicePlane(self, volumeNode, sliceNode):
+        """ (numpy axis, index) of the volume plane closest to the slice shown by sliceNode, None if the slice does not
+            cross the volume. Oblique slices give the nearest volume plane: the full update fixes the rest. Parent
+            transforms are ignored. """
+        rasToIJK = vtk.vtkMatrix4x4()
+        volumeNode.GetRASToIJKMatrix(rasToIJK)
+        sliceToRAS = sliceNode.GetSliceToRAS()
+        center = rasToIJK.MultiplyPoint([sliceToRAS.GetElement(row, 3) for row in range(3)] + [1.0])
+        normal = rasToIJK.MultiplyPoint([sliceToRAS.GetElement(row, 2) for row in range(3)] + [0.0])
+        ijkAxis = max(range(3), key=lambda axis: abs(normal[axis]))
+        index = int(round(center[ijkAxis]))
+        if not 0 <= index < volumeNode.GetImageData().GetDimensions()[ijkAxis]:
+            return None
+        return 2 - ijkAxis, index  # numpy arrays are [k, j, i]
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def updatePreviewPlanes(self, volumeNode, labelmapNode, thresholdValue, invert, planes):
+        """ Recompute only the given planes of the mask, in place. """
+        from PersistentGuiStateLib import thresholdPlanes
+        self.backgroundThreshold.cancel()
+        threshold = self.getThresholdFromPercent(volumeNode, thresholdValue)
+        thresholdPlanes(slicer.util.arrayFromVolume(volumeNode), slicer.util.arrayFromVolume(labelmapNode), planes, threshold, invert)
+        slicer.util.arrayFromVolumeModified(labelmapNode)
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def startFullPreviewUpdate(self, volumeNode, labelmapNode, thresholdValue, invert):
+        """ Recompute the whole mask, in place, on the worker thread. Call pollFullPreviewUpdate from the GUI thread
+            until it returns False. """
+        threshold = self.getThresholdFromPercent(volumeNode, thresholdValue)
+        self._fullPreviewLabelmap = labelmapNode
+        self._fullPreviewFuture = self.backgroundThreshold.submit(
+            slicer.util.arrayFromVolume(volumeNode), slicer.util.arrayFromVolume(labelmapNode), threshold, invert)
+        return self._fullPreviewFuture
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def pollFullPreviewUpdate(self):
+        """ True while the full update runs. Once it completed, the labelmap is marked modified (VTK pipelines must
+            only be touched from the GUI thread). """
+        if self._fullPreviewFuture is None:
+            return False
+        if not self._fullPreviewFuture.done():
+            return True
+        if self._fullPreviewFuture.result():
+            slicer.util.arrayFromVolumeModified(self._fullPreviewLabelmap)
+        self._fullPreviewFuture = self._fullPreviewLabelmap = None
+        return False
 
 '''=================================================================================================================='''
 '''=================================================================================================================='''
@@ -212,6 +483,13 @@ class PersistentGuiStateTest(ScriptedLoadableModuleTest):
     def runTest(self):
         self.setUp()
         self.test_PersistentGuiState_Defaults()
+        self.test_PersistentGuiState_TypedParameters()
+        self.test_PersistentGuiState_WriteThrottle()
+        self.test_PersistentGuiState_AppliedValues()
+        self.test_PersistentGuiState_ThresholdPreview()
+        self.test_PersistentGuiState_ModuleReentry()
+        self.test_PersistentGuiState_StateSnapshot()
+        self.test_PersistentGuiState_CallbackStatistics()
 
     # ------------------------------------------------------------------------------------------------------------------
     def test_PersistentGuiState_Defaults(self):
@@ -225,3 +503,268 @@ class PersistentGuiStateTest(ScriptedLoadableModuleTest):
         self.assertEqual(parameterNode.GetParameter("InvertValue"), "False")
         
         self.delayDisplay('Test passed')
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def test_PersistentGuiState_TypedParameters(self):
+        self.delayDisplay("Starting the typed parameters test")
+
+        logic = PersistentGuiStateLogic()
+        parameterNode = logic.getParameterNode()
+        logic.setDefaultParameters(parameterNode)
+        schema = logic.parameterSchema
+
+        # 1. Typed reads, cached until the stored value changes
+        self.assertEqual(schema.get(parameterNode, "ThresholdValue"), 50.0)
+        self.assertIs(schema.get(parameterNode, "InvertValue"), False)
+        schema.set(parameterNode, "ThresholdValue", 75.0)
+        self.assertEqual(parameterNode.GetParameter("ThresholdValue"), "75.0")
+        self.assertEqual(schema.get(parameterNode, "ThresholdValue"), 75.0)
+
+        # 2. Validation on write, default on unreadable stored values
+        with self.assertRaises(ValueError):
+            schema.set(parameterNode, "ThresholdValue", 150.0)
+        parameterNode.SetParameter("ThresholdValue", "not a number")
+        self.assertEqual(schema.get(parameterNode, "ThresholdValue"), 50.0)
+
+        # 3. Writes are read back at once, also while modified events are disabled (the node MTime does not move)
+        wasModified = parameterNode.StartModify()
+        schema.set(parameterNode, "ThresholdValue", 20.0)
+        self.assertEqual(schema.get(parameterNode, "ThresholdValue"), 20.0)
+        schema.set(parameterNode, "ThresholdValue", 100.0)
+        self.assertEqual(schema.get(parameterNode, "ThresholdValue"), 100.0)
+        parameterNode.EndModify(wasModified)
+
+        # 4. The slider covers the whole parameter range
+        uiWidget = slicer.util.loadUI(os.path.join(os.path.dirname(__file__), "Resources/UI/PersistentGuiState.ui"))
+        slider = slicer.util.findChild(uiWidget, "imageThresholdSliderWidget")
+        parameter = schema.parameters["ThresholdValue"]
+        self.assertEqual((slider.minimum, slider.maximum), (parameter.minimum, parameter.maximum))
+
+        self.delayDisplay('Test passed')
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def test_PersistentGuiState_WriteThrottle(self):
+        self.delayDisplay("Starting the write throttle test")
+
+        logic = PersistentGuiStateLogic()
+        parameterNode = logic.getParameterNode()
+        logic.setDefaultParameters(parameterNode)
+        modifiedEvents = []
+        observerTag = parameterNode.AddObserver(vtk.vtkCommand.ModifiedEvent, lambda caller, event: modifiedEvents.append(event))
+
+        # 1. Simulated drag of 100 ticks, 5 ms apart, on a fake clock
+        now = [0.0]
+        values = [0.0]
+        write = lambda: logic.parameterSchema.set(parameterNode, "ThresholdValue", values[0])
+        throttle = WriteThrottle(write, minimumInterval=0.05, clock=lambda: now[0])
+        throttle.beginInteraction()
+        for tick in range(100):
+            now[0], values[0] = tick * 0.005, float(tick)
+            throttle.request()
+            throttle.flushDue()
+        throttle.endInteraction()
+
+        # 2. Capped rate, final value committed, every tick accounted for
+        self.assertEqual(logic.parameterSchema.get(parameterNode, "ThresholdValue"), 99.0)
+        self.assertLessEqual(throttle.committedWrites, 12)
+        self.assertEqual(throttle.committedWrites + throttle.suppressedWrites, 100)
+        self.assertEqual(len(modifiedEvents), throttle.committedWrites)
+
+        # 3. Commit on release: a single write per drag
+        throttle.resetCounters()
+        throttle.commitOnRelease = True
+        throttle.beginInteraction()
+        for tick in range(50):
+            now[0], values[0] = now[0] + 0.005, float(tick)
+            throttle.request()
+            self.assertFalse(throttle.flushDue())
+        throttle.endInteraction()
+        self.assertEqual(throttle.getCounters(), {"committed": 1, "suppressed": 49})
+        self.assertEqual(logic.parameterSchema.get(parameterNode, "ThresholdValue"), 49.0)
+
+        parameterNode.RemoveObserver(observerTag)
+        self.delayDisplay('Test passed')
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def test_PersistentGuiState_AppliedValues(self):
+        self.delayDisplay("Starting the applied values test")
+
+        logic = PersistentGuiStateLogic()
+        parameterNode = logic.getParameterNode()
+        logic.setDefaultParameters(parameterNode)
+        schema = logic.parameterSchema
+        applied = AppliedValues()
+
+        # 1. Everything is new at first, nothing afterwards
+        self.assertTrue(applied.parameterChanged(schema, parameterNode, "ThresholdValue"))
+        self.assertTrue(applied.referenceChanged(parameterNode, "SelectedNode"))
+        self.assertFalse(applied.parameterChanged(schema, parameterNode, "ThresholdValue"))
+        self.assertFalse(applied.referenceChanged(parameterNode, "SelectedNode"))
+
+        # 2. Only the parameter that changed is reported
+        self.assertTrue(applied.parameterChanged(schema, parameterNode, "InvertValue"))
+        schema.set(parameterNode, "ThresholdValue", 20.0)
+        self.assertTrue(applied.parameterChanged(schema, parameterNode, "ThresholdValue"))
+        self.assertFalse(applied.parameterChanged(schema, parameterNode, "InvertValue"))
+        volumeNode = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLScalarVolumeNode")
+        parameterNode.SetNodeReferenceID("SelectedNode", volumeNode.GetID())
+        self.assertTrue(applied.referenceChanged(parameterNode, "SelectedNode"))
+
+        # 3. Cleared: everything is applied again
+        applied.clear()
+        self.assertTrue(applied.parameterChanged(schema, parameterNode, "InvertValue"))
+        parameterNode.SetNodeReferenceID("SelectedNode", None)
+
+        self.delayDisplay('Test passed')
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def test_PersistentGuiState_ThresholdPreview(self):
+        self.delayDisplay("Starting the threshold preview test")
+        import numpy as np
+
+        logic = PersistentGuiStateLogic()
+        parameterNode = logic.getParameterNode()
+        logic.setDefaultParameters(parameterNode)
+        voxels = np.arange(20 * 30 * 40, dtype=np.int16).reshape(20, 30, 40) % 100  # Scalar range [0, 99]
+        volumeNode = slicer.util.addVolumeFromArray(voxels)
+
+        # 1. Preallocated uint8 buffer, on the grid of the volume
+        labelmapNode = logic.getPreviewLabelmap(parameterNode, volumeNode)
+        self.assertEqual(parameterNode.GetNodeReference("PreviewLabelmap"), labelmapNode)
+        self.assertEqual(labelmapNode.GetImageData().GetDimensions(), volumeNode.GetImageData().GetDimensions())
+        scalars = labelmapNode.GetImageData().GetPointData().GetScalars()
+        mask = slicer.util.arrayFromVolume(labelmapNode)
+        mask[:] = 0
+
+        # 2. Drag: only the given plane is computed
+        logic.updatePreviewPlanes(volumeNode, labelmapNode, 50.0, False, [(0, 7)])
+        threshold = logic.getThresholdFromPercent(volumeNode, 50.0)
+        np.testing.assert_array_equal(mask[7], voxels[7] >= threshold)
+        self.assertEqual(mask[8].sum(), 0)
+
+        # 3. Full, inverted, in the background, into the same buffer
+        logic.startFullPreviewUpdate(volumeNode, labelmapNode, 50.0, True).result()
+        self.assertFalse(logic.pollFullPreviewUpdate())
+        np.testing.assert_array_equal(mask, voxels < threshold)
+        self.assertIs(logic.getPreviewLabelmap(parameterNode, volumeNode).GetImageData().GetPointData().GetScalars(), scalars)
+
+        parameterNode.SetNodeReferenceID("PreviewLabelmap", None)
+        logic.backgroundThreshold.shutdown()
+        self.delayDisplay('Test passed')
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def test_PersistentGuiState_ModuleReentry(self):
+        self.delayDisplay("Starting the module re-entry test")
+        import numpy as np
+
+        slicer.util.selectModule("PersistentGuiState")
+        widget = slicer.modules.persistentguistate.widgetRepresentation().self()
+        volumeNode = slicer.util.addVolumeFromArray(np.arange(20 * 30 * 40, dtype=np.int16).reshape(20, 30, 40) % 100)
+        fullUpdates = []
+        startFullPreviewUpdate = widget.logic.startFullPreviewUpdate
+        widget.logic.startFullPreviewUpdate = lambda *args: fullUpdates.append(args) or startFullPreviewUpdate(*args)
+        try:
+            # 1. Selecting a volume shows it, fitted, and thresholds it once
+            widget._parameterNode.SetNodeReferenceID("InputVolume", volumeNode.GetID())
+            sliceLogic = slicer.app.layoutManager().sliceWidget("Red").sliceLogic()
+            self.assertEqual(sliceLogic.GetSliceCompositeNode().GetBackgroundVolumeID(), volumeNode.GetID())
+            self.assertEqual(len(fullUpdates), 1)
+
+            # 2. Leaving and re-entering the module keeps the user's zoom and the preview
+            sliceNode = sliceLogic.GetSliceNode()
+            fieldOfView = [2 * value for value in sliceNode.GetFieldOfView()]
+            sliceNode.SetFieldOfView(*fieldOfView)
+            slicer.util.selectModule("Data")
+            slicer.util.selectModule("PersistentGuiState")
+            self.assertEqual(list(sliceNode.GetFieldOfView()), fieldOfView)
+            self.assertEqual(len(fullUpdates), 1)
+
+            # 3. Another volume is shown again
+            otherVolumeNode = slicer.util.addVolumeFromArray(np.zeros((5, 6, 7), dtype=np.int16))
+            widget._parameterNode.SetNodeReferenceID("InputVolume", otherVolumeNode.GetID())
+            self.assertEqual(sliceLogic.GetSliceCompositeNode().GetBackgroundVolumeID(), otherVolumeNode.GetID())
+            self.assertEqual(len(fullUpdates), 2)
+        finally:
+            widget.logic.startFullPreviewUpdate = startFullPreviewUpdate
+            widget.logic.backgroundThreshold.cancel(wait=True)
+            widget._parameterNode.SetNodeReferenceID("InputVolume", None)
+
+        self.delayDisplay('Test passed')
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def test_PersistentGuiState_StateSnapshot(self):
+        self.delayDisplay("Starting the state snapshot test")
+        import os
+        import tempfile
+        from LM_RoadmapLib import getModuleParameterNode, readStateSnapshot
+
+        # 1. State of two modules: scalars, a bulk array and a node reference
+        logic = PersistentGuiStateLogic()
+        parameterNode = logic.getParameterNode()
+        logic.setDefaultParameters(parameterNode)
+        logic.parameterSchema.set(parameterNode, "ThresholdValue", 33.0)
+        volumeNode = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLScalarVolumeNode", "SnapshotVolume")
+        parameterNode.SetNodeReferenceID("InputVolume", volumeNode.GetID())
+        landmarkNode = getModuleParameterNode("LiveLandmarkMonitor", create=True)
+        landmarkNode.SetParameter("StoredPositions", "[[1.5,2.0,-3.25],[4.0,5.0,6.0]]")
+
+        # 2. Saved in binary form, then changed
+        path = os.path.join(tempfile.mkdtemp(), "state.lmsnap")
+        self.assertIn("LiveLandmarkMonitor", saveStateSnapshot(path))
+        header, arrays = readStateSnapshot(path)
+        self.assertEqual(arrays[("LiveLandmarkMonitor", "StoredPositions")].shape, (2, 3))
+        self.assertNotIn("StoredPositions", header["modules"]["LiveLandmarkMonitor"]["parameters"])
+        logic.parameterSchema.set(parameterNode, "ThresholdValue", 90.0)
+        parameterNode.SetNodeReferenceID("InputVolume", None)
+        landmarkNode.SetParameter("StoredPositions", "[]")
+
+        # 3. Restored
+        self.assertEqual(loadStateSnapshot(path), [])
+        self.assertEqual(logic.parameterSchema.get(parameterNode, "ThresholdValue"), 33.0)
+        self.assertEqual(parameterNode.GetNodeReference("InputVolume"), volumeNode)
+        self.assertEqual(landmarkNode.GetParameter("StoredPositions"), "[[1.5,2.0,-3.25],[4.0,5.0,6.0]]")
+
+        # 4. A deleted node is reported, not silently replaced
+        slicer.mrmlScene.RemoveNode(volumeNode)
+        self.assertEqual(loadStateSnapshot(path), [("PersistentGuiState", "InputVolume")])
+
+        # 5. Restored, not merged: a selection made after saving with no selection is cleared, new parameters unset
+        parameterNode.SetNodeReferenceID("InputVolume", None)
+        saveStateSnapshot(path)
+        header, _ = readStateSnapshot(path)
+        self.assertIsNone(header["modules"]["PersistentGuiState"]["references"]["InputVolume"])
+        otherVolumeNode = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLScalarVolumeNode", "OtherVolume")
+        parameterNode.SetNodeReferenceID("InputVolume", otherVolumeNode.GetID())
+        parameterNode.SetParameter("AddedAfterSaving", "1")
+        self.assertEqual(loadStateSnapshot(path), [])
+        self.assertIsNone(parameterNode.GetNodeReference("InputVolume"))
+        self.assertNotIn("AddedAfterSaving", parameterNode.GetParameterNames())
+        self.assertEqual(logic.parameterSchema.get(parameterNode, "ThresholdValue"), 33.0)
+        os.remove(path)
+
+        self.delayDisplay('Test passed')
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def test_PersistentGuiState_CallbackStatistics(self):
+        self.delayDisplay("Starting the callback statistics test")
+        import json
+        from LM_RoadmapLib import dumpCallbackStatistics, getCallbackStatistics, resetCallbackStatistics
+
+        # 1. Every call of an instrumented callback is counted and timed
+        resetCallbackStatistics()
+        logic = PersistentGuiStateLogic()
+        parameterNode = logic.getParameterNode()
+        widget = PersistentGuiStateWidget.__new__(PersistentGuiStateWidget)  # Only the callback is exercised
+        widget._parameterNode = None
+        for _ in range(5):
+            widget.updateGUIFromParameterNode(parameterNode, vtk.vtkCommand.ModifiedEvent)
+        statistics = getCallbackStatistics()["PersistentGuiState.PersistentGuiStateWidget.updateGUIFromParameterNode"]
+        self.assertEqual(statistics["calls"], 5)
+        self.assertEqual(sum(statistics["histogramUs"].values()), 5)
+        self.assertGreaterEqual(statistics["p95Us"], statistics["p50Us"])
+
+        # 2. JSON dump
+        self.assertIn("PersistentGuiState.PersistentGuiStateWidget.updateGUIFromParameterNode", json.loads(dumpCallbackStatistics()))
+        resetCallbackStatistics()
+
+        self.delayDisplay('Test passed')
@@ -0,0 +1,85 @@
+import concurrent.futures
+
+import numpy as np
+
+#
+# Binary threshold mask of a volume, written in place into a preallocated uint8 buffer.
+#
+# The mask buffer is the scalar array of the preview labelmap, so the comparison ufunc writes straight into the memory
+# VTK renders from: no temporary array, no copy into VTK. While the threshold slider is dragged only the planes shown
+# in the slice views are recomputed (one comparison per plane). The full volume is recomputed on a worker thread, slab
+# by slab; numpy releases the GIL during the comparisons, so the GUI stays responsive, and a newer request stops an
+# older one between slabs.
+#
+# Conventions: numpy voxel arrays are indexed [k, j, i]; a "plane" is an (axis, index) pair in that indexing.
+#
+
+SLAB_THICKNESS = 8  # Planes per step of a full update, between two cancellation checks
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def thresholdInto(voxels, mask, threshold, invert=False):
+    """ mask = voxels >= threshold (voxels < threshold if inverted), as 0 / 1, written into the uint8 mask in place. """
+    compare = np.less if invert else np.greater_equal
+    compare(voxels, threshold, out=mask.view(np.bool_))
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def sliceOfPlane(plane):
+    axis, index = plane
+    planeSlice = [slice(None)] * 3
+    planeSlice[axis] = index
+    return tuple(planeSlice)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def thresholdPlanes(voxels, mask, planes, threshold, invert=False):
+    """ Update only the given planes of the mask. """
+    for plane in set(planes):
+        planeSlice = sliceOfPlane(plane)
+        thresholdInto(voxels[planeSlice], mask[planeSlice], threshold, invert)
+
+
+'''=================================================================================================================='''
+#
+# BackgroundThreshold
+#
+class BackgroundThreshold:
+    """ Full mask updates on one worker thread. Submitting a new update, or cancel(), stops the running one at its
+        next slab. Callers must not reallocate the buffers of a running update: cancel(wait=True) first. """
+
+    def __init__(self):
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        self._generation = 0
+        self._future = None
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def submit(self, voxels, mask, threshold, invert=False):
+        """ Returns a Future whose result is True if the whole mask was written, False if it was cancelled. """
+        self._generation += 1
+        generation = self._generation
+
+        def run():
+            for start in range(0, voxels.shape[0], SLAB_THICKNESS):
+                if self._generation != generation:
+                    return False
+                thresholdInto(voxels[start:start + SLAB_THICKNESS], mask[start:start + SLAB_THICKNESS], threshold, invert)
+            return True
+
+        self._future = self._executor.submit(run)
+        return self._future
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def isRunning(self):
+        return self._future is not None and not self._future.done()
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def cancel(self, wait=False):
+        self._generation += 1
+        if wait and self._future is not None:
+            concurrent.futures.wait([self._future])
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def shutdown(self):
+        self.cancel()
+        self._executor.shutdown(wait=True)
@@ -0,0 +1 @@
+from .ThresholdPreview import BackgroundThreshold, sliceOfPlane, thresholdInto, thresholdPlanes
@@ -7,6 +7,21 @@ import slicer, qt
 from slicer.ScriptedLoadableModule import *
 from slicer.util import VTKObservationMixin
 
+from LM_RoadmapLib import (
+    AppliedValues,
+    ParameterSchema,
+    getLogger,
+    getSceneIndex,
+    installSampleDataStore,
+    lazyImport,
+    timedCallback,
+)
+
+logger = getLogger(__name__)
+np = lazyImport("numpy")
+
+_topologyCache = None  # Mesh topologies shared by all logic instances, under one memory budget
+
 '''=================================================================================================================='''
 '''=================================================================================================================='''
 #
@@ -24,7 +39,7 @@ class SurfaceMeasurementTool(ScriptedLoadableModule):
         self.parent.helpText = """This module computes surface area, bounding box, and center of mass for model nodes. """
         self.parent.acknowledgementText = 'Learning Roadmap Project 4. \nPart of the LM_Roadmap extension.'
 
-        print("SurfaceMeasurementTool(ScriptedLoadableModule):    __init__(self, parent)")
+        logger.debug("SurfaceMeasurementTool(ScriptedLoadableModule):    __init__(self, parent)")
 
 '''=================================================================================================================='''
 '''=================================================================================================================='''
@@ -40,11 +55,12 @@ class SurfaceMeasurementToolWidget(ScriptedLoadableModuleWidget, VTKObservationM
         self.logic = None
         self._parameterNode = None # SingleTon initialized through self.setParameterNode(self.logic.getParameterNode())
         self._updatingGUIFromParameterNode = False
-        print("**Widget.__init__(self, parent)")
+        self._appliedValues = AppliedValues()  # What the GUI already shows, to only touch widgets whose value changed
+        logger.debug("**Widget.__init__(self, parent)")
 
     # ------------------------------------------------------------------------------------------------------------------
     def setup(self):
-        print("**Widget.setup(self), \tLM_Roadmap")
+        logger.debug("**Widget.setup(self), \tLM_Roadmap")
 
         """    00. Called when the user opens the module the first time and the widget is initialized. """
         ScriptedLoadableModuleWidget.setup(self)
@@ -75,46 +91,54 @@ class SurfaceMeasurementToolWidget(ScriptedLoadableModuleWidget, VTKObservationM
     # ------------------------------------------------------------------------------------------------------------------
     def cleanup(self):
         """    Called when the application closes and the module widget is destroyed.    """
-        print("**Widget.cleanup(self)")
+        logger.debug("**Widget.cleanup(self)")
         self.removeObservers()
 
     # ------------------------------------------------------------------------------------------------------------------
     def enter(self):
         """    Called each time the user opens this module.    """
-        print("\n**Widget.enter(self)")
+        logger.debug("\n**Widget.enter(self)")
         self.initializeParameterNode()
 
     # ------------------------------------------------------------------------------------------------------------------
     def exit(self):
         """    Called each time the user opens a different module.    """
-        print("**Widget.exit(self)")
+        logger.debug("**Widget.exit(self)")
         # Slicer. Do not react to parameter node changes (GUI will be updated when the user enters into the module)
         if self._parameterNode:
             self.removeObserver(self._parameterNode, vtk.vtkCommand.ModifiedEvent, self.updateGUIFromParameterNode)
 
     # ------------------------------------------------------------------------------------------------------------------
+    @timedCallback
     def onSceneStartClose(self, caller, event):
         """    Called just before the scene is closed.    """
-        print("**Widget.onSceneStartClose(self, caller, event)")
+        logger.debug("**Widget.onSceneStartClose(self, caller, event)")
         self.setParameterNode(None)
 
     # ------------------------------------------------------------------------------------------------------------------
+    @timedCallback
     def onSceneEndClose(self, caller, event):
         """     Called just after the scene is closed.    """
-        print("**Widget.onSceneEndClose(self, caller, event)")
+        logger.debug("**Widget.onSceneEndClose(self, caller, event)")
         if self.parent.isEntered:
             self.initializeParameterNode()
 
     # ------------------------------------------------------------------------------------------------------------------
     def initializeParameterNode(self):
         """    Ensure parameter node exists and observed. """
-        print("\t**Widget.initializeParameterNode(self), \t LM_Roadmap")
+        logger.debug("\t**Widget.initializeParameterNode(self), \t LM_Roadmap")
         self.setParameterNode(self.logic.getParameterNode())
 
+        # Select default input nodes if nothing is selected yet to save a few clicks for the user
+        if not self._parameterNode.GetNodeReference("SelectedSurface"):
+            firstModelNode = getSceneIndex().getFirstNode("vtkMRMLModelNode", includeHidden=False)
+            if firstModelNode:
+                self._parameterNode.SetNodeReferenceID("SelectedSurface", firstModelNode.GetID())
+
     # ------------------------------------------------------------------------------------------------------------------
     def setParameterNode(self, inputParameterNode):
         """    Set and observe the SingleTon ParameterNode. """
-        print("\t\t**Widget.setParameterNode(self, inputParameterNode)")
+        logger.debug("\t\t**Widget.setParameterNode(self, inputParameterNode)")
         if inputParameterNode:
             if not inputParameterNode.IsSingleton():
                 raise ValueError(f'LM_Roadmap Alert! \tinputParameterNode is not a singleton!')
@@ -129,10 +153,12 @@ class SurfaceMeasurementToolWidget(ScriptedLoadableModuleWidget, VTKObservationM
         if self._parameterNode is not None:
             self.addObserver(self._parameterNode, vtk.vtkCommand.ModifiedEvent, self.updateGUIFromParameterNode)
         
-        # 03. Initial GUI update
+        # 03. Initial GUI update, of every widget
+        self._appliedValues.clear()
         self.updateGUIFromParameterNode()
 
     # ------------------------------------------------------------------------------------------------------------------
+    @timedCallback
     def updateGUIFromParameterNode(self, caller=None, event=None):
         """   Update GUI from ParameterNode. """
         if self._parameterNode is None or self._updatingGUIFromParameterNode:
@@ -141,18 +167,20 @@ class SurfaceMeasurementToolWidget(ScriptedLoadableModuleWidget, VTKObservationM
         # I. Open-Brace: Prevent infinite loops
         self._updatingGUIFromParameterNode = True
         
-        print("**Widget.updateGUIFromParameterNode(self, caller=None, event=None), \tLM_Roadmap")
+        logger.debug("**Widget.updateGUIFromParameterNode(self, caller=None, event=None), \tLM_Roadmap")
         
-        # II. Sync GUI widgets
-        self.ui.surfaceSelector.setCurrentNode(self._parameterNode.GetNodeReference("SelectedSurface"))
+        # II. Sync GUI widgets whose backing value changed
+        if self._appliedValues.referenceChanged(self._parameterNode, "SelectedSurface"):
+            self.ui.surfaceSelector.setCurrentNode(self._parameterNode.GetNodeReference("SelectedSurface"))
         
         # III. Close-Brace
         self._updatingGUIFromParameterNode = False
 
     # ------------------------------------------------------------------------------------------------------------------
+    @timedCallback
     def updateParameterNodeFromGUI(self, caller=None, event=None):
         """ Save GUI selection into ParameterNode. """
-        print(f"**Widget.updateParameterNodeFromGUI(self, caller=None, event=None),     \t LM_Roadmap")
+        logger.debug("**Widget.updateParameterNodeFromGUI(self, caller=None, event=None),     \t LM_Roadmap")
         if self._parameterNode is None or self._updatingGUIFromParameterNode:
             return
 
@@ -168,7 +196,7 @@ class SurfaceMeasurementToolWidget(ScriptedLoadableModuleWidget, VTKObservationM
     # ------------------------------------------------------------------------------------------------------------------
     def onComputeButton(self):
         """ Handle Compute button click. """
-        print("**Widget.onComputeButton(self)")
+        logger.debug("**Widget.onComputeButton(self)")
         
         selectedNode = self.ui.surfaceSelector.currentNode()
         if not selectedNode:
@@ -193,26 +221,77 @@ class SurfaceMeasurementToolWidget(ScriptedLoadableModuleWidget, VTKObservationM
 #
 class SurfaceMeasurementToolLogic(ScriptedLoadableModuleLogic):
 
+    # Typed parameters of the SingleTon ParameterNode
+    parameterSchema = ParameterSchema([], references=("SelectedSurface",))
+
     def __init__(self):
         ScriptedLoadableModuleLogic.__init__(self)
-        print("**Logic.__init__(self)")
+        logger.debug("**Logic.__init__(self)")
+        self._landmarkDistanceMaps = {}  # Model node ID: (points MTime, distance array, LandmarkDistanceMap)
+        getSceneIndex().addNodeRemovedCallback(self.onNodeRemoved)  # Held weakly, dropped with the logic
 
     # ------------------------------------------------------------------------------------------------------------------
     def setDefaultParameters(self, parameterNode):
         """    Initialize parameter node with defaults if empty.    """
-        print("\t\t\t**Logic.setDefaultParameters(self, parameterNode), \tLM_Roadmap");
-        pass
+        logger.debug("\t\t\t**Logic.setDefaultParameters(self, parameterNode), \tLM_Roadmap");
+        self.parameterSchema.setDefaultParameters(parameterNode)
+
+    # ------------------------------------------------------------------------------------------------------------------
+    @staticmethod
+    def getTopologyCache():
+        """ TopologyCache shared by all surface computations; set its memoryBudget (bytes) to bound its size.
+            Topologies of models removed from the scene (or closed with it) are discarded. """
+        global _topologyCache
+        if _topologyCache is None:
+            from SurfaceMeasurementToolLib import TopologyCache
+            _topologyCache = TopologyCache()
+            getSceneIndex().addNodeRemovedCallback(_topologyCache.discard)
+        return _topologyCache
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def onNodeRemoved(self, nodeID):
+        """ Scene index callback: the distance map of a removed model is dropped. """
+        self._landmarkDistanceMaps.pop(nodeID, None)
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def getMeshTopology(self, node):
+        """ Cached MeshTopology of a model (vertices, triangles, face areas and normals, vertex normals, edges,
+            adjacency), rebuilt when its points or cells are modified. None for a model without points. """
+        polyData = node.GetPolyData() if node else None
+        if not polyData or not polyData.GetPoints():
+            return None
+        # Not polyData.GetMTime(): it also changes with point and cell data, e.g. scalars written on the model
+        geometryMTime = max(polyData.GetPoints().GetMTime(), polyData.GetPolys().GetMTime(),
+                            polyData.GetStrips().GetMTime())
+        return self.getTopologyCache().get(node.GetID(), geometryMTime, lambda: self._buildMeshTopology(node))
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def _buildMeshTopology(self, node):
+        from vtk.util.numpy_support import vtk_to_numpy
+        from SurfaceMeasurementToolLib import MeshTopology, trianglesFromCells
+        polyData = node.GetPolyData()
+
+        def triangles(polys):
+            return trianglesFromCells(vtk_to_numpy(polys.GetOffsetsArray()),
+                                      vtk_to_numpy(polys.GetConnectivityArray()))
+
+        meshTriangles = None if polyData.GetNumberOfStrips() else triangles(polyData.GetPolys())
+        if meshTriangles is None:  # Polygons or strips: triangulate (points passed through, vertex indices unchanged)
+            triangleFilter = vtk.vtkTriangleFilter()
+            triangleFilter.SetInputData(polyData)
+            triangleFilter.PassVertsOff()
+            triangleFilter.PassLinesOff()
+            triangleFilter.Update()
+            meshTriangles = triangles(triangleFilter.GetOutput().GetPolys())
+        return MeshTopology(slicer.util.arrayFromModelPoints(node), meshTriangles)
 
     # ------------------------------------------------------------------------------------------------------------------
     def getSurfaceArea(self, node):
-        """ Compute surface area using vtkMassProperties. """
-        if not node or not node.GetPolyData():
+        """ Sum of the triangle areas of the cached mesh topology. """
+        topology = self.getMeshTopology(node)
+        if topology is None:
             return 0.0
-        
-        massProperties = vtk.vtkMassProperties()
-        massProperties.SetInputData(node.GetPolyData())
-        massProperties.Update()
-        return massProperties.GetSurfaceArea()
+        return float(topology.faceAreas.sum())
 
     # ------------------------------------------------------------------------------------------------------------------
     def getBoundingBox(self, node):
@@ -235,6 +314,134 @@ class SurfaceMeasurementToolLogic(ScriptedLoadableModuleLogic):
         centerOfMass.Update()
         return centerOfMass.GetCenter()
 
+    # ------------------------------------------------------------------------------------------------------------------
+    def sampleSurfacePoints(self, node, count, seed=None):
+        """ (count, 3) points uniformly distributed on the model surface, in model coordinates. """
+        topology = self.getMeshTopology(node)
+        if topology is None or not len(topology.triangles):
+            return np.zeros((0, 3))
+        return topology.samplePoints(count, seed)
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def getSignedDistances(self, node, points):
+        """ Signed distances of (n, 3) points (model coordinates) to the surface of a closed model: negative inside,
+            positive outside. The cell locator of the model is built once and cached with its mesh topology. """
+        from vtk.util.numpy_support import numpy_to_vtk, vtk_to_numpy
+        topology = self.getMeshTopology(node)
+        if topology is None or not len(topology.triangles):
+            raise ValueError(f"Model {node.GetName() if node else None} has no surface")
+        if not topology.isClosed:
+            logger.warning("Model %s is not a closed surface, signs are unreliable near its holes", node.GetName())
+
+        def buildDistanceFunction():
+            distanceFunction = vtk.vtkImplicitPolyDataDistance()
+            distanceFunction.SetInput(node.GetPolyData())  # Triangulated copy with normals, and its cell locator
+            return distanceFunction, 2 * 1024 * node.GetPolyData().GetActualMemorySize()  # Estimated bytes
+
+        distanceFunction = topology.attachment("vtkImplicitPolyDataDistance", buildDistanceFunction)
+        points = np.ascontiguousarray(points, dtype=np.float64).reshape(-1, 3)
+        distances = vtk.vtkDoubleArray()
+        distances.SetNumberOfTuples(len(points))
+        if len(points):
+            distanceFunction.FunctionValue(numpy_to_vtk(points), distances)  # All points in one call, in C++
+        return vtk_to_numpy(distances).copy()
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def classifyControlPoints(self, modelNode, markupsNode, selectInside=False):
+        """ Which control points of a markups node lie inside a closed model. Writes the result in the markups node,
+            as the per-point "SignedDistance" and "Inside" measurements (control point values) and, only if
+            selectInside, as the selected state of the points (inside points selected, replacing the user's
+            selection). Returns the (n,) boolean inside array. """
+        from vtk.util.numpy_support import numpy_to_vtk
+        signedDistances = self.getSignedDistances(modelNode,
+                                                  self.getControlPointsInModelCoordinates(markupsNode, modelNode))
+        inside = signedDistances < 0
+        wasModified = markupsNode.StartModify()
+        try:
+            for name, values, units in (("SignedDistance", signedDistances, "mm"), ("Inside", inside, "")):
+                measurement = markupsNode.GetMeasurement(name)
+                if measurement is None:
+                    measurement = slicer.vtkMRMLStaticMeasurement()
+                    measurement.SetName(name)
+                    measurement.SetUnits(units)
+                    markupsNode.AddMeasurement(measurement)
+                measurement.SetEnabled(True)
+                controlPointValues = numpy_to_vtk(values.astype(np.float64), deep=True, array_type=vtk.VTK_DOUBLE)
+                controlPointValues.SetName(name)
+                measurement.SetControlPointValues(controlPointValues)
+            if selectInside:
+                for index, isInside in enumerate(inside.tolist()):
+                    markupsNode.SetNthControlPointSelected(index, isInside)
+        finally:
+            markupsNode.EndModify(wasModified)
+        return inside
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def getControlPointsInModelCoordinates(self, markupsNode, modelNode):
+        """ (n, 3) control point positions of a markups node in the coordinate system of a model. All points are
+            transformed at once: one matrix product for linear transforms, one TransformPoints call otherwise. """
+        from vtk.util.numpy_support import numpy_to_vtk, vtk_to_numpy
+        positions = slicer.util.arrayFromMarkupsControlPoints(markupsNode, world=True).reshape(-1, 3)
+        transformNode = modelNode.GetParentTransformNode()
+        if transformNode is None or not len(positions):
+            return positions
+        if transformNode.IsTransformToWorldLinear():
+            worldToModel = vtk.vtkMatrix4x4()
+            transformNode.GetMatrixTransformFromWorld(worldToModel)
+            matrix = slicer.util.arrayFromVTKMatrix(worldToModel)
+            return positions @ matrix[:3, :3].T + matrix[:3, 3]
+        worldToModel = vtk.vtkGeneralTransform()
+        transformNode.GetTransformFromWorld(worldToModel)
+        worldPoints = vtk.vtkPoints()
+        worldPoints.SetData(numpy_to_vtk(np.ascontiguousarray(positions, dtype=np.float64), deep=True))
+        modelPoints = vtk.vtkPoints()
+        modelPoints.SetDataTypeToDouble()
+        worldToModel.TransformPoints(worldPoints, modelPoints)
+        return vtk_to_numpy(modelPoints.GetData()).copy()
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def updateLandmarkDistanceMap(self, modelNode, fiducialNode, arrayName="LandmarkDistance"):
+        """ Distance of each model vertex to the nearest control point, as the point scalar array arrayName (shown on
+            the model). The distance map of the model is kept between calls: when only some control points moved,
+            only the vertices near them are updated. Returns the number of updated vertices. """
+        from SurfaceMeasurementToolLib import LandmarkDistanceMap
+        polyData = modelNode.GetPolyData() if modelNode else None
+        if not polyData or not polyData.GetPoints() or not fiducialNode:
+            return 0
+
+        # 1. Landmarks in the model coordinate system
+        landmarks = self.getControlPointsInModelCoordinates(fiducialNode, modelNode)
+
+        # 2. Distance array of the model, whose distance map is reused while the array and the vertices are unchanged
+        pointData = polyData.GetPointData()
+        distanceArray = pointData.GetArray(arrayName)
+        pointsMTime = polyData.GetPoints().GetMTime()
+        cached = self._landmarkDistanceMaps.get(modelNode.GetID())
+        if cached and cached[0] == pointsMTime and cached[1] is distanceArray:
+            updatedCount = cached[2].update(landmarks)
+        else:
+            if distanceArray is None or distanceArray.GetNumberOfTuples() != polyData.GetNumberOfPoints():
+                pointData.RemoveArray(arrayName)
+                distanceArray = vtk.vtkFloatArray()
+                distanceArray.SetName(arrayName)
+                distanceArray.SetNumberOfTuples(polyData.GetNumberOfPoints())
+                pointData.AddArray(distanceArray)
+            distanceMap = LandmarkDistanceMap(self.getMeshTopology(modelNode).vertices,
+                                              slicer.util.arrayFromModelPointData(modelNode, arrayName))
+            self._landmarkDistanceMaps[modelNode.GetID()] = (pointsMTime, distanceArray, distanceMap)
+            updatedCount = distanceMap.compute(landmarks)
+        if not updatedCount:
+            return 0
+
+        # 3. Show the distances on the model
+        distanceArray.Modified()
+        displayNode = modelNode.GetDisplayNode()
+        if displayNode:
+            displayNode.SetActiveScalar(arrayName, vtk.vtkAssignAttribute.POINT_DATA)
+            displayNode.SetScalarRangeFlag(slicer.vtkMRMLDisplayNode.UseDataScalarRange)
+            displayNode.SetScalarVisibility(True)
+        return updatedCount
+
 '''=================================================================================================================='''
 '''=================================================================================================================='''
 #
@@ -249,14 +456,18 @@ class SurfaceMeasurementToolTest(ScriptedLoadableModuleTest):
     def runTest(self):
         self.setUp()
         self.test_SurfaceMeasurementTool_Logic()
+        self.test_SurfaceMeasurementTool_LandmarkDistance()
+        self.test_SurfaceMeasurementTool_TopologyCache()
+        self.test_SurfaceMeasurementTool_InsideOutside()
 
     # ------------------------------------------------------------------------------------------------------------------
     def test_SurfaceMeasurementTool_Logic(self):
         self.delayDisplay("Starting the test")
 
-        import SampleData
-        # Use a sample surface model if available, otherwise create a simple sphere
+        # Use a sample surface model if available (local sample data store first), otherwise create a simple sphere
         try:
+            import SampleData
+            installSampleDataStore()
             sampleNode = SampleData.downloadSample("DentalModel") # A common surface sample
         except:
             # Fallback: create a sphere
@@ -279,3 +490,167 @@ class SurfaceMeasurementToolTest(ScriptedLoadableModuleTest):
         self.assertEqual(len(center), 3)
         
         self.delayDisplay('Test passed')
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def test_SurfaceMeasurementTool_LandmarkDistance(self):
+        self.delayDisplay("Starting the landmark distance map test")
+
+        sphereSource = vtk.vtkSphereSource()
+        sphereSource.SetRadius(10.0)
+        sphereSource.SetThetaResolution(200)
+        sphereSource.SetPhiResolution(200)
+        sphereSource.Update()
+        modelNode = slicer.modules.models.logic().AddModel(sphereSource.GetOutput())
+        fiducialNode = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLMarkupsFiducialNode")
+        rng = np.random.default_rng(0)
+        for point in rng.uniform(-10, 10, (20, 3)):
+            fiducialNode.AddControlPoint(point)
+
+        def bruteForceDistances():
+            vertices = slicer.util.arrayFromModelPoints(modelNode)
+            landmarks = slicer.util.arrayFromMarkupsControlPoints(fiducialNode)
+            return np.sqrt(((vertices[:, np.newaxis, :] - landmarks[np.newaxis]) ** 2).sum(axis=2)).min(axis=1)
+
+        # 1. Full computation
+        logic = SurfaceMeasurementToolLogic()
+        numberOfPoints = modelNode.GetPolyData().GetNumberOfPoints()
+        self.assertEqual(logic.updateLandmarkDistanceMap(modelNode, fiducialNode), numberOfPoints)
+        distances = slicer.util.arrayFromModelPointData(modelNode, "LandmarkDistance")
+        np.testing.assert_allclose(distances, bruteForceDistances(), rtol=1e-5, atol=1e-4)
+        self.assertEqual(modelNode.GetDisplayNode().GetActiveScalarName(), "LandmarkDistance")
+
+        # 2. Moving one landmark updates part of the vertices only, with the same result
+        fiducialNode.SetNthControlPointPosition(3, 0.0, 0.0, 10.0)
+        updatedCount = logic.updateLandmarkDistanceMap(modelNode, fiducialNode)
+        self.assertGreater(updatedCount, 0)
+        self.assertLess(updatedCount, numberOfPoints)
+        distances = slicer.util.arrayFromModelPointData(modelNode, "LandmarkDistance")
+        np.testing.assert_allclose(distances, bruteForceDistances(), rtol=1e-5, atol=1e-4)
+        self.assertEqual(logic.updateLandmarkDistanceMap(modelNode, fiducialNode), 0)
+
+        self.delayDisplay('Test passed')
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def test_SurfaceMeasurementTool_TopologyCache(self):
+        self.delayDisplay("Starting the topology cache test")
+
+        sphereSource = vtk.vtkSphereSource()
+        sphereSource.SetRadius(10.0)
+        sphereSource.SetThetaResolution(64)
+        sphereSource.SetPhiResolution(64)
+        sphereSource.Update()
+        modelNode = slicer.modules.models.logic().AddModel(sphereSource.GetOutput())
+        logic = SurfaceMeasurementToolLogic()
+        cache = logic.getTopologyCache()
+        memoryBudget = cache.memoryBudget
+
+        # 1. One topology per model, shared by all computations, consistent with VTK
+        topology = logic.getMeshTopology(modelNode)
+        self.assertIs(SurfaceMeasurementToolLogic().getMeshTopology(modelNode), topology)
+        massProperties = vtk.vtkMassProperties()
+        massProperties.SetInputData(modelNode.GetPolyData())
+        massProperties.Update()
+        self.assertAlmostEqual(logic.getSurfaceArea(modelNode), massProperties.GetSurfaceArea(), delta=1e-3)
+        numberOfVertices, numberOfTriangles = len(topology.vertices), len(topology.triangles)
+        self.assertEqual(numberOfVertices - len(topology.edges) + numberOfTriangles, 2)  # Closed sphere
+        self.assertEqual(topology.adjacencyOffsets[-1], 2 * len(topology.edges))
+        centers = topology.vertices / np.linalg.norm(topology.vertices, axis=1)[:, np.newaxis]
+        self.assertGreater(np.einsum("ni,ni->n", topology.vertexNormals, centers).min(), 0.99)  # Outward normals
+        samples = logic.sampleSurfacePoints(modelNode, 1000, seed=0)
+        np.testing.assert_allclose(np.linalg.norm(samples, axis=1), 10.0, atol=0.1)
+        self.assertIs(logic.getMeshTopology(modelNode), topology)
+
+        # 2. Scalars written on the model keep the topology, moved points rebuild it
+        logic.updateLandmarkDistanceMap(modelNode, slicer.mrmlScene.AddNewNodeByClass("vtkMRMLMarkupsFiducialNode"))
+        self.assertIs(logic.getMeshTopology(modelNode), topology)
+        modelNode.GetPolyData().GetPoints().Modified()
+        self.assertIsNot(logic.getMeshTopology(modelNode), topology)
+
+        # 3. Above the memory budget, the least recently used topologies are evicted
+        try:
+            otherPolyData = vtk.vtkPolyData()
+            otherPolyData.DeepCopy(sphereSource.GetOutput())
+            otherNode = slicer.modules.models.logic().AddModel(otherPolyData)
+            cache.memoryBudget = logic.getMeshTopology(modelNode).nbytes + 1
+            logic.getMeshTopology(otherNode).edges
+            self.assertIn(otherNode.GetID(), cache)
+            self.assertNotIn(modelNode.GetID(), cache)
+        finally:
+            cache.memoryBudget = memoryBudget
+
+        # 4. Removed models and closed scenes leave nothing in the caches
+        self.assertIn(modelNode.GetID(), logic._landmarkDistanceMaps)
+        slicer.mrmlScene.RemoveNode(otherNode)
+        self.assertNotIn(otherNode.GetID(), cache)
+        logic.getMeshTopology(modelNode)
+        slicer.mrmlScene.Clear()
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(logic._landmarkDistanceMaps, {})
+
+        self.delayDisplay('Test passed')
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def test_SurfaceMeasurementTool_InsideOutside(self):
+        self.delayDisplay("Starting the inside/outside test")
+
+        import time
+        sphereSource = vtk.vtkSphereSource()
+        sphereSource.SetRadius(10.0)
+        sphereSource.SetThetaResolution(100)
+        sphereSource.SetPhiResolution(100)
+        sphereSource.Update()
+        modelNode = slicer.modules.models.logic().AddModel(sphereSource.GetOutput())
+        logic = SurfaceMeasurementToolLogic()
+
+        # 1. Batch signed distances against the analytic sphere (tessellation error below 0.1 mm)
+        points = np.random.default_rng(0).uniform(-15, 15, (100000, 3))
+        start = time.perf_counter()
+        signedDistances = logic.getSignedDistances(modelNode, points)
+        logger.info("%d points classified in %.2f s", len(points), time.perf_counter() - start)
+        expected = np.linalg.norm(points, axis=1) - 10.0
+        np.testing.assert_allclose(signedDistances, expected, atol=0.1)
+        clear = np.abs(expected) > 0.1
+        np.testing.assert_array_equal(signedDistances[clear] < 0, expected[clear] < 0)
+
+        # 2. Control points of a transformed markups node, written back as measurements and selection
+        markupsNode = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLMarkupsFiducialNode")
+        slicer.util.updateMarkupsControlPointsFromArray(markupsNode, np.array([[0, 0, 0], [20, 0, 0], [0, 9, 0]]))
+        transformNode = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLLinearTransformNode")
+        transformNode.SetMatrixTransformToParent(slicer.util.vtkMatrixFromArray(np.array(
+            [[1, 0, 0, 15], [0, 1, 0, 0], [0, 0, 1, 0], [0, 0, 0, 1]])))
+        modelNode.SetAndObserveTransformNodeID(transformNode.GetID())  # Sphere now centered at (15, 0, 0)
+        inside = logic.classifyControlPoints(modelNode, markupsNode)
+        self.assertEqual(inside.tolist(), [False, True, False])
+        self.assertEqual([markupsNode.GetNthControlPointSelected(index) for index in range(3)], [True] * 3)  # Kept
+        logic.classifyControlPoints(modelNode, markupsNode, selectInside=True)
+        self.assertEqual([markupsNode.GetNthControlPointSelected(index) for index in range(3)], [False, True, False])
+        values = markupsNode.GetMeasurement("SignedDistance").GetControlPointValues()
+        self.assertAlmostEqual(values.GetValue(1), -5.0, delta=0.1)
+        self.assertEqual(markupsNode.GetMeasurement("Inside").GetControlPointValues().GetValue(1), 1.0)
+
+        # 3. Same result through a non-linear transform (a thin plate spline reproducing the translation)
+        sourceLandmarks = vtk.vtkPoints()
+        targetLandmarks = vtk.vtkPoints()
+        for point in ([0, 0, 0], [10, 0, 0], [0, 10, 0], [0, 0, 10], [10, 10, 10]):
+            sourceLandmarks.InsertNextPoint(point)
+            targetLandmarks.InsertNextPoint(point[0] + 15, point[1], point[2])
+        thinPlateSpline = vtk.vtkThinPlateSplineTransform()
+        thinPlateSpline.SetBasisToR()
+        thinPlateSpline.SetSourceLandmarks(sourceLandmarks)
+        thinPlateSpline.SetTargetLandmarks(targetLandmarks)
+        splineTransformNode = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLTransformNode")
+        splineTransformNode.SetAndObserveTransformToParent(thinPlateSpline)
+        modelNode.SetAndObserveTransformNodeID(splineTransformNode.GetID())
+        self.assertFalse(splineTransformNode.IsTransformToWorldLinear())
+        np.testing.assert_allclose(logic.getControlPointsInModelCoordinates(markupsNode, modelNode),
+                                   [[-15, 0, 0], [5, 0, 0], [-15, 9, 0]], atol=1e-3)
+        self.assertEqual(logic.classifyControlPoints(modelNode, markupsNode).tolist(), [False, True, False])
+
+        # 4. Open surfaces are still classified, with a warning
+        planeSource = vtk.vtkPlaneSource()
+        planeSource.Update()
+        planeNode = slicer.modules.models.logic().AddModel(planeSource.GetOutput())
+        self.assertFalse(logic.getMeshTopology(planeNode).isClosed)
+        self.assertEqual(len(logic.getSignedDistances(planeNode, [[0, 0, 1]])), 1)
+
+        self.delayDisplay('Test passed')
@@ -0,0 +1,109 @@
+import numpy as np
+
+#
+# Distance of every mesh vertex to its nearest landmark, kept up to date incrementally while landmarks move.
+#
+# Nearest landmarks are found with a KD-tree over the landmarks (scipy.spatial.cKDTree, queried on all cores) when
+# scipy is installed, otherwise by batches of vertices against all landmarks: a (batch x landmarks) matrix product,
+# batches sized to bound the temporary memory. Landmark sets are small (tens to hundreds of points), so both stay
+# linear in the number of vertices.
+#
+# When a few landmarks move, only two groups of vertices can change:
+#   - vertices whose nearest landmark moved: the landmark may have moved away, they are queried again;
+#   - vertices closer to a moved landmark's new position than to their current nearest landmark.
+# The second test is one vectorized pass per moved landmark. Distances are written in place, into the buffer of the
+# model scalar array, so nothing is copied to VTK.
+#
+
+DEFAULT_BATCH_ELEMENTS = 1 << 22  # Distances computed at once by the brute force search (32 MB of float64)
+INCREMENTAL_FRACTION = 0.25  # More moved landmarks than this fraction: a full update is cheaper
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def nearestLandmarks(points, landmarks, batchElements=DEFAULT_BATCH_ELEMENTS):
+    """ (distances, indices) of the landmark nearest to each point. """
+    points = np.asarray(points, dtype=np.float64)
+    landmarks = np.asarray(landmarks, dtype=np.float64)
+    try:
+        from scipy.spatial import cKDTree
+    except ImportError:
+        cKDTree = None
+    if cKDTree is not None:
+        distances, indices = cKDTree(landmarks).query(points, workers=-1)
+        return distances, indices
+
+    distances = np.empty(len(points))
+    indices = np.empty(len(points), dtype=np.intp)
+    squaredLandmarkNorms = np.einsum("li,li->l", landmarks, landmarks)
+    batchSize = max(1, batchElements // len(landmarks))
+    for start in range(0, len(points), batchSize):
+        batch = points[start:start + batchSize]
+        # |p - l|^2 = |p|^2 - 2 p.l + |l|^2; |p|^2 does not change the argmin and is added back to the minimum only
+        squaredDistances = squaredLandmarkNorms - 2.0 * (batch @ landmarks.T)
+        batchIndices = np.argmin(squaredDistances, axis=1)
+        minimum = squaredDistances[np.arange(len(batch)), batchIndices] + np.einsum("pi,pi->p", batch, batch)
+        indices[start:start + len(batch)] = batchIndices
+        np.sqrt(np.maximum(minimum, 0.0), out=distances[start:start + len(batch)])
+    return distances, indices
+
+
+'''=================================================================================================================='''
+#
+# LandmarkDistanceMap
+#
+class LandmarkDistanceMap:
+    """ Distances of vertices to their nearest landmark. distances may be given to write into an existing buffer
+        (e.g. the numpy view of a VTK point scalar array). """
+
+    def __init__(self, vertices, distances=None):
+        self.vertices = np.asarray(vertices, dtype=np.float64)
+        self.distances = np.empty(len(self.vertices), dtype=np.float32) if distances is None else distances
+        self.landmarks = None
+        self.nearest = None
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def compute(self, landmarks):
+        """ Full update. Returns the number of updated vertices. """
+        self.landmarks = np.array(landmarks, dtype=np.float64).reshape(-1, 3)
+        if len(self.landmarks) == 0:
+            self.distances[:] = np.inf
+            self.nearest = np.full(len(self.vertices), -1, dtype=np.intp)
+            return len(self.vertices)
+        distances, self.nearest = nearestLandmarks(self.vertices, self.landmarks)
+        self.distances[:] = distances
+        return len(self.vertices)
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def update(self, landmarks):
+        """ Incremental update for moved landmarks (full update if landmarks were added or removed, or if many moved).
+            Returns the number of updated vertices. """
+        landmarks = np.array(landmarks, dtype=np.float64).reshape(-1, 3)
+        if self.landmarks is None or len(landmarks) != len(self.landmarks) or len(landmarks) == 0:
+            return self.compute(landmarks)
+        moved = np.flatnonzero(np.any(landmarks != self.landmarks, axis=1))
+        if len(moved) == 0:
+            return 0
+        if len(moved) > INCREMENTAL_FRACTION * len(landmarks):
+            return self.compute(landmarks)
+
+        # 1. Vertices whose nearest landmark moved (found before the nearest indices change)
+        orphans = np.flatnonzero(np.isin(self.nearest, moved))
+        self.landmarks = landmarks
+
+        # 2. Vertices now closer to a moved landmark
+        updated = np.zeros(len(self.vertices), dtype=bool)
+        updated[orphans] = True
+        for index in moved:
+            offsets = self.vertices - landmarks[index]
+            distances = np.sqrt(np.einsum("pi,pi->p", offsets, offsets))
+            closer = distances < self.distances
+            self.distances[closer] = distances[closer]
+            self.nearest[closer] = index
+            updated |= closer
+
+        # 3. Orphans: search all landmarks again
+        if len(orphans):
+            distances, nearest = nearestLandmarks(self.vertices[orphans], landmarks)
+            self.distances[orphans] = distances
+            self.nearest[orphans] = nearest
+        return int(np.count_nonzero(updated))
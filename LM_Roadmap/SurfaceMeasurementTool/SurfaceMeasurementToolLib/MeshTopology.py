@@ -0,0 +1,247 @@
+from collections import OrderedDict
+
+import numpy as np
+
+#
+# Mesh structure derived once per model and shared by all surface computations.
+#
+# MeshTopology holds the vertices and triangles of a mesh as numpy arrays and derives the rest on first use: face
+# areas and normals, area-weighted vertex normals, the unique edge list and the vertex adjacency in compressed sparse
+# row form (neighbours of vertex i: adjacency[adjacencyOffsets[i]:adjacencyOffsets[i + 1]]). Every derivation is a few
+# whole-array operations (cross products, bincount, sort), indices are int32 and floats keep the mesh precision.
+# Objects built from the mesh outside numpy (e.g. a VTK cell locator) can be attached to the topology, so that they
+# are rebuilt and evicted with it.
+#
+# TopologyCache keeps one MeshTopology per model, valid while the model polydata MTime is unchanged, in least recently
+# used order. When the arrays of all cached topologies exceed the memory budget, least recently used topologies are
+# dropped, the one in use is always kept. Topologies grow as arrays are derived, so the cache is trimmed again then.
+#
+
+DEFAULT_MEMORY_BUDGET = 512 * 1024 * 1024  # Bytes, for all cached topologies
+
+
+'''=================================================================================================================='''
+#
+# MeshTopology
+#
+class MeshTopology:
+    """ Vertices (n, 3) and triangles (m, 3) of a mesh, and the arrays derived from them on first access. """
+
+    def __init__(self, vertices, triangles, onResize=None):
+        self.vertices = np.asarray(vertices).reshape(-1, 3)
+        self.triangles = np.asarray(triangles, dtype=np.int32).reshape(-1, 3)
+        self.onResize = onResize  # Called when a derived array is added (the cache checks its budget)
+        self._arrays = {}
+        self._attachments = {}  # name: (object, estimated bytes)
+
+    # ------------------------------------------------------------------------------------------------------------------
+    @property
+    def nbytes(self):
+        """ Bytes of all arrays (the vertices may be shared with the polydata points). """
+        return (self.vertices.nbytes + self.triangles.nbytes + sum(array.nbytes for array in self._arrays.values())
+                + sum(nbytes for _, nbytes in self._attachments.values()))
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def _store(self, **arrays):
+        self._arrays.update(arrays)
+        if self.onResize:
+            self.onResize(self)
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def attachment(self, name, build):
+        """ Object attached under name, built on first use by build(), which returns (object, estimated bytes). """
+        if name not in self._attachments:
+            self._attachments[name] = build()
+            if self.onResize:
+                self.onResize(self)
+        return self._attachments[name][0]
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def _computeFaces(self):
+        corners = self.vertices[self.triangles].astype(np.float64, copy=False)  # Areas summed over millions of faces
+        crossProducts = np.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0])
+        doubleAreas = np.sqrt(np.einsum("mi,mi->m", crossProducts, crossProducts))
+        faceNormals = crossProducts / np.where(doubleAreas > 0, doubleAreas, 1.0)[:, np.newaxis]
+        self._store(faceAreas=0.5 * doubleAreas, faceNormals=faceNormals.astype(self.vertices.dtype, copy=False))
+
+    # ------------------------------------------------------------------------------------------------------------------
+    @property
+    def faceAreas(self):
+        if "faceAreas" not in self._arrays:
+            self._computeFaces()
+        return self._arrays["faceAreas"]
+
+    # ------------------------------------------------------------------------------------------------------------------
+    @property
+    def faceNormals(self):
+        """ Unit normals of the triangles (right-hand rule on the vertex order, zero for degenerate triangles). """
+        if "faceNormals" not in self._arrays:
+            self._computeFaces()
+        return self._arrays["faceNormals"]
+
+    # ------------------------------------------------------------------------------------------------------------------
+    @property
+    def vertexNormals(self):
+        """ Unit normals of the vertices, average of the normals of their triangles weighted by the triangle areas. """
+        if "vertexNormals" not in self._arrays:
+            crossProducts = self.faceNormals * (2.0 * self.faceAreas)[:, np.newaxis]
+            numberOfVertices = len(self.vertices)
+            corners = self.triangles.ravel()
+            normals = np.stack([np.bincount(corners, np.repeat(crossProducts[:, axis], 3), numberOfVertices)
+                                for axis in range(3)], axis=1).astype(np.float64, copy=False)
+            lengths = np.linalg.norm(normals, axis=1)
+            normals /= np.where(lengths > 0, lengths, 1.0)[:, np.newaxis]
+            self._store(vertexNormals=normals.astype(self.vertices.dtype, copy=False))
+        return self._arrays["vertexNormals"]
+
+    # ------------------------------------------------------------------------------------------------------------------
+    @property
+    def edges(self):
+        """ (e, 2) unique edges, smaller vertex index first, sorted. """
+        if "edges" not in self._arrays:
+            starts = self.triangles.astype(np.int64).ravel()
+            ends = self.triangles[:, [1, 2, 0]].astype(np.int64).ravel()
+            keys = np.sort(np.minimum(starts, ends) * len(self.vertices) + np.maximum(starts, ends))
+            firsts = np.flatnonzero(np.diff(keys, prepend=-1) != 0)  # Sort and mask: much faster than np.unique
+            edgeFaceCounts = np.diff(firsts, append=len(keys)).astype(np.int32)
+            edges = np.stack(np.divmod(keys[firsts], len(self.vertices)), axis=1).astype(np.int32)
+            self._store(edges=edges, edgeFaceCounts=edgeFaceCounts)
+        return self._arrays["edges"]
+
+    # ------------------------------------------------------------------------------------------------------------------
+    @property
+    def edgeFaceCounts(self):
+        """ Number of triangles sharing each edge (2 everywhere on a closed manifold surface). """
+        if "edgeFaceCounts" not in self._arrays:
+            self.edges
+        return self._arrays["edgeFaceCounts"]
+
+    # ------------------------------------------------------------------------------------------------------------------
+    @property
+    def isClosed(self):
+        """ True if every edge is shared by exactly two triangles (no hole, no non-manifold edge). """
+        return len(self.triangles) > 0 and bool(np.all(self.edgeFaceCounts == 2))
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def _computeAdjacency(self):
+        edges = self.edges
+        sources = np.concatenate([edges[:, 0], edges[:, 1]])
+        targets = np.concatenate([edges[:, 1], edges[:, 0]])
+        order = np.argsort(sources, kind="stable")
+        offsets = np.zeros(len(self.vertices) + 1, dtype=np.int32)
+        np.cumsum(np.bincount(sources, minlength=len(self.vertices)), out=offsets[1:])
+        self._store(adjacencyOffsets=offsets, adjacency=targets[order])
+
+    # ------------------------------------------------------------------------------------------------------------------
+    @property
+    def adjacencyOffsets(self):
+        if "adjacencyOffsets" not in self._arrays:
+            self._computeAdjacency()
+        return self._arrays["adjacencyOffsets"]
+
+    # ------------------------------------------------------------------------------------------------------------------
+    @property
+    def adjacency(self):
+        if "adjacency" not in self._arrays:
+            self._computeAdjacency()
+        return self._arrays["adjacency"]
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def neighbors(self, vertexIndex):
+        """ Indices of the vertices sharing an edge with a vertex. """
+        return self.adjacency[self.adjacencyOffsets[vertexIndex]:self.adjacencyOffsets[vertexIndex + 1]]
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def samplePoints(self, count, rng=None):
+        """ (count, 3) points uniformly distributed on the surface: area-weighted triangles, uniform barycentrics. """
+        rng = np.random.default_rng(rng)
+        cumulativeAreas = np.cumsum(self.faceAreas)
+        faces = np.searchsorted(cumulativeAreas, rng.uniform(0, cumulativeAreas[-1], count), side="right")
+        faces = np.minimum(faces, len(self.triangles) - 1)
+        u, v = rng.uniform(size=(2, count))
+        outside = u + v > 1  # Fold the unit square onto the triangle
+        u[outside], v[outside] = 1 - u[outside], 1 - v[outside]
+        corners = self.vertices[self.triangles[faces]]
+        return corners[:, 0] + u[:, np.newaxis] * (corners[:, 1] - corners[:, 0]) \
+            + v[:, np.newaxis] * (corners[:, 2] - corners[:, 0])
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def trianglesFromCells(offsets, connectivity):
+    """ (m, 3) triangles of a cell array given as offsets (m + 1,) and connectivity (VTK 9 vtkCellArray layout), or
+        None if some cells are not triangles. """
+    offsets = np.asarray(offsets)
+    if len(offsets) < 2:
+        return np.zeros((0, 3), dtype=np.int32)
+    if offsets[-1] != 3 * (len(offsets) - 1) or np.any(np.diff(offsets) != 3):
+        return None
+    return np.asarray(connectivity, dtype=np.int32).reshape(-1, 3)
+
+
+'''=================================================================================================================='''
+#
+# TopologyCache
+#
+class TopologyCache:
+    """ MeshTopology of meshes by key (model node ID), rebuilt when the given modification time changes and evicted
+        in least recently used order above memoryBudget bytes. """
+
+    def __init__(self, memoryBudget=DEFAULT_MEMORY_BUDGET):
+        self.memoryBudget = memoryBudget
+        self._entries = OrderedDict()  # key: (modification time, MeshTopology), least recently used first
+        self.hits = self.misses = self.evictions = 0
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def get(self, key, modifiedTime, build):
+        """ Cached topology of key if built at modifiedTime, otherwise the MeshTopology returned by build(). """
+        entry = self._entries.get(key)
+        if entry and entry[0] == modifiedTime:
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return entry[1]
+        self.misses += 1
+        topology = build()
+        topology.onResize = self._trim
+        self._entries[key] = (modifiedTime, topology)
+        self._entries.move_to_end(key)
+        self._trim(topology)
+        return topology
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def _trim(self, inUse=None):
+        """ Drop least recently used topologies until the budget is met, inUse excepted. """
+        total = self.nbytes
+        for key in list(self._entries):
+            if total <= self.memoryBudget:
+                break
+            topology = self._entries[key][1]
+            if topology is inUse:
+                continue
+            total -= topology.nbytes
+            del self._entries[key]
+            topology.onResize = None
+            self.evictions += 1
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def discard(self, key):
+        entry = self._entries.pop(key, None)
+        if entry:
+            entry[1].onResize = None
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def clear(self):
+        for key in list(self._entries):
+            self.discard(key)
+
+    # ------------------------------------------------------------------------------------------------------------------
+    @property
+    def nbytes(self):
+        return sum(topology.nbytes for _, topology in self._entries.values())
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def __contains__(self, key):
+        return key in self._entries
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,10 @@
+from .LandmarkDistance import (
+    LandmarkDistanceMap,
+    nearestLandmarks,
+)
+from .MeshTopology import (
+    DEFAULT_MEMORY_BUDGET,
+    MeshTopology,
+    TopologyCache,
+    trianglesFromCells,
+)